@@ -21,9 +21,11 @@ from EXIFnaming.nameop import filter_series, rename_back, filter_primary, rename
 from EXIFnaming.nameop import filter_series, filter_primary, copy_subdirectories, copy_files, copy_new_files, \
     replace_in_file, folders_to_main, rename_HDR, sanitize_filename, rename_temp_back, rename_back, \
     create_tags_csv, create_tags_csv_per_dir, create_counters_csv, create_counters_csv_per_dir, create_example_csvs, \
-    create_rating_csv
+    create_rating_csv, resume_moves
 from EXIFnaming.picture import detect_blurry, detect_similar, resize
-from EXIFnaming.readexif import print_info, rename, order, searchby_exiftag_equality, \
-    searchby_exiftag_interval, rotate, rename_from_exif, print_timetable, better_gpx_via_timetable
-from EXIFnaming.setexif import shift_time, geotag, fake_date, write_exif_using_csv, copy_exif_via_mainname
+from EXIFnaming.readexif import print_info, rename, order, searchby_exiftags, searchby_exiftag_equality, \
+    searchby_exiftag_interval, rotate, rename_from_exif, print_timetable, better_gpx_via_timetable, \
+    save_tags_snapshot, diff_tags
+from EXIFnaming.setexif import shift_time, geotag, geotag_native, merge_gpx, fake_date, write_exif_using_csv, \
+    copy_exif_via_mainname
 from EXIFnaming.steps import step1_prepare, step2_rename, step3_filter, step4_sanitize, step5_write_exif, make_fav
@@ -1,16 +1,32 @@
 #!/usr/bin/env python3
 
+from EXIFnaming.helpers import analysis
+from EXIFnaming.helpers import catalog
 from EXIFnaming.helpers import constants
+from EXIFnaming.helpers import csv_rules
 from EXIFnaming.helpers import cv2op
 from EXIFnaming.helpers import date
 from EXIFnaming.helpers import decode
+from EXIFnaming.helpers import features
 from EXIFnaming.helpers import fileop
+from EXIFnaming.helpers import gpx
+from EXIFnaming.helpers import journal
 from EXIFnaming.helpers import measuring_tools
 from EXIFnaming.helpers import misc
+from EXIFnaming.helpers import moveplan
+from EXIFnaming.helpers import pattern_matcher
+from EXIFnaming.helpers import preview
 from EXIFnaming.helpers import program_dir
+from EXIFnaming.helpers import query
+from EXIFnaming.helpers import report
+from EXIFnaming.helpers import rotation
 from EXIFnaming.helpers import settings
+from EXIFnaming.helpers import snapshot
 from EXIFnaming.helpers import tag_conversion
+from EXIFnaming.helpers import tag_diff
 from EXIFnaming.helpers import tags
+from EXIFnaming.helpers import timetable
 
-__all__ = ["constants", "cv2op", "date", "decode", "fileop", "measuring_tools", "misc", "program_dir", "settings",
-           "tag_conversion", "tags"]
+__all__ = ["analysis", "catalog", "constants", "csv_rules", "cv2op", "date", "decode", "features", "fileop", "gpx",
+           "journal", "measuring_tools", "misc", "moveplan", "pattern_matcher", "preview", "program_dir", "query",
+           "report", "rotation", "settings", "snapshot", "tag_conversion", "tag_diff", "tags", "timetable"]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+analysis of many pictures in parallel
+
+a thread reads the files ahead while a process pool decodes and analyses them,
+the number of files held in memory is bounded
+the results are kept in a :class:`features.FeatureStore`, so only new or modified pictures are analysed
+
+dependencies: opencv-python
+"""
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Iterator, Tuple, Optional, Callable
+
+import numpy as np
+
+from EXIFnaming.helpers.cv2op import blur_score, similarity_features, read_picture_bytes
+from EXIFnaming.helpers.features import FeatureStore, file_key, FileKey
+from EXIFnaming.helpers.preview import PreviewReader
+
+__all__ = ["update_features"]
+
+
+def _read(path: str, previews: Optional[PreviewReader]) -> Optional[np.ndarray]:
+    try:
+        return read_picture_bytes(path, previews)
+    except OSError:
+        return None
+
+
+def _blur_features(data: Optional[np.ndarray]):
+    if data is None: return float("nan"), None
+    return blur_score(data), None
+
+
+def _similar_features(data: Optional[np.ndarray]):
+    if data is None: return None, None
+    return None, similarity_features(data)
+
+
+def _all_features(data: Optional[np.ndarray]):
+    if data is None: return float("nan"), None
+    return blur_score(data), similarity_features(data)
+
+
+def _iter_parallel(function: Callable, paths: List[str], previews: Optional[PreviewReader], processes: int,
+                   prefetch: int) -> Iterator[Tuple[str, object]]:
+    """
+    :return: path and result of function applied on the content of the file in order of paths
+    """
+    if processes == 1 or len(paths) < 2:
+        for path in paths:
+            yield path, function(_read(path, previews))
+        return
+    in_flight = 2 * processes
+    reads = deque()
+    results = deque()
+    with ThreadPoolExecutor(1) as reader, ProcessPoolExecutor(processes) as executor:
+        def start_analysis():
+            path, read = reads.popleft()
+            results.append((path, executor.submit(function, read.result())))
+
+        for path in paths:
+            reads.append((path, reader.submit(_read, path, previews)))
+            if len(reads) > prefetch: start_analysis()
+            while len(results) >= in_flight:
+                path, result = results.popleft()
+                yield path, result.result()
+        while reads:
+            start_analysis()
+        while results:
+            path, result = results.popleft()
+            yield path, result.result()
+
+
+def update_features(paths: List[str], store: FeatureStore, previews: PreviewReader = None, processes: int = None,
+                    blur=True, similar=False, prefetch: int = 4) -> List[Optional[FileKey]]:
+    """
+    analyse the pictures whose features are missing in the store
+    :param paths: pictures to analyse
+    :param store: store of the features, it is not saved
+    :param previews: analyse the embedded previews if they are large enough
+    :param processes: number of processes, default is the number of cpus, 1 analyses in this process
+    :param blur: compute blur scores
+    :param similar: compute the features for similarity
+    :param prefetch: number of files read ahead
+    :return: key of each path in the store, None for files that do not exist
+    """
+    if not processes: processes = os.cpu_count() or 1
+    keys = [file_key(path) for path in paths]
+    missing = {}
+    for path, key in zip(paths, keys):
+        if key is None: continue
+        need_blur = blur and store.get_blur(key) is None
+        need_similar = similar and store.get_similar(key) is None
+        if need_blur or need_similar: missing[path] = (key, need_blur, need_similar)
+    # the same function for all files keeps the pipeline simple, some features may be computed again
+    need_blur = any(entry[1] for entry in missing.values())
+    need_similar = any(entry[2] for entry in missing.values())
+    function = _all_features if need_blur and need_similar else _blur_features if need_blur else _similar_features
+    for path, (score, features) in _iter_parallel(function, list(missing.keys()), previews, processes, prefetch):
+        key = missing[path][0]
+        if score is not None: store.set_blur(key, score)
+        if features is not None: store.set_similar(key, *features)
+    return keys
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+persistent catalog of the exif tags of all files below a directory
+
+the catalog is stored in the saves dir and refreshed per directory when files were added, removed or modified,
+so repeated reads do not need exiftool
+"""
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from EXIFnaming.helpers import settings
+from EXIFnaming.helpers.decode import read_exiftags_of_dirs, sort_dict_by_date_and_model, askToContinue
+from EXIFnaming.helpers.fileop import is_invalid_path, file_has_ext
+from EXIFnaming.helpers.program_dir import get_saves_dir, log
+from EXIFnaming.helpers.query import TagIndex, Predicate, to_number
+
+__all__ = ["Catalog", "read_catalog", "load_catalog"]
+
+Stamp = Tuple[int, int]
+
+
+class Catalog:
+    """
+    columns are stored dictionary encoded and decoded on demand
+    """
+
+    def __init__(self, columns: Dict[str, Tuple[np.ndarray, np.ndarray]], stamps: np.ndarray, filename: str = "",
+                 version: int = 0):
+        self.columns = columns
+        self.stamps = stamps
+        self.filename = filename
+        self.version = version
+        self._indexes = {}
+
+    @staticmethod
+    def from_tagdict(tagdict: Dict[str, list], stamps: np.ndarray, filename: str = "") -> 'Catalog':
+        columns = OrderedDict()
+        for key, values in tagdict.items():
+            uniques, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+            columns[key] = (uniques, codes.astype(np.int32))
+        return Catalog(columns, stamps, filename, _new_version())
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def __contains__(self, tag: str):
+        return tag in self.columns
+
+    def names(self) -> List[str]:
+        return list(self.columns.keys())
+
+    def dictionary(self, tag: str) -> np.ndarray:
+        """
+        :return: sorted distinct values of the tag
+        """
+        return self.columns[tag][0]
+
+    def codes(self, tag: str) -> np.ndarray:
+        """
+        :return: index of the value in :meth:`dictionary` for each row
+        """
+        return self.columns[tag][1]
+
+    def column(self, tag: str, rows: np.ndarray = None) -> np.ndarray:
+        uniques, codes = self.columns[tag]
+        if rows is not None: codes = codes[rows]
+        return uniques[codes]
+
+    def numbers(self, tag: str, rows: np.ndarray = None) -> np.ndarray:
+        """
+        :return: values converted to float, nan for values that are no numbers
+        """
+        uniques, codes = self.columns[tag]
+        if rows is not None: codes = codes[rows]
+        return np.array([to_number(value) for value in uniques.tolist()], dtype=float)[codes]
+
+    def set_values(self, rows: np.ndarray, values: Dict[str, list], stamps: np.ndarray):
+        """
+        change tags of rows after the files were written, so the catalog does not need to extract them again
+        :param rows: changed rows
+        :param values: new values of the rows per tag
+        :param stamps: new stamps of the rows
+        """
+        for tag, tag_values in values.items():
+            column = np.concatenate([self.column(tag), np.array(tag_values, dtype=str)])
+            uniques, codes = np.unique(column, return_inverse=True)
+            codes = codes.astype(np.int32)
+            codes[rows] = codes[len(self):]
+            self.columns[tag] = (uniques, codes[:len(self)])
+        self.stamps[rows] = stamps
+        self.version = _new_version(self.version)
+        self._indexes = {}
+
+    def paths(self, rows: np.ndarray = None) -> List[str]:
+        directories = self.column("Directory", rows)
+        filenames = self.column("File Name", rows)
+        return [os.path.join(directory, filename) for directory, filename in zip(directories, filenames)]
+
+    def to_tagdict(self, rows: np.ndarray = None) -> Dict[str, list]:
+        """
+        :return: tags as returned by :func:`decode.read_exiftags`
+        """
+        tagdict = OrderedDict()
+        for tag in self.columns:
+            tagdict[tag] = self.column(tag, rows).tolist()
+        return tagdict
+
+    def index(self, tag: str):
+        """
+        :return: index of the tag, loaded from or saved next to the catalog file, None if tag is unknown
+        """
+        if not tag in self.columns: return None
+        if tag in self._indexes: return self._indexes[tag]
+        uniques, codes = self.columns[tag]
+        index_filename = self._index_filename(tag)
+        index = TagIndex.load(index_filename, self.version, uniques, codes) if index_filename else None
+        if index is None:
+            index = TagIndex(uniques, codes)
+            if index_filename: index.save(index_filename, self.version)
+        self._indexes[tag] = index
+        return index
+
+    def query(self, predicate: Predicate) -> np.ndarray:
+        """
+        :return: sorted row indices fulfilling the predicate
+        """
+        return predicate.rows(self)
+
+    def _index_filename(self, tag: str) -> str:
+        if not self.filename: return ""
+        return self.filename[:-len(".npz")] + "_index_" + re.sub(r"\W", "", tag) + ".npz"
+
+    def save(self):
+        arrays = {"tags": np.array(list(self.columns.keys()), dtype=str), "stamps": self.stamps,
+                  "version": np.array(self.version)}
+        for i, (uniques, codes) in enumerate(self.columns.values()):
+            arrays["values_%d" % i] = uniques
+            arrays["codes_%d" % i] = codes
+        np.savez_compressed(self.filename, **arrays)
+
+    @staticmethod
+    def load(filename: str) -> 'Catalog':
+        with np.load(filename) as data:
+            columns = OrderedDict()
+            for i, tag in enumerate(data["tags"].tolist()):
+                columns[tag] = (data["values_%d" % i], data["codes_%d" % i])
+            return Catalog(columns, data["stamps"], filename, int(data["version"]))
+
+
+def read_catalog(inpath="", file_types: List[str] = settings.image_types, ask=True, check=True) -> Catalog:
+    """
+    read the catalog of inpath, extracting the tags of all directories that changed since the last read
+    :param inpath: root directory, default is the working directory
+    :param file_types: file types to include
+    :param ask: whether to ask before extracting tags
+    :param check: whether to look for changed files, if false a saved catalog is used as it is
+    """
+    if not inpath:
+        inpath = os.getcwd()
+    file_types = sorted(set([filetype.lower() for filetype in file_types]))
+    filename = _catalog_filename(inpath, file_types)
+    catalog = Catalog.load(filename) if os.path.isfile(filename) else None
+    if catalog is not None and not check:
+        return catalog
+
+    current_stamps = _stamps_of_files(inpath, file_types)
+    changed_dirs = _changed_dirs(catalog, current_stamps)
+    if catalog is not None and not changed_dirs:
+        return catalog
+
+    log().info("extract tags of %d directories of %s for the catalog", len(changed_dirs), inpath)
+    if ask: askToContinue()
+    tagdict = read_exiftags_of_dirs(sorted(changed_dirs), file_types)
+    if catalog is not None and len(catalog) > 0:
+        keep = np.flatnonzero(~np.isin(catalog.column("Directory"), list(changed_dirs)))
+        tagdict = _merge_tagdicts(catalog.to_tagdict(keep), tagdict)
+    if not tagdict:
+        tagdict = OrderedDict([("Directory", []), ("File Name", [])])
+    stamps = np.array([current_stamps.get(directory, {}).get(name, (0, 0)) for directory, name in
+                       zip(tagdict["Directory"], tagdict["File Name"])], dtype=np.int64).reshape(-1, 2)
+    catalog = Catalog.from_tagdict(tagdict, stamps, filename)
+    catalog.save()
+    return catalog
+
+
+def load_catalog(inpath="", file_types: List[str] = settings.image_types) -> Catalog:
+    """
+    :return: the saved catalog of inpath without looking for changed files, None if there is none
+    """
+    if not inpath:
+        inpath = os.getcwd()
+    file_types = sorted(set([filetype.lower() for filetype in file_types]))
+    filename = _catalog_filename(inpath, file_types)
+    return Catalog.load(filename) if os.path.isfile(filename) else None
+
+
+def _new_version(previous: int = 0) -> int:
+    # time.time_ns needs python 3.7, coarse clocks must not repeat the previous version
+    return max(int(time.time() * 1e9), previous + 1)
+
+
+def _catalog_filename(inpath: str, file_types: List[str]) -> str:
+    key = os.path.relpath(inpath, os.getcwd()) + "|" + ",".join(file_types)
+    return get_saves_dir("catalog_" + hashlib.md5(key.encode()).hexdigest()[:8] + ".npz")
+
+
+def _stamps_of_files(inpath: str, file_types: List[str]) -> Dict[str, Dict[str, Stamp]]:
+    stamps = OrderedDict()
+    for (dirpath, dirnames, filenames) in os.walk(inpath):
+        if is_invalid_path(dirpath): continue
+        dir_stamps = {}
+        for filename in filenames:
+            if not file_has_ext(filename, file_types): continue
+            stat = os.stat(os.path.join(dirpath, filename))
+            dir_stamps[filename] = (stat.st_size, stat.st_mtime_ns)
+        if dir_stamps: stamps[dirpath] = dir_stamps
+    return stamps
+
+
+def _changed_dirs(catalog: Catalog, current_stamps: Dict[str, Dict[str, Stamp]]) -> set:
+    if catalog is None or len(catalog) == 0:
+        return set(current_stamps.keys())
+    catalog_stamps = {}
+    for directory, filename, stamp in zip(catalog.column("Directory").tolist(), catalog.column("File Name").tolist(),
+                                          catalog.stamps.tolist()):
+        catalog_stamps.setdefault(directory, {})[filename] = tuple(stamp)
+    directories = set(catalog_stamps.keys()) | set(current_stamps.keys())
+    return {directory for directory in directories if
+            not catalog_stamps.get(directory) == current_stamps.get(directory)}
+
+
+def _merge_tagdicts(tagdict1: Dict[str, list], tagdict2: Dict[str, list]) -> Dict[str, list]:
+    if not tagdict2: return tagdict1
+    len1 = len(tagdict1["Directory"])
+    len2 = len(tagdict2["Directory"])
+    merged = OrderedDict()
+    for key in list(tagdict1.keys()) + [key for key in tagdict2 if not key in tagdict1]:
+        merged[key] = tagdict1.get(key, [""] * len1) + tagdict2.get(key, [""] * len2)
+    return sort_dict_by_date_and_model(merged)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+compiled rows of the csv files used by setexif.write_exif_using_csv
+
+the csv files are read once, each file is then only checked against the rows that can possibly match it
+"""
+import bisect
+import csv
+from typing import List, Dict
+
+from EXIFnaming.helpers.pattern_matcher import PatternMatcher
+from EXIFnaming.helpers.tag_conversion import FileMetaData
+
+__all__ = ["CsvRuleSet"]
+
+
+class _RangeBucket:
+    """
+    rows sorted by their 'first' value, rows without 'first' are candidates of every counter
+    'first' is compared as string like in :func:`FileMetaData.passes_restrictions`
+    """
+
+    def __init__(self):
+        self.unbounded = []
+        self.firsts = []
+        self.bounded = []
+
+    def add(self, i: int, first: str):
+        if not first:
+            self.unbounded.append(i)
+            return
+        position = bisect.bisect_right(self.firsts, first)
+        self.firsts.insert(position, first)
+        self.bounded.insert(position, i)
+
+    def candidates(self, counter: str) -> List[int]:
+        return self.unbounded + self.bounded[:bisect.bisect_right(self.firsts, counter)]
+
+
+class _SubstringBuckets:
+    """
+    range buckets of the rows by a value that has to be part of a text
+    """
+
+    def __init__(self):
+        self.matcher = PatternMatcher()
+        self.buckets = []
+        self.indices = {}
+
+    def bucket(self, value: str) -> _RangeBucket:
+        if not value in self.indices:
+            self.indices[value] = self.matcher.add(value)
+            self.buckets.append(_RangeBucket())
+        return self.buckets[self.indices[value]]
+
+    def buckets_in(self, text: str) -> List[_RangeBucket]:
+        if not self.buckets: return []
+        return [self.buckets[i] for i in self.matcher.find(text)]
+
+
+class CsvRuleSet:
+    """
+    rows of several csv files in the order they are read
+    rows are bucketed by 'name_main', else by 'name_part', else by 'directory' and within that by 'first'
+    the 'name_part' and 'directory' values are searched with one automaton each
+    """
+
+    def __init__(self, rows: List[dict] = None):
+        self.rows = []
+        self._by_name_main = {}
+        self._by_name_part = _SubstringBuckets()
+        self._by_directory = _SubstringBuckets()
+        self._rest = _RangeBucket()
+        self._directory_cache = {}
+        for row in rows or []:
+            self.add(row)
+
+    @staticmethod
+    def from_csv_files(filenames: List[str]) -> 'CsvRuleSet':
+        csv.register_dialect('semicolon', delimiter=';', lineterminator='\r\n')
+        rule_set = CsvRuleSet()
+        for filename in filenames:
+            with open(filename, "r") as csvfile:
+                for row in csv.DictReader(csvfile, dialect='semicolon'):
+                    rule_set.add(row)
+        return rule_set
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row: dict):
+        i = len(self.rows)
+        self.rows.append(row)
+        first = _value(row, 'first')
+        if _value(row, 'name_main'):
+            self._by_name_main.setdefault(row['name_main'], _RangeBucket()).add(i, first)
+        elif _value(row, 'name_part'):
+            self._by_name_part.bucket(row['name_part']).add(i, first)
+        elif _value(row, 'directory'):
+            self._by_directory.bucket(row['directory']).add(i, first)
+            self._directory_cache.clear()
+        else:
+            self._rest.add(i, first)
+
+    def candidates(self, meta_data: FileMetaData) -> List[int]:
+        """
+        :return: sorted indices of the rows that may pass the restrictions of meta_data, a superset of the passing rows
+        """
+        counter = meta_data.counter
+        indices = self._rest.candidates(counter)
+        if meta_data.main_name in self._by_name_main:
+            indices += self._by_name_main[meta_data.main_name].candidates(counter)
+        for bucket in self._by_name_part.buckets_in(meta_data.filename):
+            indices += bucket.candidates(counter)
+        for bucket in self._directory_buckets(meta_data.directory):
+            indices += bucket.candidates(counter)
+        indices.sort()
+        return indices
+
+    def _directory_buckets(self, directory: str) -> List[_RangeBucket]:
+        if not directory in self._directory_cache:
+            self._directory_cache[directory] = self._by_directory.buckets_in(directory)
+        return self._directory_cache[directory]
+
+    def update(self, meta_data: FileMetaData):
+        """
+        same as calling meta_data.update for each row
+        """
+        for i in self.candidates(meta_data):
+            meta_data.update(self.rows[i])
+
+    def passes(self, meta_data: FileMetaData) -> bool:
+        """
+        :return: whether meta_data passes the restrictions of any row
+        """
+        for i in self.candidates(meta_data):
+            if meta_data.passes_restrictions(self.rows[i]):
+                return True
+        return False
+
+
+def _value(row: Dict[str, str], key: str) -> str:
+    return row[key] if key in row and row[key] else ""
@@ -1,22 +1,41 @@
 # https://www.pyimagesearch.com/2014/09/15/python-compare-two-images/
 
+import io
 import os
 import cv2
 import numpy as np
+from PIL import Image
 from skimage.metrics import structural_similarity
 
-__all__ = ["is_blurry", "are_similar"]
+from EXIFnaming.helpers.preview import PreviewReader
 
+__all__ = ["is_blurry", "are_similar", "read_picture", "read_picture_bytes", "decode_picture", "blur_score",
+           "similarity_features", "perceptual_hash", "color_histogram", "blur_decode_width",
+           "preview_min_width", "similar_xscale", "histogram_bins"]
 
-def is_blurry(directory, filename, threshold=100):
-    image = read_picture(directory, filename)
+# the laplacian variance depends on how the picture is scaled down, decoding jpegs at a reduced scale of at least
+# four times the analysed width keeps the scores within about 2% of the full decoding around the usual thresholds
+blur_decode_width = 4 * 500
+# embedded previews of at least this width replace the picture, they give blur scores within about 5% of the
+# picture around the usual thresholds, the exif thumbnails are too small
+preview_min_width = 1600
+# width of the pictures compared by are_similar
+similar_xscale = 100
+histogram_bins = 16
+# jpeg decoding at 1/2, 1/4 and 1/8 of the size directly from the DCT coefficients
+_reduced_modes = [(8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                  (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)]
+
+
+def is_blurry(directory, filename, threshold=100, previews: PreviewReader = None):
+    image = read_picture(directory, filename, decode_width=blur_decode_width, previews=previews)
     if image is None: return False
     return variance_of_laplacian(image) < threshold
 
 
-def are_similar(dirA, filenameA, dirB, filenameB, threshold=0.9):
-    imageA = read_picture(dirA, filenameA, 100)
-    imageB = read_picture(dirB, filenameB, 100)
+def are_similar(dirA, filenameA, dirB, filenameB, threshold=0.9, previews: PreviewReader = None):
+    imageA = read_picture(dirA, filenameA, similar_xscale, previews=previews)
+    imageB = read_picture(dirB, filenameB, similar_xscale, previews=previews)
     if imageA is None or imageB is None: return False
     s = structural_similarity(imageA, imageB)
     if threshold < s:
@@ -31,6 +50,40 @@ def variance_of_laplacian(image):
     return cv2.Laplacian(image, cv2.CV_64F).var()
 
 
+def similarity_features(file_bytes: np.ndarray):
+    """
+    :param file_bytes: content of a picture file
+    :return: grayscale picture as compared by :func:`are_similar`, its :func:`perceptual_hash` and
+        :func:`color_histogram`, None if the picture can not be decoded
+    """
+    if file_bytes is None or len(file_bytes) == 0: return None
+    picture = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if picture is None or not picture.data: return None
+    picture = cv2.resize(picture, (similar_xscale, int(similar_xscale * 2. / 3.)))
+    gray = cv2.cvtColor(picture, cv2.COLOR_BGR2GRAY)
+    return gray, perceptual_hash(gray), color_histogram(picture)
+
+
+def perceptual_hash(image) -> int:
+    """
+    64 bit hash of the low frequencies of a grayscale picture, similar pictures differ in few bits
+    """
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # the first coefficient is the mean brightness
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def color_histogram(picture) -> np.ndarray:
+    """
+    :return: histogram of each color channel with histogram_bins bins, normalized by the number of pixels
+    """
+    histograms = [cv2.calcHist([picture], [channel], None, [histogram_bins], [0, 256]).ravel() for channel in
+                  range(picture.shape[2])]
+    return (np.concatenate(histograms) / (picture.shape[0] * picture.shape[1])).astype(np.float32)
+
+
 def mse(imageA, imageB):
     # the 'Mean Squared Error' between the two images is the
     # sum of the squared difference between the two images;
@@ -54,15 +107,62 @@ def compare_images(directory, nameA, nameB):
     print("s", s)
 
 
-def read_picture(directory, name, xscale=500):
+def read_picture(directory, name, xscale=500, decode_width=0, previews: PreviewReader = None):
+    """
+    :param xscale: width of the returned grayscale picture, the height is 2/3 of it
+    :param decode_width: decode jpegs at the smallest reduced scale that is at least this wide,
+        0: decode at full size, which gives approximately the same picture as scaling down the full color picture
+    :param previews: use the embedded preview instead of the picture if there is one
+    """
     fullname = os.path.join(directory, name)
-    with open(fullname, 'rb') as img_stream:
-        file_bytes = np.asarray(bytearray(img_stream.read()), dtype=np.uint8)
-        picture = cv2.imdecode(file_bytes, cv2.IMREAD_UNCHANGED)
-    if picture is None or not picture.data:
+    picture = decode_picture(read_picture_bytes(fullname, previews), xscale, decode_width)
+    if picture is None:
         print("failed to load", fullname)
-        return
-    picture = cv2.resize(picture, (xscale, int(xscale * 2. / 3.)))
-    # convert the images to grayscale
-    picture = cv2.cvtColor(picture, cv2.COLOR_BGR2GRAY)
     return picture
+
+
+def read_picture_bytes(fullname: str, previews: PreviewReader = None) -> np.ndarray:
+    """
+    :return: content of the embedded preview or the file
+    """
+    preview = previews.read(fullname) if previews else None
+    if preview is not None:
+        return np.frombuffer(preview, dtype=np.uint8)
+    return np.fromfile(fullname, dtype=np.uint8)
+
+
+def decode_picture(file_bytes: np.ndarray, xscale=500, decode_width=0):
+    """
+    see :func:`read_picture`
+    :return: grayscale picture, None if it can not be decoded
+    """
+    if file_bytes is None or len(file_bytes) == 0: return None
+    flags = _decode_flags(file_bytes, decode_width)
+    # like the full color decoding the orientation tag is ignored
+    picture = cv2.imdecode(file_bytes, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if picture is None or not picture.data: return None
+    return cv2.resize(picture, (xscale, int(xscale * 2. / 3.)))
+
+
+def blur_score(file_bytes: np.ndarray) -> float:
+    """
+    :param file_bytes: content of a picture file
+    :return: variance of the laplacian as used by :func:`is_blurry`, nan if the picture can not be decoded
+    """
+    image = decode_picture(file_bytes, decode_width=blur_decode_width)
+    if image is None: return float("nan")
+    return variance_of_laplacian(image)
+
+
+def _decode_flags(file_bytes: np.ndarray, decode_width: int) -> int:
+    if not decode_width: return cv2.IMREAD_GRAYSCALE
+    try:
+        # only reads the header
+        with Image.open(io.BytesIO(file_bytes)) as img:
+            if not img.format == "JPEG": return cv2.IMREAD_GRAYSCALE
+            width = img.size[0]
+    except OSError:
+        return cv2.IMREAD_GRAYSCALE
+    for factor, flags in _reduced_modes:
+        if width // factor >= decode_width: return flags
+    return cv2.IMREAD_GRAYSCALE
@@ -2,8 +2,9 @@ import operator
 import os
 import subprocess
 import sys
+import tempfile
 from collections import OrderedDict
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Iterable, Tuple
 
 from EXIFnaming.helpers import settings
 from EXIFnaming.helpers.fileop import count_files, count_files_in, is_invalid_path, isfile
@@ -13,7 +14,8 @@ from EXIFnaming.models import ModelBase
 from sortedcollections import OrderedSet
 
 __all__ = ["read_exiftags", "call_exiftool", "askToContinue", "write_exiftags", "count_files_in", "write_exiftag",
-           "has_not_keys", "call_exiftool_direct", "read_exiftag"]
+           "has_not_keys", "call_exiftool_direct", "read_exiftag", "call_exiftool_batch", "write_exiftag_batch",
+           "read_exiftags_of_dirs", "read_exiftag_table"]
 
 
 def read_exiftags(inpath="", file_types: List[str] = settings.image_types, skipdirs: List[str] = None,
@@ -35,19 +37,7 @@ def read_exiftags(inpath="", file_types: List[str] = settings.image_types, skipd
     ListOfDicts = []
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if is_invalid_path(dirpath, skipdirs): continue
-        if count_files(filenames, file_types) == 0:
-            log().info("  No matching files in %s", os.path.relpath(dirpath, inpath))
-            continue
-        for filetype in file_types:
-            if count_files(filenames, [filetype]) == 0:
-                continue
-            out, err = call_exiftool(dirpath, "*" + filetype, [], False)
-            out = out[out.find("ExifTool Version Number"):]
-            out_split = out.split("========")
-            log().info("%4d tags of %s files extracted in %s", len(out_split), filetype,
-                       os.path.relpath(dirpath, inpath))
-            for tags in out_split:
-                ListOfDicts.append(decode_exiftags(tags))
+        ListOfDicts += _read_exiftags_of_dir(dirpath, filenames, file_types, inpath)
 
     outdict = listsOfDicts_to_dictOfLists(ListOfDicts)
     if not outdict: return {}
@@ -56,6 +46,39 @@ def read_exiftags(inpath="", file_types: List[str] = settings.image_types, skipd
     return outdict
 
 
+def read_exiftags_of_dirs(dirpaths: List[str], file_types: List[str] = settings.image_types) -> Dict[str, list]:
+    """
+    like read_exiftags but only for the files directly in dirpaths, sub directories are not visited
+    """
+    file_types = _get_distinct_filestypes(file_types)
+    inpath = os.getcwd()
+    ListOfDicts = []
+    for dirpath in dirpaths:
+        if not os.path.isdir(dirpath): continue
+        ListOfDicts += _read_exiftags_of_dir(dirpath, os.listdir(dirpath), file_types, inpath)
+    outdict = listsOfDicts_to_dictOfLists(ListOfDicts)
+    if not outdict: return {}
+    return sort_dict_by_date_and_model(outdict)
+
+
+def _read_exiftags_of_dir(dirpath: str, filenames: List[str], file_types: Set[str], inpath: str) -> List[dict]:
+    ListOfDicts = []
+    if count_files(filenames, file_types) == 0:
+        log().info("  No matching files in %s", os.path.relpath(dirpath, inpath))
+        return ListOfDicts
+    for filetype in file_types:
+        if count_files(filenames, [filetype]) == 0:
+            continue
+        out, err = call_exiftool(dirpath, "*" + filetype, [], False)
+        out = out[out.find("ExifTool Version Number"):]
+        out_split = out.split("========")
+        log().info("%4d tags of %s files extracted in %s", len(out_split), filetype,
+                   os.path.relpath(dirpath, inpath))
+        for tags in out_split:
+            ListOfDicts.append(decode_exiftags(tags))
+    return ListOfDicts
+
+
 def _get_distinct_filestypes(types: List[str]) -> Set[str]:
     return set([filetype.lower() for filetype in types])
 
@@ -89,6 +112,20 @@ def write_exiftag(tagDict: dict, inpath: str = "", filename: str = "", options:
     call_exiftool(inpath, filename, all_options, True)
 
 
+def write_exiftag_batch(entries: Iterable[Tuple[str, dict]], options: List[str] = None):
+    """
+    write tags of many files in one exiftool session
+    :param entries: pairs of file path and tag dict
+    :param options: options used for each file
+    """
+    if not options:
+        options = []
+    blocks = [options + tag_dict_to_options(tagDict) + [path] for path, tagDict in entries]
+    if not blocks: return
+    log().info("write tags of %d files", len(blocks))
+    call_exiftool_batch(blocks, True)
+
+
 def tag_dict_to_options(data: dict) -> list:
     options = []
     for key in data:
@@ -129,8 +166,7 @@ def call_exiftool_direct(options: List[str] = None, override=True) -> (str, str)
         options = []
     log_function_call_debug(call_exiftool_direct.__name__, options, override)
     path = getExiftoolPath()
-    encoding_args = ["-charset", settings.encoding_format, "-charset", "FileName=" + settings.encoding_format]
-    args = [path + "exiftool"] + encoding_args + options
+    args = [path + "exiftool"] + _encoding_args() + options
     if override and options: args.append("-overwrite_original_in_place")
     proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     (out, err) = proc.communicate()
@@ -145,6 +181,42 @@ def call_exiftool_direct(options: List[str] = None, override=True) -> (str, str)
     return out, err
 
 
+def call_exiftool_batch(blocks: List[List[str]], override=True, common_options: List[str] = None) -> (str, str):
+    """
+    runs one exiftool process executing each block of arguments separately
+    the arguments are passed via an argument file, so there is no limit for the number of blocks
+    """
+    if not common_options:
+        common_options = []
+    log_function_call_debug(call_exiftool_batch.__name__, len(blocks), override, common_options)
+    if not blocks: return "", ""
+    argfile = tempfile.NamedTemporaryFile("w", suffix=".args", delete=False, encoding=settings.encoding_format,
+                                          errors="replace")
+    try:
+        for i, block in enumerate(blocks):
+            if i > 0: argfile.write("-execute\n")
+            for arg in block:
+                argfile.write(_argfile_line(arg))
+        argfile.close()
+        options = ["-@", argfile.name, "-common_args"] + _encoding_args() + common_options
+        if override: options.append("-overwrite_original_in_place")
+        return call_exiftool_direct(options, False)
+    finally:
+        argfile.close()
+        os.remove(argfile.name)
+
+
+def _argfile_line(arg: str) -> str:
+    if not "\n" in arg and not "\r" in arg:
+        return arg + "\n"
+    arg = arg.replace("\\", "\\\\").replace("\r", "\\r").replace("\n", "\\n")
+    return "#[CSTR]" + arg + "\n"
+
+
+def _encoding_args() -> List[str]:
+    return ["-charset", settings.encoding_format, "-charset", "FileName=" + settings.encoding_format]
+
+
 def getExiftoolPath() -> str:
     if settings.exiftool_directory:
         path = os.path.join(settings.exiftool_directory, '')
@@ -214,6 +286,25 @@ def read_exiftag(dirpath: str, filename: str) -> Dict[str, str]:
     return decode_exiftags(out)
 
 
+def read_exiftag_table(paths: List[str], tag_names: List[str]) -> Dict[str, List[str]]:
+    """
+    read few tags of many files in one exiftool session
+    :param paths: files to read
+    :param tag_names: exiftool tag names like "DateTimeOriginal"
+    :return: values of the tags for each normalized path, "" for missing values
+    """
+    table = OrderedDict()
+    if not paths: return table
+    options = ["-T", "-f", "-Directory", "-FileName"] + ["-" + tag_name for tag_name in tag_names]
+    out, err = call_exiftool_batch([options + list(paths)], False)
+    for line in out.splitlines():
+        values = line.split("\t")
+        if not len(values) == len(tag_names) + 2: continue
+        path = os.path.normpath(os.path.join(values[0].replace("/", os.sep), values[1]))
+        table[path] = ["" if value == "-" else value for value in values[2:]]
+    return table
+
+
 def decode_exiftags(tags: str) -> Dict[str, str]:
     tagDict = OrderedDict()
     for tag in tags.split("\r\n"):
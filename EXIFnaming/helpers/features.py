@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+persistent store of the features of pictures used by picture.detect_blurry and picture.detect_similar
+
+the features of a file are identified by its inode, size and modification time, so they stay valid when the file is
+renamed or moved within the file system, while a modified file is analysed again
+the store is saved as arrays in the saves dir, entries of files that no longer exist are dropped on saving
+"""
+import os
+import re
+from typing import Tuple, Optional, Iterable
+
+import numpy as np
+
+from EXIFnaming.helpers.cv2op import similar_xscale, histogram_bins
+from EXIFnaming.helpers.program_dir import get_saves_dir
+
+__all__ = ["FeatureStore", "file_key"]
+
+FileKey = Tuple[int, int, int]
+thumbnail_shape = (int(similar_xscale * 2. / 3.), similar_xscale)
+
+
+def file_key(path: str) -> Optional[FileKey]:
+    """
+    :return: inode, size and modification time of the file, None if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class FeatureStore:
+    """
+    per file: blur score, grayscale thumbnail as compared for similarity, perceptual hash and color histogram
+    blur and similarity features are computed independently, has_blur and has_similar mark which are present
+    the thumbnails and histograms are kept in separate .npy files that are only mapped when similarity features are
+    used, their file names carry a version, so the .npz always refers to a complete pair of files
+    """
+
+    def __init__(self, previews: bool):
+        """
+        :param previews: whether the features are computed from the embedded previews, they are stored separately
+        """
+        self.prefix = get_saves_dir("features_previews" if previews else "features")
+        self.filename = self.prefix + ".npz"
+        self.n = 0
+        self.keys = np.zeros((0, 3), dtype=np.int64)
+        self.has_blur = np.zeros(0, dtype=bool)
+        self.blur = np.zeros(0, dtype=np.float32)
+        self.has_similar = np.zeros(0, dtype=bool)
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.similar_version = 0
+        # thumbnails and histograms, None until they are used
+        self._similar = None
+        self._similar_changed = False
+        if os.path.isfile(self.filename):
+            with np.load(self.filename) as data:
+                for name in self._array_names():
+                    setattr(self, name, data[name])
+                if "similar_version" in data:
+                    self.similar_version = int(data["similar_version"])
+                else:
+                    # thumbnails of older versions were stored in the npz, they are computed again
+                    self.has_similar[:] = False
+            self.n = len(self.keys)
+        self.rows = {tuple(key): row for row, key in enumerate(self.keys.tolist())}
+
+    @staticmethod
+    def _array_names():
+        return ["keys", "has_blur", "blur", "has_similar", "hashes"]
+
+    @staticmethod
+    def _similar_arrays():
+        return [("thumbnails", thumbnail_shape, np.uint8), ("histograms", (3 * histogram_bins,), np.float32)]
+
+    def _similar_filename(self, name: str, version: int) -> str:
+        return "%s_%s.%d.npy" % (self.prefix, name, version)
+
+    def __len__(self):
+        return self.n
+
+    def _row(self, key: FileKey) -> int:
+        if key in self.rows: return self.rows[key]
+        if self.n == len(self.keys):
+            for name in self._array_names():
+                setattr(self, name, _grown(getattr(self, name), 2 * len(self.keys)))
+        self.keys[self.n] = key
+        self.rows[key] = self.n
+        self.n += 1
+        return self.n - 1
+
+    def _load_similar(self) -> dict:
+        if self._similar is None:
+            self._similar = {}
+            for name, shape, dtype in self._similar_arrays():
+                filename = self._similar_filename(name, self.similar_version)
+                # rows added after the last save of the similarity features are not in the files
+                if self.similar_version and os.path.isfile(filename):
+                    self._similar[name] = np.load(filename, mmap_mode="r")
+                else:
+                    self._similar[name] = np.zeros((0,) + shape, dtype=dtype)
+        return self._similar
+
+    def get_blur(self, key: FileKey) -> Optional[float]:
+        """
+        :return: blur score, nan if the picture could not be decoded, None if it was not computed
+        """
+        row = self.rows.get(key)
+        if row is None or not self.has_blur[row]: return None
+        return float(self.blur[row])
+
+    def set_blur(self, key: FileKey, score: float):
+        row = self._row(key)
+        self.blur[row] = score
+        self.has_blur[row] = True
+
+    def get_similar(self, key: FileKey) -> Optional[Tuple[np.ndarray, int, np.ndarray]]:
+        """
+        :return: thumbnail, perceptual hash and color histogram, None if they were not computed
+        """
+        row = self.rows.get(key)
+        if row is None or not self.has_similar[row]: return None
+        similar = self._load_similar()
+        return similar["thumbnails"][row], int(self.hashes[row]), similar["histograms"][row]
+
+    def set_similar(self, key: FileKey, thumbnail: np.ndarray, phash: int, histogram: np.ndarray):
+        row = self._row(key)
+        similar = self._load_similar()
+        for name in similar:
+            # the mapped files are read only, they are copied into memory for the first change
+            if not self._similar_changed or len(similar[name]) <= row:
+                similar[name] = _grown(similar[name], max(row + 1, 2 * len(similar[name])))
+        self._similar_changed = True
+        similar["thumbnails"][row] = thumbnail
+        similar["histograms"][row] = histogram
+        self.hashes[row] = phash
+        self.has_similar[row] = True
+
+    def save(self, keep_keys: Iterable[Optional[FileKey]] = None):
+        """
+        :param keep_keys: keys of the existing files, the entries of all other keys are dropped, None keeps all
+        """
+        rows = np.arange(self.n)
+        if keep_keys is not None:
+            keep_rows = {self.rows[key] for key in keep_keys if key in self.rows}
+            rows = np.array(sorted(keep_rows), dtype=np.int64)
+        pruned = len(rows) < self.n
+        data = {name: getattr(self, name)[rows] for name in self._array_names()}
+        version = self.similar_version
+        if self._similar_changed or (pruned and version):
+            version += 1
+            for name, array in self._load_similar().items():
+                # rows that were never set are beyond the end of the array and have no similarity features
+                compacted = np.zeros((len(rows),) + array.shape[1:], dtype=array.dtype)
+                inside = rows < len(array)
+                compacted[inside] = array[rows[inside]]
+                np.save(self._similar_filename(name, version), compacted)
+        data["similar_version"] = np.array(version)
+        tmp_filename = self.prefix + "~.npz"
+        np.savez(tmp_filename, **data)
+        os.replace(tmp_filename, self.filename)
+        for name, array in data.items():
+            if not name == "similar_version": setattr(self, name, array)
+        self.n = len(rows)
+        self.rows = {tuple(key): row for row, key in enumerate(self.keys.tolist())}
+        if not version == self.similar_version:
+            self._similar = None
+            self._similar_changed = False
+            self._remove_old_similar_files(version)
+        self.similar_version = version
+
+    def _remove_old_similar_files(self, version: int):
+        dirname, prefix = os.path.split(self.prefix)
+        names = "|".join(name for name, _, _ in self._similar_arrays())
+        regex = re.compile(r"%s_(%s)\.(\d+)\.npy$" % (re.escape(prefix), names))
+        for filename in os.listdir(dirname):
+            match = regex.match(filename)
+            if not match or int(match.group(2)) == version: continue
+            try:
+                os.remove(os.path.join(dirname, filename))
+            except OSError:
+                # still mapped, e.g. on windows, it is removed by the next save
+                pass
+
+
+def _grown(array: np.ndarray, length: int) -> np.ndarray:
+    """
+    :return: writable copy of array with at least length rows, new rows are zero
+    """
+    grown = np.zeros((max(16, length, len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
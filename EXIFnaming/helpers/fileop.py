@@ -1,20 +1,24 @@
+import errno
 import os
 import re
 import shutil
 from collections import OrderedDict
-from typing import Iterable, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Tuple, Callable
 
 import numpy as np
 
 import EXIFnaming.helpers.constants as c
 from EXIFnaming.helpers.misc import askToContinue
 from EXIFnaming.helpers.program_dir import get_saves_dir, log
+from EXIFnaming.helpers.snapshot import Snapshot, write_snapshot, snapshot_ext
 from EXIFnaming.helpers import settings
 
 __all__ = ["count_files", "count_files_in", "is_invalid_path", "writeToFile", "renameInPlace", "moveFiles",
            "renameTemp", "move", "copyFilesTo", "get_filename_sorted_dirfiletuples", "moveToSubpath", "isfile",
            "moveBracketSeries", "moveSeries", "removeIfEmtpy", "get_relpath_depth", "move_media", "get_plain_filenames",
-           "filterFiles", "file_has_ext", "remove_ext", "get_plain_filenames_of_type"]
+           "filterFiles", "file_has_ext", "remove_ext", "get_plain_filenames_of_type", "SeriesClassifier",
+           "series_rule", "media_rule", "save_tagdict", "load_tagdict"]
 
 
 def moveFiles(filenames: List[Tuple[str, str]], path: str):
@@ -60,8 +64,23 @@ def isfile(*path):
     return os.path.isfile(os.path.join(*path))
 
 
-def save_tagdict(fileext: str, timestring: str, Tagdict: OrderedDict):
-    np.savez_compressed(get_saves_dir("Tags" + fileext + timestring), Tagdict=Tagdict)
+def save_tagdict(fileext: str, timestring: str, Tagdict: OrderedDict) -> str:
+    filename = get_saves_dir("Tags" + fileext + timestring + snapshot_ext)
+    write_snapshot(filename, Tagdict)
+    return filename
+
+
+def load_tagdict(filename: str, names: List[str] = None) -> OrderedDict:
+    """
+    :param filename: snapshot written by :func:`save_tagdict` or npz file written by older versions
+    :param names: tags to load, default is all
+    """
+    if filename.endswith(".npz"):
+        Tagdict = np.load(filename, allow_pickle=True)["Tagdict"].item()
+        if not names: return Tagdict
+        return OrderedDict([(name, Tagdict[name]) for name in names])
+    with Snapshot(filename) as snapshot:
+        return snapshot.to_tagdict(names)
 
 
 def writeToFile(path: str, content: str):
@@ -145,12 +164,149 @@ def move_media(dirpath: str, filenames: list, name_searches: list, dest: str) ->
     return other_filenames
 
 
-def copyFilesTo(files: list, path: str, prompt: bool = True):
+class SeriesClassifier:
+    """
+    assigns each filename to the sub directory of its kind in one scan
+    equivalent to applying moveBracketSeries and then moveSeries or move_media for each rule
+    the first matching rule wins, so the ordering of the rules matters
+    """
+
+    def __init__(self, rules: List[Tuple[str, Callable[[str], bool]]], bracket_series: bool = False):
+        """
+        :param rules: pairs of destination and predicate, see :func:`series_rule` and :func:`media_rule`
+        :param bracket_series: whether to assign bracket series to B1-B7 before applying the rules
+        """
+        self.rules = rules
+        self.bracket_series = bracket_series
+
+    def classify(self, filenames: List[str]) -> List[Tuple[str, str]]:
+        """
+        :return: pairs of filename and destination of all files to move
+        """
+        moves = []
+        bracket_list = []
+        main_old = None
+        counter2_old = "0"
+        for filename in filenames:
+            if self.bracket_series and file_has_ext(filename, settings.image_types):
+                match = _bracket_series_regex.search(filename)
+                if match:
+                    main, counter2 = match.groups()
+                    if not main == main_old:
+                        moves += [(name, "B" + counter2_old) for name in bracket_list]
+                        bracket_list = []
+                    bracket_list.append(filename)
+                    main_old = main
+                    counter2_old = counter2
+                    continue
+                moves += [(name, "B" + counter2_old) for name in bracket_list]
+                bracket_list = []
+                main_old = None
+            for dest, predicate in self.rules:
+                if predicate(filename):
+                    moves.append((filename, dest))
+                    break
+        moves += [(name, "B" + counter2_old) for name in bracket_list]
+        return moves
+
+
+_bracket_series_regex = re.compile(r'(\w+_[0-9]+)B([1-7])')
+
+
+def series_rule(series_type: str = "S", counter_match: str = r'([0-9]+)') -> Tuple[str, Callable[[str], bool]]:
+    """
+    rule of :class:`SeriesClassifier` doing the same as :func:`moveSeries`
+    """
+    regex = re.compile(r'_([0-9]+)' + series_type + counter_match)
+    return series_type, lambda filename: regex.search(filename) is not None
+
+
+def media_rule(name_searches: Iterable[str], dest: str) -> Tuple[str, Callable[[str], bool]]:
+    """
+    rule of :class:`SeriesClassifier` doing the same as :func:`move_media`
+    """
+    name_searches = tuple(name_searches)
+    return dest, lambda filename: any(name_search in filename for name_search in name_searches)
+
+
+def copyFilesTo(files: list, path: str, prompt: bool = True, mode: str = "auto", workers: int = 4):
+    """
+    :param files: files to copy
+    :param path: destination directory
+    :param prompt: whether to ask for confirmation
+    :param mode: one of copy_modes
+        auto: reflink if supported, else copy
+        hardlink: attention: tag changes on the destination also change the original
+        symlink: relative symbolic link, attention: tag changes on the destination also change the original
+        reflink: copy on write clone, fails if not supported by the file system
+        copy: full copy
+    :param workers: number of threads for full copies
+    """
     print(len(files), "matches are to be copied to", path)
     if prompt: askToContinue()
+    if not mode in copy_modes:
+        raise ValueError("mode has to be one of %r" % (copy_modes,))
     os.makedirs(path, exist_ok=True)
+    copies = []
     for filename in files:
-        shutil.copy2(filename, path)
+        dest = os.path.join(path, os.path.basename(filename))
+        if os.path.lexists(dest): os.remove(dest)
+        if mode == "copy" or not _link_file(filename, dest, mode):
+            copies.append((filename, dest))
+    if len(copies) > 1 and workers > 1:
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(lambda pair: shutil.copy2(*pair), copies))
+    else:
+        for pair in copies:
+            shutil.copy2(*pair)
+
+
+copy_modes = ("auto", "hardlink", "reflink", "symlink", "copy")
+
+
+def _link_file(src: str, dest: str, mode: str) -> bool:
+    """
+    :return: False if the file still has to be copied
+    """
+    if mode == "symlink":
+        os.symlink(os.path.relpath(src, os.path.dirname(dest)), dest)
+        return True
+    if mode == "hardlink":
+        os.link(src, dest)
+        return True
+    if mode == "reflink":
+        _reflink(src, dest)
+        return True
+    # auto: remember per pair of devices whether reflinks are supported, links are never made implicitly
+    devices = (os.stat(src).st_dev, os.stat(os.path.dirname(dest)).st_dev)
+    if not _link_file.reflink_supported.get(devices, True): return False
+    try:
+        _reflink(src, dest)
+    except OSError:
+        _link_file.reflink_supported[devices] = False
+        if os.path.lexists(dest): os.remove(dest)
+        return False
+    _link_file.reflink_supported[devices] = True
+    return True
+
+
+_link_file.reflink_supported = {}
+
+
+def _reflink(src: str, dest: str):
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported", src)
+    ficlone = 0x40049409
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), ficlone, src_file.fileno())
+        except OSError:
+            dest_file.close()
+            os.remove(dest)
+            raise
+    shutil.copystat(src, dest)
 
 
 def changeExtension(filename: str, ext: str):
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+streaming access to gpx files
+
+points are read via incremental xml parsing, so the formatting of the file does not matter
+and memory stays constant also for large track logs
+"""
+import os
+import warnings
+import xml.etree.ElementTree as ET
+from typing import Iterator, List, Tuple, IO
+
+import numpy as np
+
+__all__ = ["iter_gpx_points", "iter_gpx_chunks", "parse_gpx_times", "GpxWriter", "track_dtype", "read_track",
+           "interpolate_track", "merge_tracks", "simplify_track", "iter_track_chunks", "write_track",
+           "get_gpx_filenames", "save_track_cache", "load_track_cache", "read_gps_dir_track"]
+
+GpxPoint = Tuple[str, str, str, str, str]
+
+track_dtype = np.dtype([("time", "datetime64[s]"), ("lat", "f8"), ("lon", "f8"), ("ele", "f8")])
+
+_point_tags = ("trkpt", "wpt", "rtept")
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_gpx_points(filename: str) -> Iterator[GpxPoint]:
+    """
+    :return: iterator over (tag, lat, lon, ele, time) as found in the file
+    """
+    stack = []
+    for event, elem in ET.iterparse(filename, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        tag = _local_name(elem.tag)
+        if not tag in _point_tags: continue
+        ele = ""
+        time = ""
+        for child in elem:
+            child_tag = _local_name(child.tag)
+            if child_tag == "time":
+                time = (child.text or "").strip()
+            elif child_tag == "ele":
+                ele = (child.text or "").strip()
+        yield tag, elem.get("lat", ""), elem.get("lon", ""), ele, time
+        # detach processed points to keep the tree small
+        elem.clear()
+        if stack: stack[-1].remove(elem)
+
+
+def iter_gpx_chunks(filename: str, chunksize=10000) -> Iterator[List[GpxPoint]]:
+    chunk = []
+    for point in iter_gpx_points(filename):
+        chunk.append(point)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+
+def parse_gpx_times(times: List[str]) -> np.ndarray:
+    """
+    parse xml schema timestamps in bulk
+    timestamps with timezone offsets are converted to utc
+    :return: datetime64 array, NaT for empty or invalid entries
+    """
+    plain = [time[:-1] if time.endswith('Z') else time for time in times]
+    with warnings.catch_warnings():
+        # numpy converts offsets to utc but warns about it
+        warnings.simplefilter("ignore", UserWarning)
+        try:
+            return np.array(plain, dtype="datetime64[ms]").astype("datetime64[s]")
+        except ValueError:
+            return np.array([_parse_gpx_time(time) for time in plain], dtype="datetime64[s]")
+
+
+def _parse_gpx_time(time: str) -> np.datetime64:
+    try:
+        return np.datetime64(time, 'ms').astype("datetime64[s]")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _parse_floats(values: List[str]) -> np.ndarray:
+    try:
+        return np.array([value if value else "nan" for value in values], dtype=float)
+    except ValueError:
+        return np.array([_parse_float(value) for value in values], dtype=float)
+
+
+def _parse_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def read_track(filename: str) -> np.ndarray:
+    """
+    :return: points of the gpx file as array of track_dtype in order of the file
+    """
+    chunks = []
+    for points in iter_gpx_chunks(filename):
+        chunk = np.empty(len(points), dtype=track_dtype)
+        chunk["time"] = parse_gpx_times([point[4] for point in points])
+        chunk["lat"] = _parse_floats([point[1] for point in points])
+        chunk["lon"] = _parse_floats([point[2] for point in points])
+        chunk["ele"] = _parse_floats([point[3] for point in points])
+        chunks.append(chunk)
+    if not chunks: return np.empty(0, dtype=track_dtype)
+    return np.concatenate(chunks)
+
+
+def _valid_points(track: np.ndarray) -> np.ndarray:
+    valid = ~np.isnat(track["time"]) & ~np.isnan(track["lat"]) & ~np.isnan(track["lon"])
+    return track[valid]
+
+
+def merge_tracks(tracks: List[np.ndarray]) -> np.ndarray:
+    """
+    merge tracks to one time ordered track
+    points going back in time within a track and points with an already existing time are removed
+    """
+    cleaned = []
+    for track in tracks:
+        track = _valid_points(track)
+        if len(track) == 0: continue
+        seconds = track["time"].astype(np.int64)
+        latest_before = np.maximum.accumulate(np.concatenate([[np.iinfo(np.int64).min], seconds[:-1]]))
+        cleaned.append(track[seconds > latest_before])
+    if not cleaned: return np.empty(0, dtype=track_dtype)
+    track = np.concatenate(cleaned)
+    track = track[np.argsort(track["time"], kind="stable")]
+    _, first = np.unique(track["time"], return_index=True)
+    return track[first]
+
+
+def _to_meters(track: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # equirectangular projection is precise enough for the distances between neighbouring points
+    earth_radius = 6371000.
+    lat0 = np.radians(np.mean(track["lat"]))
+    x = np.radians(track["lon"]) * np.cos(lat0) * earth_radius
+    y = np.radians(track["lat"]) * earth_radius
+    return x, y
+
+
+def simplify_track(track: np.ndarray, tolerance=5., max_interval=600) -> np.ndarray:
+    """
+    Douglas-Peucker simplification using the synchronized euclidean distance,
+    which compares each point with the position interpolated at its time between the kept neighbours.
+    So interpolations of the simplified track differ at most by tolerance from those of the original track.
+    :param track: time sorted track as returned by :func:`merge_tracks`
+    :param tolerance: maximal deviation in meters
+    :param max_interval: maximal seconds between two kept points, so that the max gap rules of geotagging still hold
+    """
+    if len(track) < 3: return track
+    x, y = _to_meters(track)
+    seconds = track["time"].astype(np.int64)
+    keep = np.zeros(len(track), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(track) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2: continue
+        inner = slice(first + 1, last)
+        frac = (seconds[inner] - seconds[first]) / max(seconds[last] - seconds[first], 1)
+        dx = x[inner] - (x[first] + frac * (x[last] - x[first]))
+        dy = y[inner] - (y[first] + frac * (y[last] - y[first]))
+        distances = np.hypot(dx, dy)
+        index = int(np.argmax(distances))
+        if distances[index] <= tolerance:
+            if seconds[last] - seconds[first] <= max_interval: continue
+            middle = (seconds[first] + seconds[last]) // 2
+            index = int(np.argmin(np.abs(seconds[inner] - middle)))
+        split = first + 1 + index
+        keep[split] = True
+        stack.append((first, split))
+        stack.append((split, last))
+    return track[keep]
+
+
+def iter_track_chunks(track: np.ndarray, chunksize=10000) -> Iterator[Tuple[List[GpxPoint], np.ndarray]]:
+    """
+    :return: iterator over chunks of points formatted like read from a gpx file and their times
+    """
+    for start in range(0, len(track), chunksize):
+        chunk = track[start:start + chunksize]
+        times = [time + "Z" for time in np.datetime_as_string(chunk["time"], unit='s')]
+        points = [("trkpt", "%.7f" % lat, "%.7f" % lon, "" if np.isnan(ele) else "%.1f" % ele, time)
+                  for lat, lon, ele, time in zip(chunk["lat"], chunk["lon"], chunk["ele"], times)]
+        yield points, chunk["time"]
+
+
+def write_track(filename: str, track: np.ndarray, track_name: str = ""):
+    gpxWriter = GpxWriter(filename)
+    for points, times in iter_track_chunks(track):
+        for point in points:
+            gpxWriter.write(track_name, *point[1:])
+    gpxWriter.close()
+
+
+def get_gpx_filenames(gpxDir: str) -> List[str]:
+    return sorted(os.path.join(gpxDir, filename) for filename in os.listdir(gpxDir) if filename.endswith(".gpx"))
+
+
+_cache_name = "track_cache.npz"
+
+
+def _sources(filenames: List[str]) -> np.ndarray:
+    sources = []
+    for filename in filenames:
+        stat = os.stat(filename)
+        sources.append("%s|%d|%d" % (os.path.basename(filename), stat.st_size, stat.st_mtime_ns))
+    return np.array(sources, dtype=str)
+
+
+def save_track_cache(gpxDir: str, filenames: List[str], track: np.ndarray):
+    np.savez_compressed(os.path.join(gpxDir, _cache_name), track=track, sources=_sources(filenames))
+
+
+def load_track_cache(gpxDir: str, filenames: List[str] = None):
+    """
+    :return: cached track if it was created from the current gpx files, else None
+    """
+    filename = os.path.join(gpxDir, _cache_name)
+    if not os.path.isfile(filename): return None
+    if filenames is None: filenames = get_gpx_filenames(gpxDir)
+    with np.load(filename) as cache:
+        if not np.array_equal(cache["sources"], _sources(filenames)): return None
+        return cache["track"]
+
+
+def read_gps_dir_track(gpxDir: str) -> np.ndarray:
+    """
+    :return: cached track of all gpx files in gpxDir if up to date, else the merged raw tracks
+    """
+    filenames = get_gpx_filenames(gpxDir)
+    track = load_track_cache(gpxDir, filenames)
+    if track is not None: return track
+    return merge_tracks([read_track(filename) for filename in filenames])
+
+
+def interpolate_track(track: np.ndarray, times: np.ndarray, max_gap=1800) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    linear interpolation of positions like exiftool -geotag
+    :param track: time sorted array of track_dtype
+    :param times: utc datetime64 array
+    :param max_gap: maximal seconds between two track points to interpolate between them,
+        also maximal seconds to the first or last track point for times outside of the track
+    :return: array of track_dtype with the interpolated positions, mask of times that got a position
+    """
+    times = np.asarray(times, dtype="datetime64[s]")
+    out = np.zeros(len(times), dtype=track_dtype)
+    out["time"] = times
+    out["lat"] = out["lon"] = out["ele"] = np.nan
+    valid = np.zeros(len(times), dtype=bool)
+    if len(track) == 0 or len(times) == 0: return out, valid
+
+    track_seconds = track["time"].astype(np.int64)
+    seconds = times.astype(np.int64)
+    right = np.searchsorted(track_seconds, seconds, side="right")
+    right = np.clip(right, 1, len(track) - 1) if len(track) > 1 else np.zeros(len(times), dtype=int)
+    left = np.maximum(right - 1, 0)
+    gap = track_seconds[right] - track_seconds[left]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = np.where(gap > 0, (seconds - track_seconds[left]) / gap, 0.)
+
+    inside = (track_seconds[0] <= seconds) & (seconds <= track_seconds[-1])
+    before = seconds < track_seconds[0]
+    after = seconds > track_seconds[-1]
+    # outside of the track the nearest point is taken
+    frac = np.where(before, 0., np.where(after, 1., frac))
+    exact = (track_seconds[left] == seconds) | (track_seconds[right] == seconds)
+    valid[inside] = (gap[inside] <= max_gap) | exact[inside]
+    valid[before] = track_seconds[0] - seconds[before] <= max_gap
+    valid[after] = seconds[after] - track_seconds[-1] <= max_gap
+    valid &= ~np.isnat(times)
+    if len(track) == 1: frac[:] = 0.
+
+    for key in ("lat", "lon", "ele"):
+        values = track[key][left] + frac * (track[key][right] - track[key][left])
+        out[key] = np.where(valid, values, np.nan)
+    return out, valid
+
+
+class GpxWriter:
+    """
+    writes points as tracks, a new track is started each time the track name changes
+    """
+    header = '<?xml version="1.0" encoding="UTF-8"?>\n' + \
+             '<gpx version="1.1" creator="EXIFnaming" xmlns="http://www.topografix.com/GPX/1/1">\n'
+
+    def __init__(self, filename: str):
+        self.file: IO = open(filename, "w", encoding="UTF-8")
+        self.file.write(GpxWriter.header)
+        self.track_name = None
+
+    def write(self, track_name: str, lat: str, lon: str, ele: str, time: str):
+        if track_name != self.track_name:
+            self._close_track()
+            self.file.write("<trk><name>%s</name><trkseg>\n" % _escape(track_name))
+            self.track_name = track_name
+        self.file.write('<trkpt lat="%s" lon="%s">' % (lat, lon))
+        if ele: self.file.write("<ele>%s</ele>" % ele)
+        if time: self.file.write("<time>%s</time>" % time)
+        self.file.write("</trkpt>\n")
+
+    def _close_track(self):
+        if self.track_name is None: return
+        self.file.write("</trkseg></trk>\n")
+
+    def close(self):
+        self._close_track()
+        self.file.write("</gpx>\n")
+        self.file.close()
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+append-only journal of the executed moves and renames, stored in the saves dir
+
+per move only the directory and file name before and after are stored as ids of a string table,
+so the journal stays small and a run can be read without loading the others
+"""
+import json
+import os
+import time
+from typing import List, Tuple, Dict
+
+import numpy as np
+
+from EXIFnaming.helpers.program_dir import get_saves_dir
+
+__all__ = ["MoveJournal"]
+
+
+class MoveJournal:
+    """
+    files of the journal directory:
+        strings.bin: utf-8 encoded strings without separator
+        string_ends.bin: int64 end offset of each string in strings.bin
+        records.bin: one record of string ids per move
+        runs.jsonl: one line per run with its name, time, first record and the sizes of the files after the run
+
+    a run is only valid once its line is written, data of an interrupted append is truncated by the next append
+    """
+    record_dtype = np.dtype([("old_dir", "<u4"), ("old_name", "<u4"), ("new_dir", "<u4"), ("new_name", "<u4")])
+
+    def __init__(self, dirname: str = ""):
+        self.dirname = dirname if dirname else get_saves_dir("journal")
+        os.makedirs(self.dirname, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dirname, name)
+
+    def runs(self) -> List[dict]:
+        return self._read_runs()[0]
+
+    def _read_runs(self) -> Tuple[List[dict], int]:
+        runs = []
+        size = 0
+        if not os.path.isfile(self._path("runs.jsonl")): return runs, size
+        with open(self._path("runs.jsonl"), "rb") as file:
+            for line in file:
+                try:
+                    runs.append(json.loads(line.decode("utf-8")))
+                except ValueError:
+                    # last line of an interrupted append
+                    break
+                size += len(line)
+        return runs, size
+
+    def last_run(self, name: str = "") -> int:
+        """
+        :return: index of the last run, restricted to runs of name if given, -1 if there is none
+        """
+        runs = self.runs()
+        for i in reversed(range(len(runs))):
+            if not name or runs[i]["name"] == name: return i
+        return -1
+
+    def append(self, name: str, moves: List[Tuple[str, str]]) -> int:
+        """
+        :param name: name of the run, usually the name of the function doing the moves
+        :param moves: pairs of source and destination path
+        :return: index of the new run
+        """
+        runs, runs_size = self._read_runs()
+        sizes = _sizes_after(runs[-1] if runs else None)
+        sizes["runs"] = runs_size
+        self._truncate(sizes)
+        directory_ids = self._get_directory_ids(sizes)
+
+        strings = []
+
+        def add_string(string: str) -> int:
+            strings.append(string)
+            return sizes["strings"] + len(strings) - 1
+
+        def directory_id(directory: str) -> int:
+            if not directory in directory_ids:
+                directory_ids[directory] = add_string(directory)
+            return directory_ids[directory]
+
+        records = np.empty(len(moves), dtype=MoveJournal.record_dtype)
+        for i, (src, dst) in enumerate(moves):
+            src_dir, src_name = os.path.split(src)
+            dst_dir, dst_name = os.path.split(dst)
+            records[i] = (directory_id(src_dir), add_string(src_name), directory_id(dst_dir), add_string(dst_name))
+
+        encoded = [string.encode("utf-8") for string in strings]
+        ends = sizes["bytes"] + np.cumsum([len(string) for string in encoded], dtype=np.int64)
+        _append(self._path("strings.bin"), b"".join(encoded))
+        _append(self._path("string_ends.bin"), ends.astype("<i8").tobytes())
+        _append(self._path("records.bin"), records.tobytes())
+        run = {"name": name, "time": time.strftime("%Y-%m-%d %H:%M:%S"), "first": sizes["records"],
+               "count": len(moves), "records": sizes["records"] + len(moves),
+               "strings": sizes["strings"] + len(strings), "bytes": int(ends[-1]) if len(ends) else sizes["bytes"]}
+        _append(self._path("runs.jsonl"), (json.dumps(run) + "\n").encode("utf-8"))
+        return len(runs)
+
+    def moves(self, run: int = -1, directory: str = "") -> List[Tuple[str, str]]:
+        """
+        :param run: index of the run, negative values count from the end
+        :param directory: only moves with a destination in this directory or below, relative to the working directory
+        :return: pairs of source and destination path of the run
+        """
+        runs = self.runs()
+        if not runs: return []
+        run = runs[run]
+        records = self._records(run["records"])[run["first"]:run["first"] + run["count"]]
+        strings = _StringTable(self._path("strings.bin"), self._path("string_ends.bin"), run["strings"])
+        if directory:
+            directory = os.path.abspath(directory)
+            dir_ids = np.unique(records["new_dir"]).tolist()
+            dir_ids = [dir_id for dir_id in dir_ids if _is_in_directory(strings[dir_id], directory)]
+            records = records[np.isin(records["new_dir"], dir_ids)]
+        records = records.tolist()
+        strings.decode(sorted(set(string_id for record in records for string_id in record)))
+        return [(os.path.join(strings[old_dir], strings[old_name]), os.path.join(strings[new_dir], strings[new_name]))
+                for old_dir, old_name, new_dir, new_name in records]
+
+    def _records(self, count: int) -> np.ndarray:
+        if not count: return np.empty(0, dtype=MoveJournal.record_dtype)
+        return np.memmap(self._path("records.bin"), dtype=MoveJournal.record_dtype, mode="r", shape=(count,))
+
+    def _truncate(self, sizes: Dict[str, int]):
+        for name, size in [("strings.bin", sizes["bytes"]), ("string_ends.bin", sizes["strings"] * 8),
+                           ("records.bin", sizes["records"] * MoveJournal.record_dtype.itemsize),
+                           ("runs.jsonl", sizes["runs"])]:
+            path = self._path(name)
+            if os.path.isfile(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def _get_directory_ids(self, sizes: Dict[str, int]) -> Dict[str, int]:
+        records = self._records(sizes["records"])
+        strings = _StringTable(self._path("strings.bin"), self._path("string_ends.bin"), sizes["strings"])
+        dir_ids = np.unique(np.concatenate([records["old_dir"], records["new_dir"]]))
+        return {strings[dir_id]: int(dir_id) for dir_id in dir_ids.tolist()}
+
+
+class _StringTable:
+
+    def __init__(self, data_filename: str, ends_filename: str, count: int):
+        self.ends = np.memmap(ends_filename, dtype="<i8", mode="r", shape=(count,)) if count else np.empty(0)
+        size = int(self.ends[-1]) if count else 0
+        self.data = np.memmap(data_filename, dtype=np.uint8, mode="r", shape=(size,)) if size else np.empty(0)
+        self._decoded = {}
+
+    def __getitem__(self, i: int) -> str:
+        if not i in self._decoded:
+            self.decode([i])
+        return self._decoded[i]
+
+    def decode(self, ids: List[int]):
+        """
+        decode the strings of ids with one read of the range they span
+        """
+        ids = [i for i in ids if not i in self._decoded]
+        if not ids: return
+        first = min(ids)
+        # ends[j] is the end of string first + j - 1
+        ends = ([0] if first == 0 else []) + self.ends[max(first - 1, 0):max(ids) + 1].tolist()
+        data = self.data[ends[0]:ends[-1]].tobytes()
+        for i in ids:
+            j = i - first
+            self._decoded[i] = data[ends[j] - ends[0]:ends[j + 1] - ends[0]].decode("utf-8")
+
+
+def _sizes_after(run: dict = None) -> Dict[str, int]:
+    if run is None: return {"records": 0, "strings": 0, "bytes": 0}
+    return {"records": run["records"], "strings": run["strings"], "bytes": run["bytes"]}
+
+
+def _is_in_directory(path: str, directory: str) -> bool:
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+def _append(filename: str, data: bytes):
+    with open(filename, "ab") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+plan of file moves and renames that is computed first and executed separately
+
+a plan can be printed instead of executed, executed by several threads and resumed or reverted after an interruption
+"""
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import List, Tuple, Iterator, Dict
+
+from EXIFnaming.helpers.journal import MoveJournal
+from EXIFnaming.helpers.misc import askToContinue
+from EXIFnaming.helpers.program_dir import get_saves_dir, log
+
+__all__ = ["MovePlan", "execute_plan", "resume_plan", "checkpoint_filename"]
+
+# step: source, destination, level - steps of the same level are independent of each other
+Step = Tuple[str, str, int]
+
+
+class MovePlan:
+    """
+    moves are pairs of source and destination path
+    destinations that are sources of other moves are handled, cycles are broken with temporary names
+    a barrier separates stages, all moves of a stage are done before the moves of the next stage
+    the name is used for the run in the journal
+    """
+    temp_postfix = ".moveplan~"
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.stages = [[]]
+
+    def __len__(self):
+        return sum(len(stage) for stage in self.stages)
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for stage in self.stages:
+            yield from stage
+
+    def add(self, src: str, dst: str):
+        if src == dst: return
+        self.stages[-1].append((src, dst))
+
+    def barrier(self):
+        if self.stages[-1]: self.stages.append([])
+
+    def steps(self) -> List[Step]:
+        """
+        :return: steps ordered by level
+        """
+        steps = []
+        level_offset = 0
+        for stage in self.stages:
+            stage_steps = _order_stage(stage, MovePlan.temp_postfix)
+            steps += [(src, dst, level + level_offset) for src, dst, level in stage_steps]
+            if stage_steps: level_offset = steps[-1][2] + 1
+        return steps
+
+    def dump(self, filename: str = ""):
+        """
+        log the moves and optionally write them to filename
+        """
+        lines = ["%-50s\t %-50s" % (src, dst) for src, dst in self]
+        for line in lines:
+            log().info("move: %s", line)
+        if filename:
+            with open(filename, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+
+
+def _order_stage(moves: List[Tuple[str, str]], temp_postfix: str) -> List[Step]:
+    # a move is blocked by the move whose source is its destination
+    # as destinations are distinct, the moves form chains and simple cycles
+    # paths are compared as the file system does, so a case only rename is blocked by its own source
+    sources = {}
+    destinations = set()
+    distinct_moves = []
+    for src, dst in moves:
+        if _path_key(src) in sources:
+            log().warning("skip move of %s to %s - already planned to be moved", src, dst)
+            continue
+        if _path_key(dst) in destinations:
+            log().warning("skip move of %s to %s - destination already planned", src, dst)
+            continue
+        sources[_path_key(src)] = len(distinct_moves)
+        destinations.add(_path_key(dst))
+        distinct_moves.append([src, dst])
+    blocker = [sources.get(_path_key(dst), -1) for src, dst in distinct_moves]
+    levels = [-1] * len(distinct_moves)
+    temp_steps = []
+    for start in range(len(distinct_moves)):
+        path = []
+        on_path = set()
+        i = start
+        while i >= 0 and levels[i] < 0 and not i in on_path:
+            path.append(i)
+            on_path.add(i)
+            i = blocker[i]
+        if i >= 0 and i in on_path:
+            # cycle: each move blocks at most one other move, so the cycle starts at path[0] == i
+            # a move blocked by itself is a case only rename
+            # break it by moving the source of i to a temporary name first
+            src = distinct_moves[i][0]
+            temp = src + temp_postfix + str(len(temp_steps))
+            temp_steps.append((src, temp, 0))
+            distinct_moves[i][0] = temp
+            level = 1
+        else:
+            level = levels[i] + 1 if i >= 0 else 0
+        for j in reversed(path):
+            levels[j] = level
+            level += 1
+    steps = temp_steps + [(src, dst, level) for (src, dst), level in zip(distinct_moves, levels)]
+    return sorted(steps, key=lambda step: step[2])
+
+
+def _path_key(path: str) -> str:
+    key = os.path.normcase(path)
+    if _is_case_insensitive(os.path.dirname(path)): key = key.casefold()
+    return key
+
+
+@lru_cache(maxsize=1024)
+def _is_case_insensitive(directory: str) -> bool:
+    """
+    :return: whether the existing directory is on a case insensitive file system, e.g. NTFS or APFS
+    """
+    directory = os.path.abspath(directory)
+    while directory.swapcase() == directory:
+        parent = os.path.dirname(directory)
+        if parent == directory: return False
+        directory = parent
+    try:
+        return os.path.samefile(directory, directory.swapcase())
+    except OSError:
+        return False
+
+
+def checkpoint_filename() -> str:
+    return get_saves_dir("moveplan_checkpoint.jsonl")
+
+
+def execute_plan(plan: MovePlan, workers: int = 1, dry_run: bool = False, progress_every: int = 1000):
+    """
+    execute the moves of plan and record them in the :class:`journal.MoveJournal`
+    the steps are written to a checkpoint file first, so that an interrupted run can be continued via
+    :func:`resume_plan`
+    :param plan: moves to execute
+    :param workers: number of threads issuing the moves of one level, useful on network shares
+    :param dry_run: only log the moves
+    :param progress_every: log progress after this number of moves
+    """
+    if dry_run:
+        plan.dump()
+        return
+    steps = plan.steps()
+    if not steps: return
+    checkpoint = checkpoint_filename()
+    if os.path.isfile(checkpoint):
+        log().warning("%s contains unfinished moves of an earlier run, they are discarded if you continue - "
+                      "use resume_plan to finish them", checkpoint)
+        askToContinue()
+    _write_checkpoint(checkpoint, plan.name, steps)
+    _execute_steps(plan.name, steps, {}, checkpoint, workers, progress_every)
+
+
+def resume_plan(workers: int = 1, progress_every: int = 1000, revert: bool = False) -> bool:
+    """
+    finish the moves of an interrupted :func:`execute_plan`
+    :param revert: undo the moves done so far instead of finishing the remaining ones
+    :return: whether there were unfinished moves
+    """
+    checkpoint = checkpoint_filename()
+    if not os.path.isfile(checkpoint): return False
+    name = ""
+    steps = []
+    done = {}
+    with open(checkpoint, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # last line of an interrupted write
+                continue
+            if entry[0] == "plan":
+                name = entry[1]
+            elif entry[0] == "step":
+                steps.append(tuple(entry[1:]))
+            elif entry[0] == "done":
+                done[entry[1]] = entry[2]
+    if revert:
+        name = "revert " + name
+        steps = _reverted_steps(steps, done)
+        done = {}
+        _write_checkpoint(checkpoint, name, steps)
+        log().info("revert %d moves", len(steps))
+    else:
+        log().info("resume %d of %d moves", len(steps) - len(done), len(steps))
+    _execute_steps(name, steps, done, checkpoint, workers, progress_every)
+    return True
+
+
+def _write_checkpoint(checkpoint: str, name: str, steps: List[Step]):
+    with open(checkpoint, "w", encoding="utf-8") as file:
+        file.write(json.dumps(["plan", name]) + "\n")
+        for step in steps:
+            file.write(json.dumps(["step"] + list(step)) + "\n")
+
+
+def _reverted_steps(steps: List[Step], done: Dict[int, bool]) -> List[Step]:
+    # the last level is undone first, so a move is undone before the moves that made room for it
+    if not steps: return []
+    last_level = steps[-1][2]
+    reverted = [(steps[i][1], steps[i][0], last_level - steps[i][2]) for i in sorted(done) if done[i]]
+    return sorted(reverted, key=lambda step: step[2])
+
+
+def _execute_steps(name: str, steps: List[Step], done: Dict[int, bool], checkpoint: str, workers: int,
+                   progress_every: int):
+    with open(checkpoint, "a", encoding="utf-8") as file:
+
+        def finish(i: int, moved: bool):
+            done[i] = moved
+            file.write(json.dumps(["done", i, moved]) + "\n")
+            if progress_every and len(done) % progress_every == 0:
+                log().info("moved %d of %d", len(done), len(steps))
+
+        first = 0
+        while first < len(steps):
+            last = first
+            while last < len(steps) and steps[last][2] == steps[first][2]:
+                last += 1
+            indices = [i for i in range(first, last) if not i in done]
+            for directory in set([os.path.dirname(steps[i][1]) for i in indices]):
+                if directory: os.makedirs(directory, exist_ok=True)
+            if workers > 1 and len(indices) > 1:
+                with ThreadPoolExecutor(workers) as executor:
+                    futures = {executor.submit(_execute_step, *steps[i][:2]): i for i in indices}
+                    for future in as_completed(futures):
+                        finish(futures[future], future.result())
+            else:
+                for i in indices:
+                    finish(i, _execute_step(*steps[i][:2]))
+            file.flush()
+            first = last
+    MoveJournal().append(name, _joined_moves([steps[i][:2] for i in sorted(done) if done[i]]))
+    os.remove(checkpoint)
+    log().info("moved %d of %d", len(done), len(steps))
+
+
+def _joined_moves(moves: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    # moves via a temporary name are recorded as one move
+    temp_regex = re.compile(re.escape(MovePlan.temp_postfix) + r"\d+$")
+    origins = {}
+    joined = []
+    for src, dst in moves:
+        src = origins.pop(src, src)
+        if temp_regex.search(dst):
+            origins[dst] = src
+        else:
+            joined.append((src, dst))
+    return joined
+
+
+def _execute_step(src: str, dst: str) -> bool:
+    if not os.path.lexists(src):
+        log().warning("skip move of %s - does not exist", src)
+    elif os.path.lexists(dst):
+        log().warning("skip move of %s - %s already exists", src, dst)
+    else:
+        os.rename(src, dst)
+        return True
+    return False
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Aho-Corasick automaton to find which of many patterns are substrings of a text
+"""
+from collections import deque
+from typing import List, Set
+
+__all__ = ["PatternMatcher"]
+
+
+class PatternMatcher:
+    """
+    patterns are added first, the automaton is built on the first search
+    a search costs time linear in the length of the text plus the number of matches
+    """
+
+    def __init__(self, patterns: List[str] = None):
+        self.patterns = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        self._output_link = [0]
+        self._built = True
+        for pattern in patterns or []:
+            self.add(pattern)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def add(self, pattern: str) -> int:
+        """
+        :return: index of the pattern
+        """
+        node = 0
+        for char in pattern:
+            if not char in self._goto[node]:
+                self._goto[node][char] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+                self._output_link.append(0)
+            node = self._goto[node][char]
+        self._outputs[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+        self._built = False
+        return len(self.patterns) - 1
+
+    def _build(self):
+        queue = deque()
+        for node in self._goto[0].values():
+            self._fail[node] = 0
+            self._output_link[node] = 0
+            queue.append(node)
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and not char in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail
+                self._output_link[child] = fail if self._outputs[fail] else self._output_link[fail]
+                queue.append(child)
+        self._built = True
+
+    def find(self, text: str) -> Set[int]:
+        """
+        :return: indices of the patterns that occur in text, the empty pattern occurs in every text
+        """
+        if not self._built: self._build()
+        found = set(self._outputs[0])
+        node = 0
+        for char in text:
+            while node and not char in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            match = node if self._outputs[node] else self._output_link[node]
+            while match:
+                found.update(self._outputs[match])
+                match = self._output_link[match]
+        return found
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+embedded preview pictures of JPEG and RW2 files
+
+JPEGs of Lumix cameras carry a large preview in the MPF segment and a thumbnail in the exif segment,
+RW2 raws carry a JPEG of the raw picture (JpgFromRaw) which carries a thumbnail again.
+The previews are located by parsing the file structure, so only the bytes of the preview are read.
+Files the parser does not understand are read via one exiftool call.
+
+dependencies: exiftool for unknown formats
+"""
+import base64
+import json
+import mmap
+import os
+import struct
+from typing import List, Tuple, Dict, Optional, Iterable
+
+from EXIFnaming.helpers.decode import call_exiftool_batch
+from EXIFnaming.helpers.program_dir import log
+
+__all__ = ["find_previews", "jpeg_size", "read_preview", "read_previews_exiftool", "PreviewReader"]
+
+# start of frame markers, which contain the size of the picture
+_sof_markers = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# JPEGInterchangeFormat and its length, JpgFromRaw of RW2 with the length as count
+_thumbnail_offset_tag = 0x0201
+_thumbnail_length_tag = 0x0202
+_jpg_from_raw_tag = 0x002e
+_mp_entry_tag = 0xB002
+_exiftool_tags = ["PreviewImage", "JpgFromRaw", "ThumbnailImage"]
+
+
+def _jpeg_segments(data, start: int) -> Iterable[Tuple[int, int, int]]:
+    """
+    :return: marker, start and length of the payload of each segment before the picture data
+    """
+    pos = start + 2
+    while pos + 4 <= len(data):
+        if not data[pos] == 0xFF: return
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        if marker == 0xD9 or marker == 0xDA: return
+        length = struct.unpack_from(">H", data, pos + 2)[0]
+        yield marker, pos + 4, length - 2
+        pos += 2 + length
+
+
+def jpeg_size(data, start: int = 0) -> Optional[Tuple[int, int]]:
+    """
+    :return: width and height of the JPEG starting at start, None if it is no JPEG
+    """
+    if not data[start:start + 2] == b"\xff\xd8": return None
+    for marker, payload, length in _jpeg_segments(data, start):
+        if marker in _sof_markers and length >= 5:
+            height, width = struct.unpack_from(">HH", data, payload + 1)
+            return width, height
+    return None
+
+
+def _read_ifd_entries(data, tiff_start: int, endian: str, offset: int) -> Tuple[Dict[int, Tuple[int, int, int]], int]:
+    """
+    :return: type, count and value or offset per tag, offset of the next ifd
+    """
+    pos = tiff_start + offset
+    n = struct.unpack_from(endian + "H", data, pos)[0]
+    entries = {}
+    for i in range(n):
+        tag, type_, count = struct.unpack_from(endian + "HHI", data, pos + 2 + 12 * i)
+        # short values are stored left aligned in the 4 bytes
+        if type_ == 3 and count == 1:
+            value = struct.unpack_from(endian + "H", data, pos + 2 + 12 * i + 8)[0]
+        else:
+            value = struct.unpack_from(endian + "I", data, pos + 2 + 12 * i + 8)[0]
+        entries[tag] = (type_, count, value)
+    next_offset = struct.unpack_from(endian + "I", data, pos + 2 + 12 * n)[0]
+    return entries, next_offset
+
+
+def _tiff_previews(data, tiff_start: int) -> List[Tuple[int, int]]:
+    endian = {b"II": "<", b"MM": ">"}[bytes(data[tiff_start:tiff_start + 2])]
+    offset = struct.unpack_from(endian + "I", data, tiff_start + 4)[0]
+    previews = []
+    visited = set()
+    while offset and not offset in visited and len(visited) < 8:
+        visited.add(offset)
+        entries, offset = _read_ifd_entries(data, tiff_start, endian, offset)
+        if _thumbnail_offset_tag in entries and _thumbnail_length_tag in entries:
+            previews.append((tiff_start + entries[_thumbnail_offset_tag][2], entries[_thumbnail_length_tag][2]))
+        if _jpg_from_raw_tag in entries:
+            type_, count, value = entries[_jpg_from_raw_tag]
+            previews.append((tiff_start + value, count))
+    return previews
+
+
+def _mpf_previews(data, tiff_start: int) -> List[Tuple[int, int]]:
+    endian = {b"II": "<", b"MM": ">"}[bytes(data[tiff_start:tiff_start + 2])]
+    offset = struct.unpack_from(endian + "I", data, tiff_start + 4)[0]
+    entries, _ = _read_ifd_entries(data, tiff_start, endian, offset)
+    if not _mp_entry_tag in entries: return []
+    type_, count, value = entries[_mp_entry_tag]
+    previews = []
+    for i in range(count // 16):
+        attribute, size, image_offset = struct.unpack_from(endian + "III", data, tiff_start + value + 16 * i)
+        # offset 0 is the main picture
+        if image_offset: previews.append((tiff_start + image_offset, size))
+    return previews
+
+
+def find_previews(data) -> Optional[List[Tuple[int, int]]]:
+    """
+    :param data: content of a JPEG, RW2 or TIFF file, e.g. a mmap
+    :return: offset and length of the embedded JPEGs, None if the format is not understood
+    """
+    try:
+        if data[:2] == b"\xff\xd8":
+            previews = []
+            for marker, payload, length in _jpeg_segments(data, 0):
+                if marker == 0xE1 and data[payload:payload + 6] == b"Exif\x00\x00":
+                    previews += _tiff_previews(data, payload + 6)
+                elif marker == 0xE2 and data[payload:payload + 4] == b"MPF\x00":
+                    previews += _mpf_previews(data, payload + 4)
+        elif data[:2] in [b"II", b"MM"]:
+            previews = _tiff_previews(data, 0)
+        else:
+            return None
+    except (struct.error, KeyError, IndexError):
+        return None
+    return [(offset, length) for offset, length in previews if
+            offset + length <= len(data) and data[offset:offset + 2] == b"\xff\xd8"]
+
+
+def _choose_preview(data, previews: List[Tuple[int, int]], min_width: int) -> Optional[bytes]:
+    # the smallest preview that is large enough is the fastest to decode
+    candidates = []
+    for offset, length in previews:
+        size = jpeg_size(data, offset)
+        if size and size[0] >= min_width: candidates.append((size[0], offset, length))
+    if not candidates: return None
+    width, offset, length = min(candidates)
+    return bytes(data[offset:offset + length])
+
+
+def read_preview(path: str, min_width: int = 0) -> Tuple[bool, Optional[bytes]]:
+    """
+    :param min_width: minimal width of the preview, 0: only check whether the format is understood
+    :return: whether the format is understood, smallest embedded JPEG that is at least min_width wide or None
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0: return False, None
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            previews = find_previews(data)
+            if previews is None: return False, None
+            if not min_width: return True, None
+            return True, _choose_preview(data, previews, min_width)
+
+
+def read_previews_exiftool(paths: List[str]) -> Dict[str, List[bytes]]:
+    """
+    read the embedded JPEGs of many files in one exiftool session
+    :return: embedded JPEGs for each normalized path
+    """
+    previews = {}
+    if not paths: return previews
+    options = ["-json", "-b"] + ["-" + tag for tag in _exiftool_tags]
+    out, err = call_exiftool_batch([options + list(paths)], False)
+    for entry in json.loads(out or "[]"):
+        path = os.path.normpath(entry["SourceFile"].replace("/", os.sep))
+        previews[path] = [base64.b64decode(entry[tag][len("base64:"):]) for tag in _exiftool_tags if
+                          str(entry.get(tag, "")).startswith("base64:")]
+    return previews
+
+
+class PreviewReader:
+    """
+    reads previews that are at least min_width wide,
+    :meth:`prefetch` reads the previews of files with unknown format via one exiftool call
+    """
+
+    def __init__(self, min_width: int):
+        self.min_width = min_width
+        self._exiftool_previews = {}
+
+    def prefetch(self, paths: List[str]):
+        unknown = []
+        for path in paths:
+            try:
+                if not read_preview(path)[0]: unknown.append(path)
+            except OSError:
+                continue
+        if not unknown: return
+        try:
+            previews = read_previews_exiftool(unknown)
+        except FileNotFoundError as e:
+            log().warning("can not read previews of %d files: %s", len(unknown), e)
+            return
+        for path, datas in previews.items():
+            datas = [data for data in datas if (jpeg_size(data) or (0, 0))[0] >= self.min_width]
+            if datas: self._exiftool_previews[path] = min(datas, key=len)
+
+    def read(self, path: str) -> Optional[bytes]:
+        """
+        :return: preview of the file, None if it has none that is large enough
+        """
+        normpath = os.path.normpath(path)
+        if normpath in self._exiftool_previews: return self._exiftool_previews[normpath]
+        try:
+            return read_preview(path, self.min_width)[1]
+        except OSError:
+            return None
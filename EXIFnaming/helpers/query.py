@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+predicates and per tag indexes to query a :class:`catalog.Catalog`
+
+example: (Eq("Camera Model Name", "DMC-TZ101") & Range("F Number", 2, 4)) | Prefix("File Name", "ISL19")
+"""
+import os
+from abc import ABC, abstractmethod
+from functools import reduce
+from typing import Iterable
+
+import numpy as np
+
+from EXIFnaming.helpers.misc import tofloat
+
+__all__ = ["Predicate", "Eq", "In", "Prefix", "Range", "And", "Or", "TagIndex", "to_number"]
+
+
+class TagIndex:
+    """
+    sorted index of one column of the catalog
+    the column is dictionary encoded: values are the sorted distinct values and codes the value index of each row
+    """
+
+    def __init__(self, values: np.ndarray, codes: np.ndarray):
+        self.values = values
+        self.order = np.argsort(codes, kind="stable")
+        self.offsets = np.searchsorted(codes[self.order], np.arange(len(values) + 1))
+        self._numeric_order = None
+        self._numeric_sorted = None
+        self._codes = codes
+
+    def _rows_of_codes(self, first: int, last: int) -> np.ndarray:
+        return np.sort(self.order[self.offsets[first]:self.offsets[last]])
+
+    def equal(self, value: str) -> np.ndarray:
+        code = np.searchsorted(self.values, value)
+        if code == len(self.values) or not self.values[code] == value:
+            return np.empty(0, dtype=np.int64)
+        return self._rows_of_codes(code, code + 1)
+
+    def prefix(self, prefix: str) -> np.ndarray:
+        first = np.searchsorted(self.values, prefix, side="left")
+        last = np.searchsorted(self.values, prefix + chr(0x10FFFF), side="left")
+        return self._rows_of_codes(first, last)
+
+    def range(self, min_value: float = None, max_value: float = None, inclusive=True) -> np.ndarray:
+        self._build_numeric()
+        first = 0
+        last = len(self._numeric_sorted)
+        if min_value is not None:
+            first = np.searchsorted(self._numeric_sorted, min_value, side="left" if inclusive else "right")
+        if max_value is not None:
+            last = np.searchsorted(self._numeric_sorted, max_value, side="right" if inclusive else "left")
+        return np.sort(self._numeric_order[first:last])
+
+    def _build_numeric(self):
+        if self._numeric_order is not None: return
+        numbers = np.array([to_number(value) for value in self.values], dtype=float)
+        row_numbers = numbers[self._codes]
+        order = np.argsort(row_numbers, kind="stable")
+        order = order[~np.isnan(row_numbers[order])]
+        self._numeric_order = order
+        self._numeric_sorted = row_numbers[order]
+
+    def save(self, filename: str, version: int):
+        self._build_numeric()
+        np.savez(filename, version=version, order=self.order, offsets=self.offsets,
+                 numeric_order=self._numeric_order, numeric_sorted=self._numeric_sorted)
+
+    @staticmethod
+    def load(filename: str, version: int, values: np.ndarray, codes: np.ndarray):
+        """
+        :return: index stored in filename if it belongs to the catalog version else None
+        """
+        if not os.path.isfile(filename): return None
+        with np.load(filename) as data:
+            if not data["version"] == version: return None
+            index = TagIndex.__new__(TagIndex)
+            index.values = values
+            index._codes = codes
+            index.order = data["order"]
+            index.offsets = data["offsets"]
+            index._numeric_order = data["numeric_order"]
+            index._numeric_sorted = data["numeric_sorted"]
+        return index
+
+
+def to_number(value: str) -> float:
+    """
+    :return: value converted like :func:`misc.tofloat`, nan if it is no number
+    """
+    number = tofloat(value) if value else None
+    return np.nan if number is None else number
+
+
+class Predicate(ABC):
+
+    @abstractmethod
+    def rows(self, catalog) -> np.ndarray:
+        """
+        :return: sorted row indices of the catalog fulfilling the predicate
+        """
+
+    def __and__(self, other: 'Predicate') -> 'Predicate':
+        return And(self, other)
+
+    def __or__(self, other: 'Predicate') -> 'Predicate':
+        return Or(self, other)
+
+
+class Eq(Predicate):
+
+    def __init__(self, tag: str, value: str):
+        self.tag = tag
+        self.value = value
+
+    def rows(self, catalog) -> np.ndarray:
+        index = catalog.index(self.tag)
+        if index is None: return np.empty(0, dtype=np.int64)
+        return index.equal(self.value)
+
+
+class In(Predicate):
+
+    def __init__(self, tag: str, values: Iterable[str]):
+        self.tag = tag
+        self.values = list(values)
+
+    def rows(self, catalog) -> np.ndarray:
+        index = catalog.index(self.tag)
+        if index is None or not self.values: return np.empty(0, dtype=np.int64)
+        return reduce(np.union1d, [index.equal(value) for value in self.values])
+
+
+class Prefix(Predicate):
+
+    def __init__(self, tag: str, prefix: str):
+        self.tag = tag
+        self.prefix = prefix
+
+    def rows(self, catalog) -> np.ndarray:
+        index = catalog.index(self.tag)
+        if index is None: return np.empty(0, dtype=np.int64)
+        return index.prefix(self.prefix)
+
+
+class Range(Predicate):
+    """
+    numeric interval, values are converted like fractions '1/250' to float
+    """
+
+    def __init__(self, tag: str, min_value: float = None, max_value: float = None, inclusive=True):
+        self.tag = tag
+        self.min_value = min_value
+        self.max_value = max_value
+        self.inclusive = inclusive
+
+    def rows(self, catalog) -> np.ndarray:
+        index = catalog.index(self.tag)
+        if index is None: return np.empty(0, dtype=np.int64)
+        return index.range(self.min_value, self.max_value, self.inclusive)
+
+
+class And(Predicate):
+
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def rows(self, catalog) -> np.ndarray:
+        return reduce(np.intersect1d, [predicate.rows(catalog) for predicate in self.predicates])
+
+
+class Or(Predicate):
+
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def rows(self, catalog) -> np.ndarray:
+        return reduce(np.union1d, [predicate.rows(catalog) for predicate in self.predicates])
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+report files that are written row by row while the rows are produced
+"""
+import csv
+import gzip
+from typing import List, Iterable
+
+__all__ = ["ReportWriter"]
+
+
+class ReportWriter:
+    """
+    the format is chosen by the file extension:
+        .csv: semicolon separated like the csv files of this program, utf-8 encoded
+        .tsv: tab separated, utf-8 encoded
+        else: text with columns padded to widths, or formatted by row_format, in the encoding of the platform
+    with an additional .gz extension the file is gzip compressed
+    """
+
+    def __init__(self, filename: str, columns: List[str], widths: List[int] = None, row_format: str = "",
+                 header: bool = True, append: bool = False):
+        """
+        :param filename: report file
+        :param columns: names of the columns, values of each row are written in this order
+        :param widths: minimal width of each column of a text report, default is 30
+        :param row_format: format string of a line of a text report, default is built from widths
+        :param header: write the column names as first line
+        :param append: append to an existing report instead of overwriting it
+        """
+        self.filename = filename
+        self.columns = columns
+        self.compress = filename.endswith(".gz")
+        name = filename[:-len(".gz")] if self.compress else filename
+        mode = "at" if append else "wt"
+        # text reports keep the line ends and the encoding of the platform like the reports written before
+        is_table = name.endswith(".csv") or name.endswith(".tsv")
+        newline = "" if is_table else None
+        encoding = "utf-8" if is_table else None
+        if self.compress:
+            self._file = gzip.open(filename, mode, encoding=encoding, newline=newline)
+        else:
+            self._file = open(filename, mode, encoding=encoding, newline=newline, buffering=1 << 20)
+        self._csv_writer = None
+        if name.endswith(".csv"):
+            self._csv_writer = csv.writer(self._file, delimiter=";", lineterminator="\r\n")
+        elif name.endswith(".tsv"):
+            self._csv_writer = csv.writer(self._file, delimiter="\t", lineterminator="\n", quoting=csv.QUOTE_NONE,
+                                          escapechar="\\")
+        elif not row_format:
+            if not widths: widths = [30] * len(columns)
+            row_format = "".join(["%%-%ds\t" % width for width in widths]) + "\n"
+        self.row_format = row_format
+        self.rows = 0
+        if header: self._write(columns)
+
+    def _write(self, values: list):
+        if self._csv_writer:
+            self._csv_writer.writerow(values)
+        else:
+            self._file.write(self.row_format % tuple(values))
+
+    def write_row(self, values: list):
+        self._write(values)
+        self.rows += 1
+
+    def write_rows(self, rows: Iterable[list]):
+        for values in rows:
+            self.write_row(values)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+rotation of pictures for readexif.rotate
+
+JPEGs are rotated losslessly by jpegtran if it is installed, other pictures by rotating the pixels with Pillow.
+The rotations run in a process pool, each rotated file is recorded in the saves dir with its size and
+modification time, so a second run skips it without looking at the picture again.
+
+dependencies: Pillow, jpegtran (optional), exiftool for set_orientations
+"""
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Tuple, Dict, Iterator
+
+from EXIFnaming.helpers.decode import call_exiftool_batch
+from EXIFnaming.helpers.program_dir import get_saves_dir, log
+
+__all__ = ["RotationJob", "rotate_pictures", "rotate_picture", "set_orientations", "file_stamp", "load_rotated",
+           "is_rotated", "RotatedRecord", "jpeg_types"]
+
+# source path, target path, angle in degrees counter clockwise
+RotationJob = Tuple[str, str, int]
+Stamp = Tuple[int, int]
+
+jpeg_types = (".jpg", ".jpeg")
+# summary line exiftool prints for each executed block
+_updated_regex = re.compile(r"^\s*(\d+) image files updated", re.MULTILINE)
+
+
+def rotate_picture(job: RotationJob, lossless=True) -> Tuple[RotationJob, str]:
+    """
+    :param lossless: rotate JPEGs by jpegtran, falls back to pixels if jpegtran is missing
+        or the size of the picture is no multiple of the jpeg block size
+    :return: job and how it was rotated: "lossless", "pixels" or "" if the picture could not be read
+    """
+    src, target, angle = job
+    if lossless and src.lower().endswith(jpeg_types) and _rotate_jpegtran(src, target, angle):
+        return job, "lossless"
+    try:
+        _rotate_pixels(src, target, angle)
+    except OSError:
+        return job, ""
+    return job, "pixels"
+
+
+def _rotate_jpegtran(src: str, target: str, angle: int) -> bool:
+    jpegtran = shutil.which("jpegtran")
+    if not jpegtran: return False
+    tmp = target + "~"
+    # jpegtran rotates clockwise, -perfect fails instead of dropping the partial blocks at the edges
+    args = [jpegtran, "-copy", "all", "-perfect", "-rotate", str(-angle % 360), "-outfile", tmp, src]
+    if subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0:
+        if os.path.isfile(tmp): os.remove(tmp)
+        return False
+    os.replace(tmp, target)
+    return True
+
+
+def _rotate_pixels(src: str, target: str, angle: int):
+    from PIL import Image
+
+    with Image.open(src) as img:
+        img_rot = img.rotate(angle, expand=True)
+        options = {"exif": img.info["exif"]} if "exif" in img.info else {}
+        if img.format == "JPEG": options["quality"] = 99
+        img_rot.save(target, img.format, **options)
+
+
+def rotate_pictures(jobs: List[RotationJob], processes: int = None, lossless=True) \
+        -> Iterator[Tuple[RotationJob, str]]:
+    """
+    :param processes: number of processes, default is the number of cpus, 1 rotates in this process
+    :param lossless: see :func:`rotate_picture`
+    :return: finished jobs and how they were rotated in order of the jobs
+    """
+    rotate_job = partial(rotate_picture, lossless=lossless)
+    if processes == 1 or len(jobs) < 2:
+        yield from map(rotate_job, jobs)
+        return
+    chunksize = max(1, len(jobs) // (8 * (processes or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(processes) as executor:
+        yield from executor.map(rotate_job, jobs, chunksize=chunksize)
+
+
+def set_orientations(paths: List[str], orientation: int) -> List[str]:
+    """
+    write the orientation tag of all files in one exiftool call, the pixels are not touched
+    :param orientation: numeric value of the exif orientation, e.g. 1 for "Horizontal (normal)"
+    :return: the files that were written
+    """
+    if not paths: return []
+    log().info("set orientation of %d files", len(paths))
+    # one block per file, so the summary of each block tells whether its file was written
+    out, err = call_exiftool_batch([["-Orientation#=%d" % orientation, path] for path in paths], True)
+    updated = [int(match) for match in _updated_regex.findall(out)]
+    if not len(updated) == len(paths):
+        log().warning("orientation of %d files unknown, exiftool output: %r", len(paths), out)
+        return []
+    return [path for path, count in zip(paths, updated) if count > 0]
+
+
+def file_stamp(path: str) -> Stamp:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _record_filename() -> str:
+    return get_saves_dir("rotated.txt")
+
+
+def load_rotated() -> Dict[str, Stamp]:
+    """
+    :return: stamps of the files written by earlier rotations per path
+    """
+    rotated = {}
+    if not os.path.isfile(_record_filename()): return rotated
+    with open(_record_filename(), "r", encoding="utf-8") as file:
+        for line in file:
+            entries = line.rstrip("\n").split("\t")
+            if not len(entries) == 3: continue
+            rotated[entries[0]] = (int(entries[1]), int(entries[2]))
+    return rotated
+
+
+def is_rotated(path: str, rotated: Dict[str, Stamp]) -> bool:
+    """
+    :return: whether path was written by a rotation and not changed since then
+    """
+    return path in rotated and os.path.isfile(path) and rotated[path] == file_stamp(path)
+
+
+class RotatedRecord:
+    """
+    appends each written file to the record immediately, so an interrupted run is recorded too
+    """
+
+    def __init__(self):
+        self._file = open(_record_filename(), "a", encoding="utf-8")
+
+    def add(self, path: str, stamp: Stamp):
+        self._file.write("%s\t%d\t%d\n" % (path, stamp[0], stamp[1]))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+columnar snapshot files of a Tagdict, as written by readexif.rename into the saves dir
+
+each column is stored as a compressed dictionary of its distinct values and compressed blocks of value codes,
+the schema with the position of each block is stored at the end of the file
+a column or a row range is read by decompressing only its blocks from the memory mapped file
+"""
+import json
+import mmap
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from EXIFnaming.helpers.program_dir import get_saves_dir, log
+
+__all__ = ["Snapshot", "SnapshotWriter", "write_snapshot", "convert_npz_snapshot", "convert_npz_snapshots",
+           "snapshot_ext"]
+
+snapshot_ext = ".tags"
+_magic = b"EXIFSNP1"
+_trailer = struct.Struct("<Q8s")
+
+
+class SnapshotWriter:
+    """
+    columns are written one after the other, so a Tagdict can be converted column by column
+    """
+
+    def __init__(self, filename: str, rows: int, block_rows: int = 65536):
+        self.filename = filename
+        self.rows = rows
+        self.block_rows = block_rows
+        self.columns = []
+        self._file = open(filename + "~", "wb")
+        self._file.write(_magic)
+
+    def add_column(self, name: str, values: list):
+        if not len(values) == self.rows:
+            raise ValueError("column %s has %d instead of %d rows" % (name, len(values), self.rows))
+        dictionary, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+        codes = codes.astype(_code_dtype(len(dictionary)))
+        # fixed width values compress well and are decoded without a loop
+        dictionary = dictionary.astype("<U%d" % max(dictionary.itemsize // 4, 1))
+        column = {"name": name, "values": len(dictionary), "dictionary_dtype": dictionary.dtype.str,
+                  "codes": codes.dtype.str, "dictionary": self._write_block(dictionary.tobytes()),
+                  "blocks": [self._write_block(codes[start:start + self.block_rows].tobytes())
+                             for start in range(0, self.rows, self.block_rows)]}
+        self.columns.append(column)
+
+    def _write_block(self, data: bytes) -> List[int]:
+        offset = self._file.tell()
+        compressed = zlib.compress(data, 6)
+        self._file.write(compressed)
+        return [offset, len(compressed)]
+
+    def close(self):
+        schema = json.dumps({"rows": self.rows, "block_rows": self.block_rows, "columns": self.columns}).encode("utf-8")
+        self._file.write(schema)
+        self._file.write(_trailer.pack(len(schema), _magic))
+        self._file.close()
+        os.replace(self.filename + "~", self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self.filename + "~")
+
+
+class Snapshot:
+    """
+    read access to a snapshot file
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        schema_length, magic = _trailer.unpack(self._data[-_trailer.size:])
+        if not magic == _magic or not self._data[:len(_magic)] == _magic:
+            self.close()
+            raise ValueError("%s is no snapshot file" % filename)
+        schema_end = len(self._data) - _trailer.size
+        schema = json.loads(self._data[schema_end - schema_length:schema_end].decode("utf-8"))
+        self.rows = schema["rows"]
+        self.block_rows = schema["block_rows"]
+        self.columns = OrderedDict([(column["name"], column) for column in schema["columns"]])
+        self._dictionaries = {}
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, name: str):
+        return name in self.columns
+
+    def names(self) -> List[str]:
+        return list(self.columns.keys())
+
+    def dictionary(self, name: str) -> np.ndarray:
+        """
+        :return: sorted distinct values of the column
+        """
+        if not name in self._dictionaries:
+            column = self.columns[name]
+            data = self._read_block(column["dictionary"])
+            self._dictionaries[name] = np.frombuffer(data, dtype=column["dictionary_dtype"], count=column["values"])
+        return self._dictionaries[name]
+
+    def codes(self, name: str, start: int = 0, stop: int = None) -> np.ndarray:
+        """
+        :return: index of the value in :meth:`dictionary` for the rows from start to stop
+        """
+        column = self.columns[name]
+        stop = self.rows if stop is None else min(stop, self.rows)
+        if start >= stop: return np.empty(0, dtype=column["codes"])
+        first_block = start // self.block_rows
+        last_block = (stop - 1) // self.block_rows
+        codes = np.concatenate([np.frombuffer(self._read_block(column["blocks"][i]), dtype=column["codes"])
+                                for i in range(first_block, last_block + 1)])
+        offset = first_block * self.block_rows
+        return codes[start - offset:stop - offset]
+
+    def column(self, name: str, start: int = 0, stop: int = None) -> np.ndarray:
+        return self.dictionary(name)[self.codes(name, start, stop)]
+
+    def paths(self, rows: np.ndarray = None) -> List[str]:
+        directories = self.column("Directory")
+        filenames = self.column("File Name")
+        if rows is not None:
+            directories = directories[rows]
+            filenames = filenames[rows]
+        return [os.path.join(directory, filename) for directory, filename in zip(directories, filenames)]
+
+    def to_tagdict(self, names: List[str] = None, start: int = 0, stop: int = None) -> Dict[str, list]:
+        """
+        :return: tags as returned by :func:`decode.read_exiftags`
+        """
+        tagdict = OrderedDict()
+        for name in names if names else self.columns:
+            tagdict[name] = self.column(name, start, stop).tolist()
+        return tagdict
+
+    def _read_block(self, block: List[int]) -> bytes:
+        offset, length = block
+        return zlib.decompress(self._data[offset:offset + length])
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _code_dtype(values: int) -> np.dtype:
+    for dtype in ["<u1", "<u2"]:
+        if values <= np.iinfo(dtype).max + 1: return np.dtype(dtype)
+    return np.dtype("<u4")
+
+
+def write_snapshot(filename: str, tagdict: Dict[str, list]):
+    rows = len(list(tagdict.values())[0]) if tagdict else 0
+    with SnapshotWriter(filename, rows) as writer:
+        for name, values in tagdict.items():
+            writer.add_column(name, values)
+
+
+def convert_npz_snapshot(filename: str, remove=False) -> str:
+    """
+    convert a snapshot written by older versions with np.savez_compressed
+    the pickled Tagdict has to be loaded completely, but each column is released after it is written
+    :return: name of the new file
+    """
+    with np.load(filename, allow_pickle=True) as data:
+        tagdict = data["Tagdict"].item()
+    new_filename = filename[:-len(".npz")] + snapshot_ext
+    rows = len(list(tagdict.values())[0]) if tagdict else 0
+    with SnapshotWriter(new_filename, rows) as writer:
+        for name in list(tagdict.keys()):
+            writer.add_column(name, tagdict.pop(name))
+    if remove: os.remove(filename)
+    return new_filename
+
+
+def convert_npz_snapshots(dirname: str = "", remove=False):
+    """
+    convert all Tags*.npz snapshots of the saves dir one after the other
+    :param dirname: directory of the snapshots, default is the saves dir
+    :param remove: remove the npz files after conversion
+    """
+    if not dirname: dirname = get_saves_dir()
+    for filename in sorted(os.listdir(dirname)):
+        if not filename.startswith("Tags") or not filename.endswith(".npz"): continue
+        log().info("convert %s", filename)
+        convert_npz_snapshot(os.path.join(dirname, filename), remove)
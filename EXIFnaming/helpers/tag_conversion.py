@@ -1,8 +1,8 @@
-import operator
 import os
 import re
 from collections import OrderedDict
-from typing import List
+from functools import lru_cache
+from typing import List, Dict, Tuple, Any
 
 import numpy as np
 from sortedcollections import OrderedSet
@@ -12,7 +12,8 @@ from EXIFnaming.helpers.decode import read_exiftag
 from EXIFnaming.helpers.program_dir import log
 from EXIFnaming.helpers.tags import SceneModeAbbreviations
 
-__all__ = ["FileMetaData", "Location", "add_dict", "FilenameAccessor", "FilenameBuilder"]
+__all__ = ["FileMetaData", "Location", "add_dict", "FilenameAccessor", "FilenameBuilder", "parse_filenames",
+           "counter_runs", "distinct_tags"]
 
 
 class Location:
@@ -383,46 +384,15 @@ class FilenameAccessor:
 
     def __init__(self, filename):
         self.filename = filename
-        if '.' in filename:
-            self.name, self.ext = filename.rsplit('.', 1)
-            self.ext = "." + self.ext
-        else:
-            self.name = self.filename
-            self.ext = ''
-        self.main = []
-        self.pre = ""
-        self.primmodes = []
-        self.primtags = []
-        self.counter = ""
-        self.scenes = []
-        self.processes = []
-        self.posttags = []
-        self._split_filename()
-
-    def _split_filename(self):
-        filename_splited = self.name.split('_')
-        if len(filename_splited) == 0: return
-        counter_index = self._counter_index()
-        if counter_index < 0: return
-        for i, subname in enumerate(filename_splited):
-            if not subname: continue
-            if i > counter_index:
-                if is_process_tag(subname):
-                    self.processes.append(subname)
-                elif is_scene_abbreviation(subname):
-                    self.scenes.append(subname)
-                else:
-                    self.posttags.append(subname)
-            else:
-                self.main.append(subname)
-                if i == 0:
-                    self.pre = subname
-                elif i == counter_index:
-                    self.counter = subname
-                elif subname.isupper() or subname.isnumeric():
-                    self.primmodes.append(subname)
-                else:
-                    self.primtags.append(subname)
+        _check_parse_cache()
+        self.name, self.ext, main, primmodes, primtags, scenes, processes, posttags, self.pre, self.counter = \
+            _parse_filename(filename)
+        self.main = list(main)
+        self.primmodes = list(primmodes)
+        self.primtags = list(primtags)
+        self.scenes = list(scenes)
+        self.processes = list(processes)
+        self.posttags = list(posttags)
 
     def tags(self) -> List[str]:
         return self.primtags + self.posttags
@@ -457,34 +427,6 @@ class FilenameAccessor:
         arr = self.main[:-1] + [self.counter_main()]
         return "_".join(arr)
 
-    def _counter_index_longest(self) -> int:
-        filename_splited = self.name.split('_')
-        if len(filename_splited) == 0: return -1
-        # get index of counter via longest item that looks like a counter
-        indeces = [(i, len(e)) for i, e in enumerate(filename_splited) if self._is_counter(e)]
-        if len(indeces) == 0:
-            return -1
-        if len(indeces) == 1:
-            return indeces[0][0]
-        indeces.sort(key=operator.itemgetter(1))
-        return indeces[-1][0]
-
-    def _counter_index(self) -> int:
-        filename_splited = self.name.split('_')
-        if len(filename_splited) == 0: return -1
-        indeces = [i for i, e in enumerate(filename_splited) if self._is_counter(e)]
-        if len(indeces) == 0:
-            return -1
-        return indeces[-1]
-
-    def _is_counter(self, subname) -> bool:
-        if not subname:
-            return False
-        if self.ext in settings.video_types:
-            return subname[0] == "M" and np.chararray.isdigit(subname[-1])
-        starts_and_ends_with_digit = (np.chararray.isdigit(subname[0]) and np.chararray.isdigit(subname[-1]))
-        return starts_and_ends_with_digit
-
     def is_direct_successor_of(self, other: 'FilenameAccessor'):
         selfcounter = int(self.counter_main())
         othercounter = int(other.counter_main())
@@ -498,6 +440,148 @@ class FilenameAccessor:
         return self.posttags[0] if len(self.posttags) > 0 else ""
 
 
+@lru_cache(maxsize=2 ** 16)
+def _parse_filename(filename: str) -> tuple:
+    """
+    split the filename in one pass over its parts
+    results are cached as the same names are parsed again by sanitize_filename, the csv generators and setexif
+    :return: name, ext, main, primmodes, primtags, scenes, processes, posttags, pre, counter
+    """
+    name, dot, ext = filename.rpartition('.')
+    if dot:
+        ext = dot + ext
+    else:
+        name, ext = ext, ''
+    main, primmodes, primtags, scenes, processes, posttags = [], [], [], [], [], []
+    pre = ""
+    counter = ""
+    subnames = name.split('_')
+    is_video = ext in _parse_filename.video_types
+    counter_index = -1
+    for i in range(len(subnames) - 1, -1, -1):
+        subname = subnames[i]
+        if subname and subname[-1].isdigit() and (subname[0] == "M" if is_video else subname[0].isdigit()):
+            counter_index = i
+            break
+    if counter_index >= 0:
+        for i, subname in enumerate(subnames):
+            if not subname: continue
+            if i > counter_index:
+                kind = _posttag_kind(subname)
+                if kind == 1:
+                    processes.append(subname)
+                elif kind == 2:
+                    scenes.append(subname)
+                else:
+                    posttags.append(subname)
+            else:
+                main.append(subname)
+                if i == 0:
+                    pre = subname
+                elif i == counter_index:
+                    counter = subname
+                elif subname.isupper() or subname.isnumeric():
+                    primmodes.append(subname)
+                else:
+                    primtags.append(subname)
+    return (name, ext, tuple(main), tuple(primmodes), tuple(primtags), tuple(scenes), tuple(processes),
+            tuple(posttags), pre, counter)
+
+
+_parse_filename.video_types = settings.video_types
+
+
+def _check_parse_cache():
+    if not _parse_filename.video_types == settings.video_types:
+        _parse_filename.cache_clear()
+        _parse_filename.video_types = settings.video_types
+
+
+@lru_cache(maxsize=2 ** 12)
+def _posttag_kind(subname: str) -> int:
+    """
+    :return: 1 for process tags, 2 for scene abbreviations, 0 for other tags
+    """
+    if is_process_tag(subname): return 1
+    if is_scene_abbreviation(subname): return 2
+    return 0
+
+
+def parse_filenames(filenames: List[str]) -> Dict[str, np.ndarray]:
+    """
+    parse many filenames into columns
+    :return: columns filename, pre, counter, counter_main, counter_number (-1 if not a number), first_posttag and
+        primtags, posttags, scenes, processes as arrays of tuples
+    """
+    _check_parse_cache()
+    parsed = [_parse_filename(filename) for filename in filenames]
+    columns = OrderedDict()
+    columns["filename"] = np.array(filenames, dtype=object)
+    for key, position in [("primtags", 4), ("scenes", 5), ("processes", 6), ("posttags", 7), ("pre", 8),
+                          ("counter", 9)]:
+        column = np.empty(len(parsed), dtype=object)
+        column[:] = [entry[position] for entry in parsed]
+        columns[key] = column
+    counter_main = []
+    for counter in columns["counter"]:
+        match = FilenameAccessor.counter_main_regex.search(counter)
+        counter_main.append(match.group(1) if match else counter)
+    columns["counter_main"] = np.array(counter_main, dtype=object)
+    columns["counter_number"] = np.array([int(counter) if counter.isdigit() else -1 for counter in counter_main],
+                                         dtype=np.int64)
+    columns["first_posttag"] = np.array([posttags[0] if posttags else "" for posttags in columns["posttags"]],
+                                        dtype=object)
+    return columns
+
+
+def counter_runs(columns: Dict[str, np.ndarray], groups: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    runs of rows where each row is a direct successor of the one before
+    like :func:`FilenameAccessor.is_direct_successor_of`, rows without number counter are runs of their own
+    :param columns: result of :func:`parse_filenames`
+    :param groups: optional group of each row, runs do not cross groups
+    :return: indices of the first and of the last row of each run
+    """
+    n = len(columns["filename"])
+    if n == 0: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    numbers = columns["counter_number"]
+    diff = numbers[1:] - numbers[:-1]
+    breaks = (columns["pre"][1:] != columns["pre"][:-1]) | (columns["first_posttag"][1:] !=
+                                                           columns["first_posttag"][:-1])
+    breaks |= (diff < 0) | (diff > 1) | (numbers[1:] < 0) | (numbers[:-1] < 0)
+    if groups is not None: breaks |= groups[1:] != groups[:-1]
+    firsts = np.concatenate([[0], np.flatnonzero(breaks) + 1])
+    lasts = np.concatenate([firsts[1:] - 1, [n - 1]])
+    return firsts, lasts
+
+
+def distinct_tags(columns: Dict[str, np.ndarray], groups: np.ndarray = None) -> Dict[Any, List[str]]:
+    """
+    primtags and posttags of the rows of each group in order of first occurrence
+    :param columns: result of :func:`parse_filenames`
+    :param groups: optional group of each row, default is one group 0
+    """
+    n = len(columns["filename"])
+    if groups is None: groups = np.zeros(n, dtype=np.int64)
+    tags = [primtags + posttags for primtags, posttags in zip(columns["primtags"], columns["posttags"])]
+    lengths = np.array([len(row_tags) for row_tags in tags], dtype=np.int64)
+    out = OrderedDict()
+    if lengths.sum() == 0: return out
+    flat_tags = np.array([tag for row_tags in tags for tag in row_tags], dtype=str)
+    flat_groups = np.repeat(np.asarray(groups), lengths)
+    group_values, group_codes = np.unique(flat_groups, return_inverse=True)
+    tag_values, tag_codes = np.unique(flat_tags, return_inverse=True)
+    keys = group_codes.astype(np.int64) * len(tag_values) + tag_codes
+    unique_keys, first_index = np.unique(keys, return_index=True)
+    order = np.argsort(first_index, kind="stable")
+    unique_keys = unique_keys[order]
+    group_values = group_values.tolist()
+    tag_values = tag_values.tolist()
+    for key in unique_keys.tolist():
+        out.setdefault(group_values[key // len(tag_values)], []).append(tag_values[key % len(tag_values)])
+    return out
+
+
 class FilenameBuilder:
 
     def __init__(self, old_filename: str):
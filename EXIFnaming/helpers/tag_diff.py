@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+difference of the tags of two states of the same files
+a state is a :class:`snapshot.Snapshot` or a :class:`catalog.Catalog`
+
+files are joined by identity and the dictionary encoded columns are compared as integer codes,
+the values are only decoded for the changes that are listed
+"""
+import os
+from collections import OrderedDict
+from typing import Iterator, Tuple, List, Dict
+
+import numpy as np
+
+__all__ = ["TagDiff", "diff_tag_states", "file_inode", "ignored_tags", "inode_tag", "unwritable_tags",
+           "exiftool_tag_name"]
+
+# tags changing on every write, they would hide the interesting changes
+ignored_tags = ["File Size", "File Modification Date/Time", "File Access Date/Time", "File Inode Change Date/Time",
+                "File Permissions", "ExifTool Version Number"]
+# inode of the file, not written by exiftool but added to snapshots by readexif.save_tags_snapshot
+inode_tag = "File Inode"
+# composite, file and structural tags, exiftool can not write them or they are derived from other tags
+unwritable_tags = ["Directory", "File Name", "File Type", "File Type Extension", "MIME Type", "Image Width",
+                   "Image Height", "Image Size", "Megapixels", "Encoding Process", "Bits Per Sample",
+                   "Color Components", "Y Cb Cr Sub Sampling", "Shutter Speed", "Aperture", "Light Value",
+                   "Scale Factor To 35 mm Equivalent", "Circle Of Confusion", "Field Of View", "Focal Length 35efl",
+                   "Hyperfocal Distance", "Lens ID", "GPS Position", "Red Balance", "Blue Balance", "Thumbnail Image",
+                   "Thumbnail Offset", "Thumbnail Length", "Preview Image", "Preview Image Start",
+                   "Preview Image Length", "MPF Version", "Number Of Images", "MP Image Flags", "MP Image Format",
+                   "MP Image Type", "MP Image Start", "MP Image Length", "Image UID List", "Total Frames",
+                   "Print Image Matching", "Warning", "Error"]
+# descriptions whose tag name differs from the description without spaces and slashes
+_tag_names = {"Camera Model Name": "Model", "Interoperability Index": "InteropIndex",
+              "Interoperability Version": "InteropVersion"}
+
+
+def exiftool_tag_name(description: str) -> str:
+    """
+    :param description: tag as printed by exiftool without -s, e.g. "Date/Time Original"
+    :return: exiftool tag name, e.g. "DateTimeOriginal", "" for tags that can not be written
+    """
+    if description in unwritable_tags or description in ignored_tags or description == inode_tag: return ""
+    if description in _tag_names: return _tag_names[description]
+    return description.replace(" ", "").replace("/", "")
+
+
+class TagDiff:
+    """
+    pairs are the joined rows of both states, changes map each tag to the sorted pair indices where it differs
+    """
+
+    def __init__(self, old, new, old_rows: np.ndarray, new_rows: np.ndarray, removed: np.ndarray, added: np.ndarray,
+                 changes: Dict[str, np.ndarray]):
+        self.old = old
+        self.new = new
+        self.old_rows = old_rows
+        self.new_rows = new_rows
+        self.removed = removed
+        self.added = added
+        self.changes = changes
+
+    def counts(self) -> Dict[str, int]:
+        """
+        :return: number of changed files per tag, only tags with changes
+        """
+        return OrderedDict([(tag, len(pairs)) for tag, pairs in self.changes.items() if len(pairs)])
+
+    def changed_pairs(self) -> np.ndarray:
+        """
+        :return: sorted indices of the pairs with at least one change
+        """
+        if not self.changes: return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(list(self.changes.values())))
+
+    def iter_changes(self, tags: List[str] = None) -> Iterator[Tuple[str, str, str, str]]:
+        """
+        :param tags: restrict to these tags
+        :return: path in the new state, tag, old value, new value - ordered by file
+        """
+        tags = [tag for tag in self.changes if not tags or tag in tags]
+        if not tags: return
+        pairs = np.concatenate([self.changes[tag] for tag in tags])
+        tag_indices = np.concatenate([np.full(len(self.changes[tag]), i) for i, tag in enumerate(tags)])
+        order = np.lexsort((tag_indices, pairs))
+        pairs = pairs[order]
+        tag_indices = tag_indices[order]
+        distinct_pairs = np.unique(pairs)
+        paths = dict(zip(distinct_pairs.tolist(), self.new.paths(self.new_rows[distinct_pairs])))
+        old_values = _ValueDecoder(self.old, self.old_rows)
+        new_values = _ValueDecoder(self.new, self.new_rows)
+        for pair, tag_index in zip(pairs.tolist(), tag_indices.tolist()):
+            tag = tags[tag_index]
+            yield paths[pair], tag, old_values.value(tag, pair), new_values.value(tag, pair)
+
+    def iter_restore_entries(self, tags: List[str] = None) -> Iterator[Tuple[str, dict]]:
+        """
+        :return: path and tag dict with the old values of the changed tags
+            tags are converted to exiftool names via :func:`exiftool_tag_name`, tags that can not be written are
+            skipped, an empty value means the tag was not set
+            renames and moves are not included, they are undone via nameop.undo_moves
+        """
+        if not tags: tags = list(self.changes.keys())
+        tag_names = {tag: exiftool_tag_name(tag) for tag in tags}
+        tags = [tag for tag in tags if tag_names[tag]]
+        if not tags: return
+        path = ""
+        tag_dict = {}
+        for change in self.iter_changes(tags):
+            if not change[0] == path:
+                if tag_dict: yield path, tag_dict
+                path = change[0]
+                tag_dict = {}
+            tag_dict[tag_names[change[1]]] = change[2]
+        if tag_dict: yield path, tag_dict
+
+
+class _ValueDecoder:
+
+    def __init__(self, state, rows: np.ndarray):
+        self.state = state
+        self.rows = rows
+        self.names = set(state.names())
+        self.codes = {}
+
+    def value(self, tag: str, pair: int) -> str:
+        if not tag in self.names: return ""
+        if not tag in self.codes:
+            self.codes[tag] = self.state.codes(tag)
+        return str(self.state.dictionary(tag)[self.codes[tag][self.rows[pair]]])
+
+
+def diff_tag_states(old, new, key: str = "auto", tags: List[str] = None) -> TagDiff:
+    """
+    :param old: snapshot or catalog
+    :param new: snapshot or catalog
+    :param key: how to join the files of both states:
+        "inode": inode of the file, follows renames and moves
+        "path": directory and file name
+        "path_size": directory, file name and file size
+        "auto": inode if the old state knows it, else path
+    :param tags: tags to compare, default is all tags of both states except :data:`ignored_tags`
+    """
+    if key == "auto":
+        key = "inode" if inode_tag in old.names() else "path"
+    old_keys = _identity_keys(old, key)
+    new_keys = _identity_keys(new, key)
+    old_valid = np.flatnonzero(_valid_keys(old_keys))
+    new_valid = np.flatnonzero(_valid_keys(new_keys))
+    _, old_indices, new_indices = np.intersect1d(old_keys[old_valid], new_keys[new_valid], return_indices=True)
+    old_rows = old_valid[old_indices]
+    new_rows = new_valid[new_indices]
+    order = np.argsort(new_rows, kind="stable")
+    old_rows = old_rows[order]
+    new_rows = new_rows[order]
+    removed = np.setdiff1d(np.arange(len(old)), old_rows)
+    added = np.setdiff1d(np.arange(len(new)), new_rows)
+
+    if not tags:
+        tags = old.names() + [tag for tag in new.names() if not tag in old.names()]
+        tags = [tag for tag in tags if not tag in ignored_tags and not tag == inode_tag]
+    changes = OrderedDict()
+    for tag in tags:
+        changes[tag] = np.flatnonzero(_changed(old, new, tag, old_rows, new_rows))
+    return TagDiff(old, new, old_rows, new_rows, removed, added, changes)
+
+
+def _identity_keys(state, key: str) -> np.ndarray:
+    if key == "inode":
+        if inode_tag in state.names():
+            return state.column(inode_tag).astype(np.int64)
+        # the current state of the files, e.g. the catalog
+        return np.array([file_inode(path) for path in state.paths()], dtype=np.int64)
+    keys = np.char.add(np.char.add(state.column("Directory").astype(str), os.sep), state.column("File Name"))
+    if key == "path_size":
+        keys = np.char.add(np.char.add(keys, "|"), state.column("File Size"))
+    elif not key == "path":
+        raise ValueError("unknown key " + key)
+    return keys
+
+
+def _valid_keys(keys: np.ndarray) -> np.ndarray:
+    if keys.dtype.kind == "i": return keys >= 0
+    return np.ones(len(keys), dtype=bool)
+
+
+def file_inode(path: str) -> int:
+    """
+    :return: inode of the file, -1 if it does not exist
+    """
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return -1
+
+
+def _changed(old, new, tag: str, old_rows: np.ndarray, new_rows: np.ndarray) -> np.ndarray:
+    if not tag in new.names():
+        return (old.dictionary(tag) != "")[old.codes(tag)[old_rows]]
+    if not tag in old.names():
+        return (new.dictionary(tag) != "")[new.codes(tag)[new_rows]]
+    old_dictionary = old.dictionary(tag)
+    new_dictionary = new.dictionary(tag)
+    # both dictionaries are sorted, so the old codes are translated to new codes by a binary search
+    positions = np.searchsorted(new_dictionary, old_dictionary)
+    found = positions < len(new_dictionary)
+    found[found] = new_dictionary[positions[found]] == old_dictionary[found]
+    translation = np.where(found, positions, -1)
+    return translation[old.codes(tag)[old_rows]] != new.codes(tag)[new_rows]
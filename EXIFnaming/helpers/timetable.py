@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+interval index over the timetable written by readexif.print_timetable
+"""
+import csv
+import datetime as dt
+import os
+from collections import OrderedDict
+from typing import Dict, Tuple, List
+
+import numpy as np
+
+__all__ = ["TimetableIndex", "to_datetime64", "exif_to_datetime64", "first_last_per_group", "timetable_columns",
+           "timetable_timeformat", "read_timetable_csv", "timetable_source_row", "is_timetable_csv_current"]
+
+timetable_columns = ["Directory", "First", "Last"]
+timetable_timeformat = "%Y-%m-%dT%H:%M:%S"
+# first row of the csv: size and modification time of the text timetable written together with it
+timetable_source_marker = "#timetable.txt"
+
+
+def to_datetime64(times) -> np.ndarray:
+    """
+    convert datetimes or iso strings to datetime64 with second precision
+    """
+    return np.asarray(times, dtype="datetime64[ms]").astype("datetime64[s]")
+
+
+def exif_to_datetime64(values: List[str]) -> np.ndarray:
+    """
+    convert exif dates like "2019:05:03 12:34:56" to datetime64 with second precision, NaT for invalid dates
+    """
+    times = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[s]")
+    for i, value in enumerate(values):
+        if len(value) < 19: continue
+        try:
+            times[i] = np.datetime64(value[:10].replace(":", "-") + "T" + value[11:19], "s")
+        except ValueError:
+            continue
+    return times
+
+
+def first_last_per_group(groups: np.ndarray, times: np.ndarray) -> Dict[str, Tuple[np.datetime64, np.datetime64]]:
+    """
+    :param groups: group name of each time
+    :param times: datetime64 array, NaT entries are ignored
+    :return: earliest and latest time of each group with at least one valid time, sorted by group
+    """
+    valid = ~np.isnat(times)
+    groups = np.asarray(groups)[valid]
+    times = times[valid]
+    if len(times) == 0: return OrderedDict()
+    uniques, codes = np.unique(groups, return_inverse=True)
+    order = np.lexsort((times, codes))
+    codes = codes[order]
+    times = times[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    return OrderedDict(zip(uniques[codes[starts]].tolist(), zip(times[starts], times[ends])))
+
+
+def read_timetable_csv(filename: str) -> Dict[str, Tuple[dt.datetime, dt.datetime]]:
+    """
+    read the structured timetable written by readexif.print_timetable
+    :return: first and last time per directory, directories without times are skipped
+    """
+    dirDict = OrderedDict()
+    with open(filename, "r", encoding="utf-8", newline="") as file:
+        reader = csv.reader(file, delimiter=";")
+        header = next(reader, None)
+        if header and header[0] == timetable_source_marker:
+            header = next(reader, None)
+        if not header == timetable_columns:
+            raise ValueError("%s is no timetable, the columns are %s" % (filename, header))
+        for dir_name, start, end in reader:
+            if not start or not end: continue
+            dirDict[dir_name] = (dt.datetime.strptime(start, timetable_timeformat),
+                                 dt.datetime.strptime(end, timetable_timeformat))
+    return dirDict
+
+
+def timetable_source_row(txtfile: str) -> List[str]:
+    """
+    :param txtfile: text timetable, already written and closed
+    :return: first row of the csv timetable, see :func:`is_timetable_csv_current`
+    """
+    stat = os.stat(txtfile)
+    return [timetable_source_marker, str(stat.st_size), str(stat.st_mtime_ns)]
+
+
+def is_timetable_csv_current(csvfile: str, txtfile: str) -> bool:
+    """
+    the text timetable may be edited after both were written, then it is preferred over the csv
+    :return: whether csvfile exists and txtfile is missing or unchanged since csvfile was written
+    """
+    if not os.path.isfile(csvfile): return False
+    if not os.path.isfile(txtfile): return True
+    with open(csvfile, "r", encoding="utf-8", newline="") as file:
+        first = next(csv.reader(file, delimiter=";"), None)
+    return first == timetable_source_row(txtfile)
+
+
+class TimetableIndex:
+    """
+    binary search replacement for date.find_dir_with_closest_time_new
+    expects the directories of the timetable not to overlap in time
+    """
+
+    def __init__(self, dirDict: Dict[str, Tuple[dt.datetime, dt.datetime]], maxdelta=3600 * 24):
+        self.maxdelta = np.timedelta64(int(maxdelta), 's')
+        names = list(dirDict.keys())
+        starts = to_datetime64([dirDict[name][0] for name in names])
+        ends = to_datetime64([dirDict[name][1] for name in names])
+        order = np.argsort(starts, kind="stable")
+        self.names = np.array(names, dtype=object)[order]
+        self.starts = starts[order]
+        self.ends = ends[order]
+
+        boundaries = np.concatenate([self.starts, self.ends])
+        boundary_names = np.concatenate([self.names, self.names])
+        order = np.argsort(boundaries, kind="stable")
+        self.boundaries = boundaries[order]
+        self.boundary_names = boundary_names[order]
+
+    @staticmethod
+    def load(filename: str, maxdelta=3600 * 24) -> 'TimetableIndex':
+        """
+        :param filename: structured timetable, see :func:`read_timetable_csv`
+        """
+        return TimetableIndex(read_timetable_csv(filename), maxdelta)
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, time: dt.datetime) -> str:
+        return self.classify(to_datetime64([time]))[0]
+
+    def classify(self, times: np.ndarray) -> np.ndarray:
+        """
+        :param times: datetime64 array
+        :return: object array of directory names, "%y%m%d_unrelated" for times without close directory
+        """
+        times = to_datetime64(times)
+        out = np.empty(len(times), dtype=object)
+        if len(times) == 0: return out
+        out[:] = _unrelated_names(times)
+        if len(self) == 0: return out
+
+        # inside of an interval
+        index = np.searchsorted(self.starts, times, side="left") - 1
+        valid = index >= 0
+        inside = np.zeros(len(times), dtype=bool)
+        inside[valid] = times[valid] < self.ends[index[valid]]
+        out[inside] = self.names[index[inside]]
+
+        # closest boundary
+        rest = ~inside
+        right = np.searchsorted(self.boundaries, times[rest], side="left")
+        left = np.clip(right - 1, 0, len(self.boundaries) - 1)
+        right = np.clip(right, 0, len(self.boundaries) - 1)
+        delta_left = np.abs(times[rest] - self.boundaries[left])
+        delta_right = np.abs(self.boundaries[right] - times[rest])
+        closest = np.where(delta_right <= delta_left, right, left)
+        delta = np.minimum(delta_left, delta_right)
+        names = np.where(delta < self.maxdelta, self.boundary_names[closest], out[rest])
+        out[rest] = names
+        return out
+
+
+def _unrelated_names(times: np.ndarray) -> np.ndarray:
+    days = np.datetime_as_string(times, unit='D')
+    return np.array([day[2:4] + day[5:7] + day[8:10] + "_unrelated" for day in days], dtype=object)
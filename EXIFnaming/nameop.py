@@ -9,100 +9,122 @@ import csv
 import datetime as dt
 import os
 import re
-from typing import Optional, Match, Iterable, Any, IO, Tuple, List
+from collections import OrderedDict
+from typing import Optional, Match, Iterable, Any, IO, Tuple, List, Dict
 
 import numpy as np
 from EXIFnaming.helpers import settings
 from EXIFnaming.helpers.constants import CameraModelShort
 from EXIFnaming.helpers.date import dateformating
-from EXIFnaming.helpers.fileop import renameInPlace, renameTemp, moveBracketSeries, moveSeries, move, removeIfEmtpy, \
-    get_relpath_depth, move_media, copyFilesTo, writeToFile, is_invalid_path, filterFiles, isfile, \
-    file_has_ext, remove_ext, get_plain_filenames_of_type
+from EXIFnaming.helpers.fileop import renameInPlace, removeIfEmtpy, get_relpath_depth, \
+    copyFilesTo, writeToFile, is_invalid_path, filterFiles, isfile, file_has_ext, remove_ext, \
+    get_plain_filenames_of_type, SeriesClassifier, series_rule, media_rule, save_tagdict, load_tagdict
+from EXIFnaming.helpers.journal import MoveJournal
 from EXIFnaming.helpers.misc import askToContinue
+from EXIFnaming.helpers.moveplan import MovePlan, execute_plan, resume_plan
+from EXIFnaming.helpers.pattern_matcher import PatternMatcher
 from EXIFnaming.helpers.program_dir import get_saves_dir, get_info_dir, get_setexif_dir, log, log_function_call
 from EXIFnaming.helpers.settings import image_types
-from EXIFnaming.helpers.tag_conversion import FilenameAccessor
+from EXIFnaming.helpers.snapshot import snapshot_ext
+from EXIFnaming.helpers.tag_conversion import FilenameAccessor, parse_filenames, counter_runs, distinct_tags
 from sortedcollections import OrderedSet
 
 __all__ = ["filter_series", "filter_primary", "copy_subdirectories", "copy_files", "copy_new_files", "replace_in_file",
            "folders_to_main", "rename_HDR", "sanitize_filename", "rename_temp_back", "rename_back", "create_tags_csv",
            "create_tags_csv_per_dir", "create_counters_csv", "create_counters_csv_per_dir", "create_example_csvs",
-           "create_rating_csv"]
+           "create_rating_csv", "resume_moves", "undo_moves", "print_journal"]
 
 
-def filter_series():
+def filter_series(onlyprint: bool = False, workers: int = 1):
     """
     put each kind of series in its own directory
+    :param onlyprint: only log the planned moves
+    :param workers: number of threads to move the files, useful on network shares
     """
-    log_function_call(filter_series.__name__)
+    log_function_call(filter_series.__name__, onlyprint, workers)
     inpath = os.getcwd()
     skipdirs = ["B" + str(i) for i in range(1, 8)]
     skipdirs += ["S", "SM", "TL", "mp4", "HDR", "single", "PANO", "others", "TLM"]
     # TLM: Timelapse manual - pictures on different days to be combined to a Timelapse
     skipdirs += [model for model in CameraModelShort.values() if model]
+    # filter process types to separate folders - attention: ordering of rules matters
+    classifier = SeriesClassifier([series_rule("S"), series_rule("SM"), series_rule("TL"),
+                                   media_rule(settings.video_types, "mp4"), media_rule(["PANO"], "PANO"),
+                                   media_rule(["ANIMA"], "ANIMA"), media_rule(["RET"], "RET"),
+                                   media_rule(["ZOOM"], "ZOOM"), media_rule(["SMALL"], "SMALL"),
+                                   media_rule(["CUT"], "CUT"), media_rule(["HDR"], "HDR"),
+                                   media_rule(settings.image_types, "single")], bracket_series=True)
 
     log().info(inpath)
+    plan = MovePlan(filter_series.__name__)
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if is_invalid_path(dirpath, skipdirs): continue
         log().info("%s #dirs:%d #files:%d", dirpath, len(dirnames), len(filenames))
-        filenames = moveBracketSeries(dirpath, filenames)
-        filenames = moveSeries(dirpath, filenames, "S")
-        filenames = moveSeries(dirpath, filenames, "SM")
-        filenames = moveSeries(dirpath, filenames, "TL")
-        filenames = move_media(dirpath, filenames, settings.video_types, "mp4")
-        # filter process types to separate folders - attention: ordering of statements matters
-        filenames = move_media(dirpath, filenames, ["PANO"], "PANO")
-        filenames = move_media(dirpath, filenames, ["ANIMA"], "ANIMA")
-        filenames = move_media(dirpath, filenames, ["RET"], "RET")
-        filenames = move_media(dirpath, filenames, ["ZOOM"], "ZOOM")
-        filenames = move_media(dirpath, filenames, ["SMALL"], "SMALL")
-        filenames = move_media(dirpath, filenames, ["CUT"], "CUT")
-        filenames = move_media(dirpath, filenames, ["HDR"], "HDR")
-        move_media(dirpath, filenames, settings.image_types, "single")
-
-
-def filter_primary():
+        _plan_moves_to_subpaths(plan, dirpath, classifier.classify(filenames))
+    execute_plan(plan, workers, onlyprint)
+
+
+def filter_primary(onlyprint: bool = False, workers: int = 1):
     """
     put single and B1 in same directory
+    :param onlyprint: only log the planned moves
+    :param workers: number of threads to move the files, useful on network shares
     """
-    log_function_call(filter_primary.__name__)
+    log_function_call(filter_primary.__name__, onlyprint, workers)
     inpath = os.getcwd()
     skipdirs = ["S", "SM", "TL", "mp4", "HDR", "single", "PANO", "others"]
     skipdirs += [model for model in CameraModelShort.values() if model]
+    classifier = SeriesClassifier([series_rule("S"), series_rule("SM"), series_rule("TL"),
+                                   media_rule(settings.video_types, "mp4"), media_rule(["HDR"], "HDR"),
+                                   series_rule("B", "1"), series_rule("B"),
+                                   media_rule(settings.image_types, "primary")])
 
     log().info(inpath)
-    folders_to_main(dirs=["B" + str(i) for i in range(1, 8)])
+    folders_to_main(dirs=["B" + str(i) for i in range(1, 8)], onlyprint=onlyprint, workers=workers)
+    plan = MovePlan(filter_primary.__name__)
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if is_invalid_path(dirpath, skipdirs): continue
         log().info("%s #dirs:%d #files:%d", dirpath, len(dirnames), len(filenames))
-        filenames = moveSeries(dirpath, filenames, "S")
-        filenames = moveSeries(dirpath, filenames, "SM")
-        filenames = moveSeries(dirpath, filenames, "TL")
-        filenames = move_media(dirpath, filenames, settings.video_types, "mp4")
-        filenames = move_media(dirpath, filenames, ["HDR"], "HDR")
-        filenames = moveSeries(dirpath, filenames, "B", "1")
-        filenames = moveSeries(dirpath, filenames, "B")
-        move_media(dirpath, filenames, settings.image_types, "primary")
+        _plan_moves_to_subpaths(plan, dirpath, classifier.classify(filenames))
+    execute_plan(plan, workers, onlyprint)
+
 
+def _plan_moves_to_subpaths(plan: MovePlan, dirpath: str, moves: List[Tuple[str, str]]):
+    for filename, subpath in moves:
+        plan.add(os.path.join(dirpath, filename), os.path.join(dirpath, subpath, filename))
 
-def copy_subdirectories(dest: str, dir_names: []):
+
+def resume_moves(workers: int = 1, revert: bool = False):
+    """
+    finish the moves and renames of an interrupted run
+    :param workers: number of threads to move the files, useful on network shares
+    :param revert: undo the moves and renames done by the interrupted run instead of finishing it
+    """
+    log_function_call(resume_moves.__name__, workers, revert)
+    if not resume_plan(workers, revert=revert):
+        log().info("no unfinished moves")
+
+
+def copy_subdirectories(dest: str, dir_names: [], mode: str = "auto"):
     """
     copy sub folders of specified names to dest without directory structure
     :param dest: copy destination
     :param dir_names: directory names to copy
+    :param mode: how to copy, see :func:`fileop.copyFilesTo`
     """
     inpath = os.getcwd()
     log().info(inpath)
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if is_invalid_path(dirpath, whitelist=dir_names): continue
-        copyFilesTo(filenames, dest, False)
+        copyFilesTo([os.path.join(dirpath, filename) for filename in filenames], dest, False, mode)
 
 
-def copy_files(dest: str, sub_name: str = None):
+def copy_files(dest: str, sub_name: str = None, mode: str = "auto"):
     """
     copy files which have names containing sub_name to dest without directory structure
     :param dest: copy destination
     :param sub_name: name part to search
+    :param mode: how to copy, see :func:`fileop.copyFilesTo`
     """
     inpath = os.getcwd()
     log().info(inpath)
@@ -111,7 +133,7 @@ def copy_files(dest: str, sub_name: str = None):
         for filename in filenames:
             if not sub_name or sub_name in filename:
                 found_files.append(os.path.join(dirpath, filename))
-    copyFilesTo(found_files, dest, False)
+    copyFilesTo(found_files, dest, False, mode)
 
 
 def copy_new_files(dest: str, playlist: str):
@@ -162,7 +184,7 @@ def replace_in_file(search: str, replace: str, fileext: str):
 
 
 def folders_to_main(series: bool = False, primary: bool = False, blurry: bool = False, dirs: list = None,
-                    one_level: bool = True, not_inpath: bool = True):
+                    one_level: bool = True, not_inpath: bool = True, onlyprint: bool = False, workers: int = 1):
     """
     reverses filtering/sorting into directories
     :param series: restrict to reverse of filterSeries
@@ -171,8 +193,11 @@ def folders_to_main(series: bool = False, primary: bool = False, blurry: bool =
     :param dirs: restrict to reverse other dirs
     :param one_level: reverse only one directory up
     :param not_inpath: leave all directories in inpath as they are, only change subdirectories
+    :param onlyprint: only log the planned moves
+    :param workers: number of threads to move the files, useful on network shares
     """
-    log_function_call(folders_to_main.__name__, series, primary, blurry, dirs, one_level, not_inpath)
+    log_function_call(folders_to_main.__name__, series, primary, blurry, dirs, one_level, not_inpath, onlyprint,
+                      workers)
     inpath = os.getcwd()
     reverseDirs = []
     if series: reverseDirs += ["B" + str(i) for i in range(1, 8)] + ["S", "single"]
@@ -196,6 +221,8 @@ def folders_to_main(series: bool = False, primary: bool = False, blurry: bool =
         log().info("chosen directory names: %r", reverseDirs)
         askToContinue()
 
+    plan = MovePlan(folders_to_main.__name__)
+    dirpaths = []
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if not_inpath and dirpath == inpath: continue
         if is_invalid_path(dirpath, whitelist=reverseDirs): continue
@@ -206,7 +233,11 @@ def folders_to_main(series: bool = False, primary: bool = False, blurry: bool =
         log().info("%s #dirs:%d #files:%d", dirpath, len(dirnames), len(filenames))
         for filename in filenames:
             if not file_has_ext(filename, settings.image_types + settings.video_types): continue
-            move(filename, dirpath, destination)
+            plan.add(os.path.join(dirpath, filename), os.path.join(destination, filename))
+        dirpaths.append(dirpath)
+    execute_plan(plan, workers, onlyprint)
+    if onlyprint: return
+    for dirpath in reversed(dirpaths):
         removeIfEmtpy(dirpath)
 
 
@@ -247,7 +278,7 @@ def _rename_match(dirpath: str, filename: str, mode: str, match: Optional[Match[
     renameInPlace(dirpath, filename, filename_new)
 
 
-def sanitize_filename(folder=r"", posttags_to_end: List[str] = None, onlyprint=False):
+def sanitize_filename(folder=r"", posttags_to_end: List[str] = None, onlyprint=False, workers: int = 1):
     """
     sanitize order of Scene and Process tags
     sanitize counter to be split by $
@@ -255,12 +286,16 @@ def sanitize_filename(folder=r"", posttags_to_end: List[str] = None, onlyprint=F
     :param folder: optional regex for restrict to folders
     :param posttags_to_end: optional for resorting special posttags to end
     :param onlyprint: if true, renaming will only printed to log and no files are renamed, good for testing
+    :param workers: number of threads to rename the files, useful on network shares
     :return:
     """
     inpath = os.getcwd()
+    # renames of deeper directories first, so that the paths of the renames stay valid
+    moves_by_depth = OrderedDict()
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if is_invalid_path(dirpath, regex=folder): continue
         for filename in (filenames + dirnames):
+            filename_old = filename
             filename = filename.replace("panorama", "PANO")
             filenameAccessor = FilenameAccessor(filename)
             _sanitize_posttags(filenameAccessor, posttags_to_end)
@@ -269,8 +304,14 @@ def sanitize_filename(folder=r"", posttags_to_end: List[str] = None, onlyprint=F
             filename_new = filenameAccessor.sorted_filename()
             if not filename == filename_new:
                 log().info("rename: %s to %s", filename, filename_new)
-                if not onlyprint:
-                    renameInPlace(dirpath, filename, filename_new)
+                moves_by_depth.setdefault(get_relpath_depth(inpath, dirpath), []).append(
+                    (os.path.join(dirpath, filename_old), os.path.join(dirpath, filename_new)))
+    plan = MovePlan(sanitize_filename.__name__)
+    for depth in sorted(moves_by_depth, reverse=True):
+        for src, dst in moves_by_depth[depth]:
+            plan.add(src, dst)
+        plan.barrier()
+    execute_plan(plan, workers, onlyprint)
 
 
 def _sanitize_posttags(filenameAccessor: FilenameAccessor, posttags_to_end: List[str] = None):
@@ -330,30 +371,80 @@ def rename_temp_back():
             renameInPlace(dirpath, filename, newFilename)
 
 
-def rename_back(timestring="", fileext=".JPG"):
+def rename_back(timestring="", fileext=".JPG", workers: int = 1):
     """
-    rename back using backup in saves; change to directory you want to rename back
-    :param timestring: time of backup
-    :param fileext: file extension
+    rename back using the journal or a backup in saves; change to directory you want to rename back
+    without timestring the last run of rename in the journal is undone
+    :param timestring: time of backup, only needed for backups written before the journal existed
+    :param fileext: file extension, a video extension undoes rename(is_video=True)
+    :param workers: number of threads to rename the files, useful on network shares
     :return:
     """
-    log_function_call(rename_back.__name__)
-    dirname = get_saves_dir()
-    tagFile = os.path.join(dirname, "Tags" + fileext + "_" + timestring + ".npz")
-    if not timestring or os.path.isfile(tagFile):
-        tagFiles = [x for x in os.listdir(dirname) if ".npz" in x]
-        tagFile = os.path.join(dirname, tagFiles[-1])
-    Tagdict = np.load(tagFile)["Tagdict"].item()
-    temppostfix = renameTemp(Tagdict["Directory"], Tagdict["File Name new"])
+    log_function_call(rename_back.__name__, timestring, fileext, workers)
+    video_str = "_video" if file_has_ext(fileext, settings.video_types) else ""
+    if not timestring:
+        run = MoveJournal().last_run("rename" + video_str)
+        if run >= 0:
+            undo_moves(run, workers=workers)
+            return
+    tagFile = _find_tagdict_snapshot(timestring, video_str)
+    if not tagFile:
+        log().warning("no backup of file names found in %s", get_saves_dir())
+        return
+    Tagdict = load_tagdict(tagFile)
     log().debug("length of Tagdict: %d", len(list(Tagdict.values())[0]))
+    plan = MovePlan(rename_back.__name__)
     for i in range(len(list(Tagdict.values())[0])):
-        filename = Tagdict["File Name new"][i] + temppostfix
+        filename = Tagdict["File Name new"][i]
         if not os.path.isfile(os.path.join(Tagdict["Directory"][i], filename)): continue
         filename_old = Tagdict["File Name"][i]
-        renameInPlace(Tagdict["Directory"][i], filename, filename_old)
+        plan.add(os.path.join(Tagdict["Directory"][i], filename), os.path.join(Tagdict["Directory"][i], filename_old))
         Tagdict["File Name new"][i], Tagdict["File Name"][i] = Tagdict["File Name"][i], Tagdict["File Name new"][i]
+    execute_plan(plan, workers)
     timestring = dateformating(dt.datetime.now(), "_MMDDHHmmss")
-    np.savez_compressed(os.path.join(dirname, "Tags" + fileext + timestring), Tagdict=Tagdict)
+    save_tagdict(fileext, timestring, Tagdict)
+
+
+def _find_tagdict_snapshot(timestring="", video_str="") -> str:
+    """
+    :param video_str: "_video" for backups of video renames
+    :return: newest backup of rename in saves, restricted to the ones of timestring if given
+    """
+    dirname = get_saves_dir()
+    tagFiles = [os.path.join(dirname, filename) for filename in os.listdir(dirname) if
+                filename.startswith("Tags" + video_str) and filename.startswith("Tags_video") == bool(video_str) and
+                (filename.endswith(snapshot_ext) or filename.endswith(".npz")) and timestring in filename]
+    if not tagFiles: return ""
+    return max(tagFiles, key=os.path.getmtime)
+
+
+def undo_moves(run: int = -1, directory: str = "", onlyprint: bool = False, workers: int = 1):
+    """
+    move and rename files back to where they were before a run recorded in the journal
+    the undo is recorded as a run itself, so it can be undone too
+    :param run: index of the run, negative values count from the end, see :func:`print_journal`
+    :param directory: only undo moves of files that were moved into this directory or below
+    :param onlyprint: only log the planned moves
+    :param workers: number of threads to move the files, useful on network shares
+    """
+    log_function_call(undo_moves.__name__, run, directory, onlyprint, workers)
+    journal = MoveJournal()
+    runs = journal.runs()
+    if not -len(runs) <= run < len(runs):
+        log().warning("run %d not in journal of %d runs", run, len(runs))
+        return
+    plan = MovePlan("undo " + runs[run]["name"])
+    for src, dst in journal.moves(run, directory):
+        plan.add(dst, src)
+    execute_plan(plan, workers, onlyprint)
+
+
+def print_journal():
+    """
+    log the runs recorded in the journal
+    """
+    for i, run in enumerate(MoveJournal().runs()):
+        log().info("%4d %s %-30s %6d moves", i, run["time"], run["name"], run["count"])
 
 
 def create_tags_csv(location: str = ""):
@@ -366,14 +457,11 @@ def create_tags_csv(location: str = ""):
     If you want to modify it with EXCEL or Calc take care to import all columns of the csv as text.
     """
     inpath = os.getcwd()
-    tag_set = OrderedSet()
     tag_set_names = OrderedSet()
     out_filename = get_info_dir("tags_places.csv")
     tags_places_file, writer = _create_csv_writer(out_filename, ["directory", "name_part"])
-    filenameAccessors = [FilenameAccessor(filename) for filename in get_plain_filenames_of_type(image_types, inpath)]
-    for fileNameAccessor in filenameAccessors:
-        for tag in fileNameAccessor.tags():
-            tag_set.add(tag)
+    columns = parse_filenames(get_plain_filenames_of_type(image_types, inpath))
+    tag_set = distinct_tags(columns).get(0, [])
     writeToFile(get_info_dir("tags.txt"), location + "\n\t" + "\n\t".join(tag_set) + "\n")
     for tag in tag_set:
         tag_set_names.add((location, tag))
@@ -394,23 +482,17 @@ def create_tags_csv_per_dir():
     tag_set_names = OrderedSet()
     out_filename = get_info_dir("tags_places.csv")
     tags_places_file, writer = _create_csv_writer(out_filename, ["directory", "name_part"])
-    for (dirpath, dirnames, filenames) in os.walk(inpath):
-        if not inpath == dirpath: continue
-        for dirname in dirnames:
-            tag_set = OrderedSet()
-            filenameAccessors = [FilenameAccessor(filename) for filename in
-                                 get_plain_filenames_of_type(image_types, dirpath, dirname)]
-            if len(filenameAccessors) == 0: continue
-            for fileNameAccessor in filenameAccessors:
-                for tag in fileNameAccessor.tags():
-                    tag_set.add(tag)
-            writeToFile(get_info_dir("tags.txt"), dirname + "\n\t" + "\n\t".join(tag_set) + "\n")
-
-            dirname_split = dirname.split("_")
-            subnames = [subname for subname in dirname_split if not subname.isnumeric()]
-            dirname = "_".join(subnames)
-            for tag in tag_set:
-                tag_set_names.add((dirname, tag))
+    dirnames, filenames, groups = _get_plain_filenames_per_dir(inpath)
+    tag_sets = distinct_tags(parse_filenames(filenames), groups)
+    for i, dirname in enumerate(dirnames):
+        tag_set = tag_sets.get(i, [])
+        writeToFile(get_info_dir("tags.txt"), dirname + "\n\t" + "\n\t".join(tag_set) + "\n")
+
+        dirname_split = dirname.split("_")
+        subnames = [subname for subname in dirname_split if not subname.isnumeric()]
+        dirname = "_".join(subnames)
+        for tag in tag_set:
+            tag_set_names.add((dirname, tag))
     writer.writerows(tag_set_names)
     tags_places_file.close()
 
@@ -431,8 +513,8 @@ def create_counters_csv():
                                          ["directory", "name_main", "name_part", "first", "last", "tags3",
                                           "description"])
 
-    filenameAccessors = [FilenameAccessor(filename) for filename in get_plain_filenames_of_type(image_types, inpath)]
-    _add_counter_csv_entries("", filenameAccessors, tag_set_names)
+    filenames = get_plain_filenames_of_type(image_types, inpath)
+    _add_counter_csv_entries([""], parse_filenames(filenames), np.zeros(len(filenames), dtype=int), tag_set_names)
     writer.writerows(tag_set_names)
     csvfile.close()
 
@@ -452,28 +534,37 @@ def create_counters_csv_per_dir():
     csvfile, writer = _create_csv_writer(out_filename,
                                          ["directory", "name_main", "name_part", "first", "last", "tags3",
                                           "description"])
+    dirnames, filenames, groups = _get_plain_filenames_per_dir(inpath)
+    _add_counter_csv_entries(dirnames, parse_filenames(filenames), groups, tag_set_names)
+    writer.writerows(tag_set_names)
+    csvfile.close()
+
+
+def _get_plain_filenames_per_dir(inpath: str) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    :return: top level directories containing files of image_types, their sorted filenames
+        and the index of the directory of each filename
+    """
+    dirnames_with_files = []
+    all_filenames = []
+    groups = []
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if not inpath == dirpath: continue
         for dirname in dirnames:
-            filenameAccessors = [FilenameAccessor(filename) for filename in
-                                 get_plain_filenames_of_type(image_types, dirpath, dirname)]
-            if len(filenameAccessors) == 0: continue
-            _add_counter_csv_entries(dirname, filenameAccessors, tag_set_names)
-    writer.writerows(tag_set_names)
-    csvfile.close()
+            filenames = get_plain_filenames_of_type(image_types, dirpath, dirname)
+            if len(filenames) == 0: continue
+            groups += [len(dirnames_with_files)] * len(filenames)
+            dirnames_with_files.append(dirname)
+            all_filenames += filenames
+    return dirnames_with_files, all_filenames, np.array(groups, dtype=int)
 
 
-def _add_counter_csv_entries(dirname: str, filenameAccessors: List[FilenameAccessor], tag_set_names: OrderedSet):
-    fileNameAccessorFirst = filenameAccessors[0]
-    fileNameAccessorLast = filenameAccessors[0]
-    for filenameAccessor in filenameAccessors[1:-1]:
-        if not filenameAccessor.is_direct_successor_of(fileNameAccessorLast):
-            tag_set_names.add((dirname, fileNameAccessorFirst.pre, fileNameAccessorFirst.first_posttag(),
-                               fileNameAccessorFirst.counter_main(), fileNameAccessorLast.counter_main()))
-            fileNameAccessorFirst = filenameAccessor
-        fileNameAccessorLast = filenameAccessor
-    tag_set_names.add((dirname, fileNameAccessorFirst.pre, fileNameAccessorFirst.first_posttag(),
-                       fileNameAccessorFirst.counter_main(), fileNameAccessorLast.counter_main()))
+def _add_counter_csv_entries(dirnames: List[str], columns: Dict[str, np.ndarray], groups: np.ndarray,
+                             tag_set_names: OrderedSet):
+    firsts, lasts = counter_runs(columns, groups)
+    for first, last in zip(firsts.tolist(), lasts.tolist()):
+        tag_set_names.add((dirnames[groups[first]], columns["pre"][first], columns["first_posttag"][first],
+                           columns["counter_main"][first], columns["counter_main"][last]))
 
 
 def _create_csv_writer(filename: str, titles: Iterable) -> Tuple[IO, Any]:
@@ -484,26 +575,80 @@ def _create_csv_writer(filename: str, titles: Iterable) -> Tuple[IO, Any]:
     return file, writer
 
 
-def create_rating_csv(rating: int = 4, subdir: str = ""):
+def create_rating_csv(rating: int = 4, subdir: str = "", compress: bool = True):
     """
     creates a csv file with all files in the directory
     the rating column is filled with param rating
     :param rating: rating to be written
     :param subdir: sub directory to make rating file of, if empty all directories will be taken
+    :param compress: whether to write runs of counters as name_main, first, last instead of one name_part per file
+        only runs that do not match any further file of the working directory are compressed
     """
-    log_function_call(create_rating_csv.__name__, rating, subdir)
+    log_function_call(create_rating_csv.__name__, rating, subdir, compress)
     inpath = os.getcwd()
     out_filebasename = "rating"
     if subdir: out_filebasename += "_" + subdir
     out_filename = get_setexif_dir(out_filebasename + ".csv")
-    rating_file, writer = _create_csv_writer(out_filename, ["name_part", "rating"])
-    for (dirpath, dirnames, filenames) in os.walk(os.path.join(inpath, subdir)):
+    rating_file, writer = _create_csv_writer(out_filename, ["name_part", "name_main", "first", "last", "rating"])
+    filenames = []
+    for (dirpath, dirnames, dir_filenames) in os.walk(os.path.join(inpath, subdir)):
         if is_invalid_path(dirpath): continue
-        for filename in filterFiles(filenames, settings.image_types):
-            writer.writerow([filename, rating])
+        filenames += filterFiles(dir_filenames, settings.image_types)
+    if compress:
+        all_filenames = get_plain_filenames_of_type(settings.image_types + settings.video_types, inpath)
+        rows = _compress_name_parts(filenames, all_filenames)
+    else:
+        rows = [(filename, "", "", "") for filename in filenames]
+    writer.writerows([row + (rating,) for row in rows])
     rating_file.close()
 
 
+def _compress_name_parts(filenames: List[str], all_filenames: List[str]) -> List[Tuple[str, str, str, str]]:
+    """
+    replace name_part rows of filenames by name_main, first, last rows matching exactly the same files of all_filenames
+    a counter can only be part of a range when all files with that counter are in filenames
+    and no name of filenames is part of a file with an other counter
+    :return: rows of name_part, name_main, first, last
+    """
+
+    def counter_key(filename: str) -> Optional[Tuple[str, str]]:
+        accessor = FilenameAccessor(filename)
+        counter = accessor.counter_main()
+        return (accessor.pre, counter) if accessor.pre and counter else None
+
+    filenames = list(OrderedSet(filenames))
+    keys = [counter_key(filename) for filename in filenames]
+    compressible = set([key for key in keys if key])
+    all_keys = set()
+    matcher = PatternMatcher(filenames)
+    for filename in all_filenames:
+        key = counter_key(filename)
+        all_keys.add(key)
+        matches = matcher.find(filename)
+        if not matches: compressible.discard(key)
+        for i in matches:
+            if not keys[i] == key: compressible.discard(keys[i])
+    compressible &= all_keys
+
+    # ranges are compared by the number of the counter, so the keys are sorted by it
+    # numbered by position, the existing counters of a name_main are direct successors in spite of gaps
+    sorted_keys = sorted([key for key in all_keys if key],
+                         key=lambda key: (key[0], int(key[1]) if key[1].isdigit() else -1, key[1]))
+    pres = np.array([key[0] for key in sorted_keys], dtype=object)
+    columns = {"filename": pres, "pre": pres, "first_posttag": np.full(len(sorted_keys), "", dtype=object),
+               "counter_number": np.array([i if key[1].isdigit() else -1 for i, key in enumerate(sorted_keys)],
+                                          dtype=np.int64)}
+    is_compressible = np.array([key in compressible for key in sorted_keys], dtype=bool)
+    rows = []
+    for first, last in zip(*counter_runs(columns, is_compressible)):
+        if is_compressible[first]:
+            rows.append(("", sorted_keys[first][0], sorted_keys[first][1], sorted_keys[last][1]))
+    for filename, key in zip(filenames, keys):
+        if not key in compressible:
+            rows.append((filename, "", "", ""))
+    return rows
+
+
 def create_example_csvs():
     """
     creates some examples for csv files
@@ -8,55 +8,136 @@ import os
 
 from PIL import Image
 
-from EXIFnaming.helpers.cv2op import is_blurry, are_similar
+from skimage.metrics import structural_similarity
+
+from EXIFnaming.helpers.analysis import update_features
+from EXIFnaming.helpers.cv2op import preview_min_width
+from EXIFnaming.helpers.features import FeatureStore
 from EXIFnaming.helpers.fileop import moveToSubpath, isfile, is_invalid_path, file_has_ext
+from EXIFnaming.helpers.measuring_tools import Clock
+from EXIFnaming.helpers.moveplan import MovePlan, execute_plan
+from EXIFnaming.helpers.preview import PreviewReader
+from EXIFnaming.helpers.report import ReportWriter
 
 __all__ = ["detect_blurry", "detect_similar", "resize"]
 
-from EXIFnaming.helpers.program_dir import log_function_call
+from EXIFnaming.helpers.program_dir import log_function_call, log, get_info_dir
 from EXIFnaming.helpers.tag_conversion import FilenameAccessor
 
 
-def detect_blurry():
+def detect_blurry(threshold=30, previews=True, processes: int = None, onlyprint=False):
     """
     detects blurry images and put them in a sub directory named blurry
+    the scores of all pictures are written to .EXIFnaming/info/blur_scores.csv to choose the threshold
+    the scores are kept in the feature store, so a second call only analyses new and modified pictures
+    :param threshold: pictures with a lower variance of the laplacian are blurry
+    :param previews: analyse the embedded previews instead of the pictures if they are large enough,
+        also analyses RW2 files
+    :param processes: number of processes computing the scores, default is the number of cpus
+    :param onlyprint: only write the scores, do not move the pictures
     """
+    log_function_call(detect_blurry.__name__, threshold, previews, processes, onlyprint)
     inpath = os.getcwd()
+    paths = []
     for (dirpath, dirnames, filenames) in os.walk(inpath):
-        if is_invalid_path(dirpath): continue
-        print(dirpath, len(dirnames), len(filenames))
-        for filename in filenames:
-            if not file_has_ext(filename, ('.JPG', ".jpg")): continue
-            if not is_blurry(dirpath, filename, 30): continue
-            moveToSubpath(filename, dirpath, "blurry")
+        if is_invalid_path(dirpath, blacklist=["blurry"]): continue
+        paths += [os.path.join(dirpath, filename) for filename in sorted(filenames) if
+                  file_has_ext(filename, _analysed_types(previews))]
+    previewReader = PreviewReader(preview_min_width) if previews else None
+    if previewReader: previewReader.prefetch(paths)
+
+    clock = Clock()
+    store = FeatureStore(previews)
+    keys = None
+    try:
+        keys = update_features(paths, store, previewReader, processes, blur=True)
+    finally:
+        # the entries of files that are not found anymore are dropped
+        store.save(keys)
+    plan = MovePlan(detect_blurry.__name__)
+    n_blurry = 0
+    with ReportWriter(get_info_dir("blur_scores.csv"), ["Directory", "File Name", "Score", "Blurry"]) as writer:
+        for path, key in zip(paths, keys):
+            if key is None: continue
+            dirpath, filename = os.path.split(path)
+            score = store.get_blur(key)
+            # pictures that can not be decoded have no score and are not blurry
+            blurry = score < threshold
+            writer.write_row([dirpath, filename, "%.2f" % score, "x" if blurry else ""])
+            if not blurry: continue
+            n_blurry += 1
+            plan.add(path, os.path.join(dirpath, "blurry", filename))
+    log().info("%d of %d pictures are blurry", n_blurry, len(paths))
+    clock.finish()
+    if not onlyprint: execute_plan(plan)
+
+
+def _analysed_types(previews: bool) -> tuple:
+    if previews: return '.JPG', ".jpg", ".RW2"
+    return '.JPG', ".jpg"
 
 
-def detect_similar(similarity=0.9):
+def detect_similar(similarity=0.9, previews=False, processes: int = None):
     """
     put similar pictures in same sub folder
+    the pictures are decoded once and kept in the feature store, so a second call only analyses new and modified
+    pictures
     :param similarity: -1: completely different, 1: same
+    :param previews: compare the embedded previews instead of the pictures if they are large enough,
+        also compares RW2 files; the similarity of previews is about 0.03 higher, so raise the threshold with it
+    :param processes: number of processes analysing the pictures, default is the number of cpus
     """
     inpath = os.getcwd()
-    for (dirpath, dirnames, filenames) in os.walk(inpath):
-        if is_invalid_path(dirpath): continue
-        print(dirpath, len(dirnames), len(filenames))
-        dircounter = 0
-        filenamesA = [filename for filename in filenames if file_has_ext(filename, ('.JPG', ".jpg"))]
-        for i, filenameA in enumerate(filenamesA):
-            print(filenameA)
+    previewReader = PreviewReader(preview_min_width) if previews else None
+    store = FeatureStore(previews)
+    all_keys = []
+    finished = False
+    try:
+        for (dirpath, dirnames, filenames) in os.walk(inpath):
+            if is_invalid_path(dirpath): continue
+            print(dirpath, len(dirnames), len(filenames))
+            filenamesA = [filename for filename in filenames if file_has_ext(filename, _analysed_types(previews))]
+            paths = [os.path.join(dirpath, filename) for filename in filenamesA]
+            if previewReader: previewReader.prefetch(paths)
+            keys = update_features(paths, store, previewReader, processes, blur=False, similar=True)
+            all_keys += keys
+            thumbnails = {}
+            for filename, key in zip(filenamesA, keys):
+                features = store.get_similar(key) if key else None
+                thumbnails[filename] = features[0] if features else None
+            _group_similar(dirpath, filenamesA, thumbnails, similarity)
+        finished = True
+    finally:
+        # the entries of files that are not found anymore are dropped once all directories are seen
+        store.save(all_keys if finished else None)
+
+
+def _group_similar(dirpath: str, filenamesA: list, thumbnails: dict, similarity: float):
+    dircounter = 0
+    for i, filenameA in enumerate(filenamesA):
+        print(filenameA)
+        notSimCounter = 0
+        for filenameB in filenamesA[i + 1:]:
+            if notSimCounter == 10: break
+            if not isfile(dirpath, filenameA): continue
+            if not isfile(dirpath, filenameB): continue
+            if not _are_similar(filenameA, filenameB, thumbnails, similarity):
+                notSimCounter += 1
+                continue
             notSimCounter = 0
-            for filenameB in filenamesA[i + 1:]:
-                if notSimCounter == 10: break
-                if not isfile(dirpath, filenameA): continue
-                if not isfile(dirpath, filenameB): continue
-                if not are_similar(dirpath, filenameA, dirpath, filenameB, similarity):
-                    notSimCounter += 1
-                    continue
-                notSimCounter = 0
-                moveToSubpath(filenameB, dirpath, "%03d" % dircounter)
-            if not os.path.isdir(os.path.join(dirpath, "%03d" % dircounter)): continue
-            moveToSubpath(filenameA, dirpath, "%03d" % dircounter)
-            dircounter += 1
+            moveToSubpath(filenameB, dirpath, "%03d" % dircounter)
+        if not os.path.isdir(os.path.join(dirpath, "%03d" % dircounter)): continue
+        moveToSubpath(filenameA, dirpath, "%03d" % dircounter)
+        dircounter += 1
+
+
+def _are_similar(filenameA: str, filenameB: str, thumbnails: dict, threshold: float) -> bool:
+    # same as cv2op.are_similar on the stored pictures
+    if thumbnails[filenameA] is None or thumbnails[filenameB] is None: return False
+    s = structural_similarity(thumbnails[filenameA], thumbnails[filenameB])
+    if threshold < s:
+        print(filenameA, filenameB, s)
+    return threshold < s
 
 
 def resize(size=(128, 128)):
@@ -2,63 +2,69 @@
 """
 Reads Tags to use them, but not write to them
 
-dependencies: exiftool, Pillow
+dependencies: exiftool, Pillow, jpegtran (optional)
 """
 
 import datetime as dt
 import os
 import re
+import shutil
 from collections import OrderedDict
+from typing import List, Tuple
 
 import numpy as np
 
 from EXIFnaming.helpers import settings
+from EXIFnaming.helpers.catalog import read_catalog, load_catalog
 from EXIFnaming.helpers.date import giveDatetime, newdate, dateformating, print_firstlast_of_dirname, \
-    find_dir_with_closest_time, find_dir_with_closest_time_new
-from EXIFnaming.helpers.decode import read_exiftags, has_not_keys, read_exiftag
-from EXIFnaming.helpers.fileop import writeToFile, renameInPlace, moveFiles, renameTemp, move, \
-    copyFilesTo, get_filename_sorted_dirfiletuples, is_invalid_path
+    find_dir_with_closest_time
+from EXIFnaming.helpers.decode import read_exiftags, has_not_keys, call_exiftool_batch, read_exiftag_table
+from EXIFnaming.helpers.fileop import copyFilesTo, get_filename_sorted_dirfiletuples, save_tagdict
+from EXIFnaming.helpers.gpx import iter_gpx_chunks, parse_gpx_times, GpxWriter, load_track_cache, iter_track_chunks
 from EXIFnaming.helpers.measuring_tools import Clock, TimeJumpDetector
-from EXIFnaming.helpers.misc import tofloat
+from EXIFnaming.helpers.moveplan import MovePlan, execute_plan
 from EXIFnaming.helpers.program_dir import get_saves_dir, get_gps_dir, get_info_dir, log, log_function_call
+from EXIFnaming.helpers.query import Predicate, Eq, In, Range
+from EXIFnaming.helpers.report import ReportWriter
+from EXIFnaming.helpers.rotation import rotate_pictures, set_orientations, load_rotated, is_rotated, file_stamp, \
+    RotatedRecord
+from EXIFnaming.helpers.snapshot import Snapshot, write_snapshot, snapshot_ext
+from EXIFnaming.helpers.tag_diff import diff_tag_states, inode_tag, file_inode
 from EXIFnaming.helpers.tag_conversion import FilenameBuilder
-from EXIFnaming.helpers.tags import create_model, getPath
+from EXIFnaming.helpers.tags import create_model, dateTimeKey
+from EXIFnaming.helpers.timetable import TimetableIndex, exif_to_datetime64, first_last_per_group, \
+    timetable_columns, timetable_timeformat, timetable_source_row, is_timetable_csv_current
 
-__all__ = ["print_info", "rename", "order", "order_with_timetable", "searchby_exiftag_equality",
-           "searchby_exiftag_interval", "rotate", "rename_from_exif", "print_timetable", "better_gpx_via_timetable"]
+__all__ = ["print_info", "rename", "order", "order_with_timetable", "searchby_exiftags", "searchby_exiftag_equality",
+           "searchby_exiftag_interval", "rotate", "rename_from_exif", "print_timetable", "better_gpx_via_timetable",
+           "save_tags_snapshot", "diff_tags"]
 
 
-def print_info(tagGroupNames=(), allGroups=False):
+def print_info(tagGroupNames=(), allGroups=False, fileext=".txt"):
     """
     write tag info of tagGroupNames to a file in saves dir
     :param tagGroupNames: selectable groups (look into constants)
     :param allGroups: take all tagGroupNames
+    :param fileext: format of the files: .txt, .tsv or .csv, optionally followed by .gz
+        only .txt files are appended to, the other formats are overwritten to stay valid tables
     """
     tagdict = read_exiftags()
     model = create_model(tagdict, 0)
     tagnames = model.TagNames
     if allGroups: tagGroupNames = tagnames.keys()
+    dirname = get_saves_dir()
     for tagGroupName in tagnames:
         if not tagGroupNames == [] and not tagGroupName in tagGroupNames: continue
-        outstring = "%-80s\t" % "File Name"
-        for entry in tagnames[tagGroupName]:
-            if not entry in tagdict: continue
-            outstring += "%-30s\t" % entry
-        outstring += "\n"
-
-        for i in range(len(tagdict["File Name"])):
-            outstring += "%-80s\t" % tagdict["File Name"][i]
-            for entry in tagnames[tagGroupName]:
-                if not entry in tagdict: continue
-                val = tagdict[entry]
-                outstring += "%-30s\t" % val[i]
-            outstring += "\n"
+        entries = [entry for entry in tagnames[tagGroupName] if entry in tagdict]
+        filename = os.path.join(dirname, "tags_" + tagGroupName + fileext)
+        with ReportWriter(filename, ["File Name"] + entries, [80] + [30] * len(entries),
+                          append=fileext == ".txt") as writer:
+            columns = [tagdict["File Name"]] + [tagdict[entry] for entry in entries]
+            writer.write_rows(zip(*columns))
 
-        dirname = get_saves_dir()
-        writeToFile(os.path.join(dirname, "tags_" + tagGroupName + ".txt"), outstring)
 
-
-def rename(Prefix="", dateformat='YYMM-DD', startindex=1, onlyprint=False, keeptags=True, is_video=False, name=""):
+def rename(Prefix="", dateformat='YYMM-DD', startindex=1, onlyprint=False, keeptags=True, is_video=False, name="",
+           workers: int = 1):
     """
     Rename into Format: [Prefix][dateformat](_[name])_[Filenumber][SeriesType][SeriesSubNumber]_[PhotoMode]
     :param Prefix: prefix has to fulfil regex [-a-zA-Z]*
@@ -68,19 +74,16 @@ def rename(Prefix="", dateformat='YYMM-DD', startindex=1, onlyprint=False, keept
     :param keeptags: any tags - name or postfixes will be preserved
     :param is_video: is video file extension
     :param name: optional name between date and filenumber, seldom used
+    :param workers: number of threads to rename the files, useful on network shares
     """
-    log_function_call(rename.__name__, Prefix, dateformat, startindex, onlyprint, keeptags, is_video, name)
+    log_function_call(rename.__name__, Prefix, dateformat, startindex, onlyprint, keeptags, is_video, name, workers)
     Tagdict = read_exiftags(file_types=settings.video_types if is_video else settings.image_types)
     if not Tagdict: return
 
-    # rename temporary
-    if not onlyprint:
-        temppostfix = renameTemp(Tagdict["Directory"], Tagdict["File Name"])
-    else:
-        temppostfix = ""
-
     # initialize
-    outstring = ""
+    dirname = get_saves_dir()
+    timestring = dateformating(dt.datetime.now(), "_MMDDHHmmss")
+    video_str = "_video" if is_video else ""
     Tagdict["File Name new"] = []
     time_old = giveDatetime()
     counter = startindex - 1
@@ -141,18 +144,20 @@ def rename(Prefix="", dateformat='YYMM-DD', startindex=1, onlyprint=False, keept
 
         time_old = time
         Tagdict["File Name new"].append(newname)
-        outstring += _write(model.dir, filename, temppostfix, newname, onlyprint)
 
-    dirname = get_saves_dir()
-    timestring = dateformating(dt.datetime.now(), "_MMDDHHmmss")
-    video_str = "_video" if is_video else ""
-    np.savez_compressed(os.path.join(dirname, "Tags" + video_str + timestring), Tagdict=Tagdict)
-    writeToFile(os.path.join(dirname, "newnames" + video_str + timestring + ".txt"), outstring)
+    # the new names are kept in Tagdict anyway, so they are written at once
+    with ReportWriter(os.path.join(dirname, "newnames" + video_str + timestring + ".txt"), ["old", "new"],
+                      row_format="%-50s\t %-50s\n", header=False, append=True) as newnames:
+        newnames.write_rows(zip(Tagdict["File Name"], Tagdict["File Name new"]))
 
+    # files only swapping names are renamed via a temporary name, all others directly
+    if not onlyprint:
+        plan = MovePlan(rename.__name__ + video_str)
+        for directory, filename, newname in zip(Tagdict["Directory"], Tagdict["File Name"], Tagdict["File Name new"]):
+            plan.add(os.path.join(directory, filename), os.path.join(directory, newname))
+        execute_plan(plan, workers)
 
-def _write(directory, filename, temppostfix, newname, onlyprint):
-    if not onlyprint: renameInPlace(directory, filename + temppostfix, newname)
-    return "%-50s\t %-50s\n" % (filename, newname)
+    save_tagdict(video_str, timestring, Tagdict)
 
 
 def _count_files_for_each_date(Tagdict, startindex, dateformat):
@@ -175,12 +180,15 @@ def _count_files_for_each_date(Tagdict, startindex, dateformat):
     return str(len(str(maxCounter)))
 
 
-def order():
+def order(onlyprint: bool = False, workers: int = 1):
     """
     order by date using exif info
+    :param onlyprint: only log the planned moves
+    :param workers: number of threads to move the files, useful on network shares
     """
-    log_function_call(order.__name__)
+    log_function_call(order.__name__, onlyprint, workers)
     inpath = os.getcwd()
+    plan = MovePlan(order.__name__)
 
     Tagdict = read_exiftags(file_types=settings.image_types)
     timeJumpDetector = TimeJumpDetector()
@@ -201,7 +209,7 @@ def order():
 
         if timeJumpDetector.isJump(time, len(filenames)):
             dirNameDict_lasttime[time_old] = dirName
-            moveFiles(filenames, os.path.join(inpath, dirName))
+            _plan_move_to_new_dir(plan, filenames, os.path.join(inpath, dirName))
 
             filenames = []
             if newdate(time, time_old):
@@ -215,12 +223,13 @@ def order():
         time_old = time
 
     dirNameDict_lasttime[time_old] = dirName
-    moveFiles(filenames, os.path.join(inpath, dirName))
+    _plan_move_to_new_dir(plan, filenames, os.path.join(inpath, dirName))
 
     print_firstlast_of_dirname(dirNameDict_firsttime, dirNameDict_lasttime)
 
     Tagdict_mp4 = read_exiftags(file_types=settings.video_types)
     if len(Tagdict_mp4) == 0:
+        execute_plan(plan, workers, onlyprint)
         return
     leng = len(list(Tagdict_mp4.values())[0])
     log().info('Number of mp4: %d', leng)
@@ -230,131 +239,297 @@ def order():
         dirName = find_dir_with_closest_time(dirNameDict_firsttime, dirNameDict_lasttime, time)
 
         if dirName:
-            move(model.filename, model.dir, os.path.join(inpath, dirName, "mp4"))
+            plan.add(os.path.join(model.dir, model.filename), os.path.join(inpath, dirName, "mp4", model.filename))
         else:
             log().warning("Did not move %s to %s", model.filename, dirName)
+    execute_plan(plan, workers, onlyprint)
+
+
+def _plan_move_to_new_dir(plan: MovePlan, filenames: List[Tuple[str, str]], path: str):
+    if os.path.isdir(path):
+        print("directory already exists: ", path)
+        return
+    for dirpath, filename in filenames:
+        plan.add(os.path.join(dirpath, filename), os.path.join(path, filename))
 
 
-def searchby_exiftag_equality(tag_name: str, value: str):
+def searchby_exiftags(predicate: Predicate, file_types=settings.image_types, dest: str = "matches",
+                      mode: str = "auto"):
+    """
+    searches for files fulfilling the predicate using the tag catalog and copies them to dest
+    :param predicate: combination of Eq, In, Prefix and Range of helpers.query,
+        e.g. Eq("Camera Model Name", "DMC-TZ101") & Range("F Number", 2, 4)
+    :param file_types: file types to search in
+    :param dest: sub directory for the matches
+    :param mode: how to copy, see :func:`fileop.copyFilesTo`
+    """
+    log_function_call(searchby_exiftags.__name__, predicate, file_types, dest, mode)
+    inpath = os.getcwd()
+    catalog = read_catalog(inpath, file_types)
+    files = catalog.paths(catalog.query(predicate))
+    copyFilesTo(files, os.path.join(inpath, dest), mode=mode)
+
+
+def searchby_exiftag_equality(tag_name: str, value: str, mode: str = "auto"):
     """
     searches for files where the value of the exiftag equals the input value
     :param tag_name: exiftag key
     :param value: exiftag value
+    :param mode: how to copy, see :func:`fileop.copyFilesTo`
     """
-    Tagdict = read_exiftags()
-    if has_not_keys(Tagdict, keys=["Directory", "File Name", "Date/Time Original", tag_name]): return
-    leng = len(list(Tagdict.values())[0])
-    files = []
-    for i in range(leng):
-        if not Tagdict[tag_name][i] == value: continue
-        files.append(getPath(Tagdict, i))
-    copyFilesTo(files, os.path.join(os.getcwd(), "matches"))
+    searchby_exiftags(Eq(tag_name, value), mode=mode)
 
 
-def searchby_exiftag_interval(tag_name: str, min_value: float, max_value: float):
+def searchby_exiftag_interval(tag_name: str, min_value: float, max_value: float, mode: str = "auto"):
     """
     searches for files where the value of the exiftag is in the specified interval
     :param tag_name: exiftag key
     :param min_value: interval start
     :param max_value: interval end
+    :param mode: how to copy, see :func:`fileop.copyFilesTo`
     """
-    inpath = os.getcwd()
-    Tagdict = read_exiftags(inpath)
-    if has_not_keys(Tagdict, keys=[tag_name]): return
-    leng = len(list(Tagdict.values())[0])
-    files = []
-    for i in range(leng):
-        value = tofloat(Tagdict[tag_name][i])
-        if not (value and min_value < value < max_value): continue
-        files.append(getPath(Tagdict, i))
-    copyFilesTo(files, os.path.join(inpath, "matches"))
+    searchby_exiftags(Range(tag_name, min_value, max_value, inclusive=False), mode=mode)
+
+
+def save_tags_snapshot(name: str = "", file_types=settings.image_types) -> str:
+    """
+    save the current tags of all files to compare them later via :func:`diff_tags`
+    the tags are taken from the catalog, the inode of each file is added to follow renames and moves
+    :param name: name of the snapshot, default is the current time
+    :param file_types: file types to include
+    :return: filename of the snapshot
+    """
+    log_function_call(save_tags_snapshot.__name__, name, file_types)
+    catalog = read_catalog(file_types=file_types)
+    tagdict = catalog.to_tagdict()
+    tagdict[inode_tag] = [str(file_inode(path)) for path in catalog.paths()]
+    if not name: name = dateformating(dt.datetime.now(), "YYMMDDHHmmss")
+    filename = get_saves_dir("State_" + name + snapshot_ext)
+    write_snapshot(filename, tagdict)
+    log().info("saved tags of %d files to %s", len(catalog), filename)
+    return filename
+
+
+def _find_state(name: str) -> str:
+    if os.path.isfile(name): return name
+    dirname = get_saves_dir()
+    if name: return os.path.join(dirname, "State_" + name + snapshot_ext)
+    states = [os.path.join(dirname, filename) for filename in os.listdir(dirname)
+              if filename.startswith("State_") and filename.endswith(snapshot_ext)]
+    return max(states, key=os.path.getmtime) if states else ""
 
 
-def rotate(subname: str = "", folder: str = r"", sign=1, override=True, ask=True):
+def diff_tags(old: str = "", new: str = "", key: str = "auto", tags: List[str] = None, restore=False,
+              file_types=settings.image_types):
+    """
+    find out which tags of which files changed between two states
+    the number of changes per tag is logged, the changes are written to a file in info dir
+    :param old: snapshot name of :func:`save_tags_snapshot` or filename of any snapshot, default is the newest one
+    :param new: like old, default is the current state of the files
+    :param key: how to identify a file in both states, see :func:`tag_diff.diff_tag_states`
+    :param tags: only compare these tags
+    :param restore: write the old values of the changed tags back to the files
+    :param file_types: file types to include in the current state
+    """
+    log_function_call(diff_tags.__name__, old, new, key, tags, restore, file_types)
+    old_filename = _find_state(old)
+    if not old_filename or not os.path.isfile(old_filename):
+        log().warning("no snapshot %s in %s", old, get_saves_dir())
+        return
+    old_state = Snapshot(old_filename)
+    new_state = Snapshot(_find_state(new)) if new else read_catalog(file_types=file_types)
+    clock = Clock()
+    diff = diff_tag_states(old_state, new_state, key, tags)
+    log().info("%d files in both states, %d removed, %d added", len(diff.old_rows), len(diff.removed),
+               len(diff.added))
+    for tag, count in diff.counts().items():
+        log().info("%-40s %6d changed", tag, count)
+
+    timestring = dateformating(dt.datetime.now(), "_MMDDHHmmss")
+    with ReportWriter(get_info_dir("tags_diff" + timestring + ".tsv"), ["path", "tag", "old", "new"]) as writer:
+        writer.write_rows(diff.iter_changes())
+    clock.finish()
+
+    if restore:
+        blocks = [["-%s=%s" % (tag, value) for tag, value in tag_dict.items()] + [path] for path, tag_dict in
+                  diff.iter_restore_entries()]
+        log().info("restore tags of %d files", len(blocks))
+        # list values like keywords are restored as list
+        call_exiftool_batch(blocks, True, ["-sep", ", "])
+    old_state.close()
+    if new: new_state.close()
+
+
+def rotate(subname: str = "", folder: str = r"", sign=1, override=True, ask=True, processes: int = None,
+           mode: str = "lossless"):
     """
     rotate back according to tag information (Rotate 90 CW or Rotate 270 CW)
     Some programs like franzis hdr projects rotate the resolution of the picture -> picture gets upward resolution and
     shown as rotated two times. This function reverses the resolution rotation according to exif info.
     Pictures that either have no rotation according to exif or have a normal resolution ratio are not modified.
     So calling it a second time wont change anything.
+    The tags are read from the catalog and rotated files are recorded, so a second call reads no picture.
     :param subname: only files that contain this name are rotated, empty string: no restriction
     :param sign: direction of rotation
     :param folder: only files in directories that match this regex are rotated, empty string: no restriction
     :param override: override file with rotated one
     :param ask: if should ask for user confirmation
+    :param processes: number of processes to rotate the pictures, default is the number of cpus
+    :param mode: how to rotate:
+        "lossless": JPEGs via jpegtran without recompression if it is installed, else like "pixels"
+        "pixels": decode, rotate and save with Pillow, JPEGs are recompressed with quality 99
+        "orientation": only set the orientation tag via exiftool so viewers show the picture the same way
     """
-    log_function_call(rotate.__name__, subname, folder, sign, override, ask)
-    from PIL import Image
-
-    NFiles = 0
+    log_function_call(rotate.__name__, subname, folder, sign, override, ask, processes, mode)
+    if not mode in ["lossless", "pixels", "orientation"]:
+        raise ValueError("unknown mode " + mode)
     clock = Clock()
     inpath = os.getcwd()
-    for (dirpath, dirnames, filenames) in os.walk(inpath):
-        if is_invalid_path(dirpath, regex=folder): continue
-        if len(filenames) == 0: continue
-        Tagdict = read_exiftags(dirpath, settings.image_types, ask=ask)
-        if has_not_keys(Tagdict, keys=["Orientation"]): continue
-        leng = len(list(Tagdict.values())[0])
-        for i in range(leng):
-            # Load the original image:
-            model = create_model(Tagdict, i)
-            if not subname in model.filename: continue
-            if model.is_rotated_by(0) or not model.is_upward():
-                continue
-            name = model.get_path()
-            log().info("rotate %s", model.filename)
-            img = Image.open(name)
-            if model.is_rotated_by(90):
-                img_rot = img.rotate(90 * sign, expand=True)
-            elif model.is_rotated_by(-90):
-                img_rot = img.rotate(-90 * sign, expand=True)
-            else:
-                continue
-            NFiles += 1
-            if not override: name = name[:name.rfind(".")] + "_ROTATED" + name[name.rfind("."):]
-            img_rot.save(name, 'JPEG', quality=99, exif=img.info['exif'])
+    catalog = read_catalog(inpath, settings.image_types, ask=ask)
+    if has_not_keys(catalog, keys=["Orientation", "Image Width", "Image Height"]):
+        clock.finish()
+        return
+    rows = catalog.query(In("Orientation", ["Rotate 90 CW", "Rotate 270 CW"]))
+    rows = rows[catalog.numbers("Image Width", rows) < catalog.numbers("Image Height", rows)]
+    if subname:
+        rows = rows[np.char.find(catalog.column("File Name", rows).astype(str), subname) >= 0]
+    if folder:
+        directories = catalog.column("Directory", rows)
+        matching = [directory for directory in np.unique(directories).tolist() if
+                    re.search(folder, os.path.basename(directory))]
+        rows = rows[np.isin(directories, matching)]
+    rotated = load_rotated()
+    jobs = []
+    job_rows = []
+    for row, path, orientation in zip(rows.tolist(), catalog.paths(rows), catalog.column("Orientation", rows)):
+        if is_rotated(path, rotated): continue
+        angle = 90 * sign if orientation == "Rotate 90 CW" else -90 * sign
+        target = path if override else path[:path.rfind(".")] + "_ROTATED" + path[path.rfind("."):]
+        jobs.append((path, target, angle))
+        job_rows.append(row)
+
+    done = []
+    # only the rotated files are recorded, the source of a copy is still to be rotated
+    with RotatedRecord() as record:
+        if mode == "orientation":
+            # the tag rotates the picture the same way as the pixel rotation followed by the old tag
+            for path, target, angle in jobs:
+                if not override: shutil.copy2(path, target)
+            written = set(set_orientations([target for path, target, angle in jobs], 1 if sign == 1 else 3))
+            for job in jobs:
+                if job[1] in written:
+                    done.append(job)
+                    record.add(job[1], file_stamp(job[1]))
+                    continue
+                log().warning("can not set orientation of %s", os.path.basename(job[0]))
+                if not override: os.remove(job[1])
+        else:
+            for job, method in rotate_pictures(jobs, processes, lossless=mode == "lossless"):
+                if not method:
+                    log().warning("can not rotate %s", os.path.basename(job[0]))
+                    continue
+                log().info("rotate %s %s", method, os.path.basename(job[0]))
+                done.append(job)
+                record.add(job[1], file_stamp(job[1]))
+    if override and done:
+        # the catalog gets the new tags instead of extracting the tags of the rotated files again
+        done_paths = {path for path, target, angle in done}
+        job_rows = np.array([row for row, job in zip(job_rows, jobs) if job[0] in done_paths], dtype=np.int64)
+        if mode == "orientation":
+            values = {"Orientation": ["Horizontal (normal)" if sign == 1 else "Rotate 180"] * len(job_rows)}
+        else:
+            values = {"Image Width": catalog.column("Image Height", job_rows),
+                      "Image Height": catalog.column("Image Width", job_rows)}
+            if "Image Size" in catalog:
+                values["Image Size"] = ["x".join(reversed(size.split("x"))) for size in
+                                        catalog.column("Image Size", job_rows).tolist()]
+        catalog.set_values(job_rows, values, np.array([file_stamp(path) for path, _, _ in done], dtype=np.int64))
+        catalog.save()
+    log().info("rotated %d files", len(done))
     clock.finish()
 
 
-def rename_from_exif():
+def rename_from_exif(workers: int = 1):
     """
     use exif information written by :func:`write_exif_using_csv` to restore filename
+    :param workers: number of threads to rename the files, useful on network shares
     """
     Tagdict = read_exiftags()
     if has_not_keys(Tagdict, keys=["Label"]): return
 
-    temppostfix = renameTemp(Tagdict["Directory"], Tagdict["File Name"])
-    leng = len(list(Tagdict.values())[0])
-    for i in range(leng):
-        filename = Tagdict["File Name"][i]
+    plan = MovePlan(rename_from_exif.__name__)
+    for directory, filename, label in zip(Tagdict["Directory"], Tagdict["File Name"], Tagdict["Label"]):
         ext = filename[filename.rfind('.'):]
-        renameInPlace(Tagdict["Directory"][i], filename + temppostfix, Tagdict["Label"][i] + ext)
+        plan.add(os.path.join(directory, filename), os.path.join(directory, label + ext))
+    execute_plan(plan, workers)
 
 
 def print_timetable():
     """
     print the time of the first and last picture in a directory to a file
+    the dates are taken from the tag catalog, only files that changed since the last catalog read are read via exiftool
+    timetable.txt is meant for editing, timetable.csv can be loaded by :meth:`TimetableIndex.load`
     """
+    log_function_call(print_timetable.__name__)
     inpath = os.getcwd()
-    ofile = open(get_info_dir("timetable.txt"), 'a')
-    for (dirpath, dirnames, filenames) in os.walk(inpath):
-        if not inpath == dirpath: continue
+    dirnames = []
+    groups = []
+    paths = []
+    for dirname in sorted(next(os.walk(inpath))[1]):
+        if dirname.startswith('.'): continue
+        log().info("Folder: %s", dirname)
+        fotos = get_filename_sorted_dirfiletuples(settings.image_types, inpath, dirname)
+        if not fotos: continue
+        dirnames.append(dirname)
+        groups.extend([dirname] * len(fotos))
+        paths.extend([os.path.join(dirpath, filename) for dirpath, filename in fotos])
+    times = exif_to_datetime64(_dates_of_files(inpath, paths))
+    first_last = first_last_per_group(np.array(groups, dtype=str), times)
+
+    timefile = get_info_dir("timetable.txt")
+    rows = []
+    with open(timefile, 'w') as ofile:
         for dirname in dirnames:
-            if dirname.startswith('.'): continue
-            log().info("Folder: %s", dirname)
-            fotos = get_filename_sorted_dirfiletuples(settings.image_types, inpath, dirname)
-            if not fotos: continue
-            first = _get_time(fotos[0])
-            last = _get_time(fotos[-1])
-            ofile.write("%-55s; %12s; %12s\n" % (dirname, first, last))
-    ofile.close()
+            first, last = first_last.get(dirname, (None, None))
+            if first is None:
+                ofile.write("%-55s; %12s; %12s\n" % (dirname, "", ""))
+                rows.append([dirname, "", ""])
+                continue
+            first = first.item()
+            last = last.item()
+            ofile.write("%-55s; %12s; %12s\n" % (dirname, first.strftime(_read_timetable.timeformat),
+                                                 last.strftime(_read_timetable.timeformat)))
+            rows.append([dirname, first.strftime(timetable_timeformat), last.strftime(timetable_timeformat)])
+    # the csv records the state of the closed txt, so an edit of the txt is detected by better_gpx_via_timetable
+    with ReportWriter(get_info_dir("timetable.csv"), timetable_columns, header=False) as writer:
+        writer.write_rows([timetable_source_row(timefile), timetable_columns] + rows)
 
 
-def _get_time(dirfile: tuple) -> str:
-    tags = read_exiftag(dirfile[0], dirfile[1])
-    if not "Date/Time Original" in tags: return ""
-    time = giveDatetime(tags["Date/Time Original"])
-    return time.strftime(_read_timetable.timeformat)
+def _dates_of_files(inpath: str, paths: List[str]) -> List[str]:
+    """
+    :return: Date/Time Original of each file, from the catalog if the file did not change since the last catalog read
+    """
+    dates = [""] * len(paths)
+    missing = list(range(len(paths)))
+    catalog = load_catalog(inpath, settings.image_types)
+    if catalog is not None and dateTimeKey in catalog:
+        cached = {}
+        for path, stamp, date in zip(catalog.paths(), catalog.stamps.tolist(), catalog.column(dateTimeKey).tolist()):
+            cached[os.path.normpath(path)] = (tuple(stamp), date)
+        missing = []
+        for i, path in enumerate(paths):
+            entry = cached.get(os.path.normpath(path))
+            stat = os.stat(path)
+            if entry and entry[0] == (stat.st_size, stat.st_mtime_ns):
+                dates[i] = entry[1]
+            else:
+                missing.append(i)
+    if missing:
+        log().info("read dates of %d files that are not in the catalog", len(missing))
+        table = read_exiftag_table([paths[i] for i in missing], ["DateTimeOriginal"])
+        for i in missing:
+            dates[i] = table.get(os.path.normpath(paths[i]), [""])[0]
+    return dates
 
 
 def order_with_timetable(timefile: str = None):
@@ -372,13 +547,15 @@ def order_with_timetable(timefile: str = None):
     Tagdict = read_exiftags()
     leng = len(list(Tagdict.values())[0])
     log().info('Number of jpg: %d', leng)
+    plan = MovePlan(order_with_timetable.__name__)
     for i in range(leng):
         model = create_model(Tagdict, i)
         time = giveDatetime(model.get_date())
         dirName = find_dir_with_closest_time(dirNameDict_firsttime, dirNameDict_lasttime, time)
 
         if dirName:
-            move(model.filename, model.dir, os.path.join(os.getcwd(), dirName))
+            plan.add(os.path.join(model.dir, model.filename), os.path.join(os.getcwd(), dirName, model.filename))
+    execute_plan(plan)
 
 
 def _read_timetable(filename: str = None):
@@ -418,50 +595,46 @@ def _read_timetable_new(filename: str = None):
     return dirNameDict
 
 
-def better_gpx_via_timetable(gpxfilename: str):
+def better_gpx_via_timetable(gpxfilename: str = ""):
     """
     crossmatch gpx file with timetable and take only entries for which photos exist
-    :param gpxfilename: input gpx file
+    :param gpxfilename: input gpx file, if empty the track cached by :func:`setexif.merge_gpx` is used
     output: _new1.gpx containing only usefull locations
             _new2.gpx containing only not usefull locations
 
     does not uses exif infos
     """
-
-    def write(dirName_last, gpxfile_out):
-        if dirName != dirName_last:
-            if not dirName_last == "": gpxfile_out.write("</trkseg></trk>\r\n")
-            gpxfile_out.write("<trk><name>" + dirName + "</name><trkseg>\r\n")
-        gpxfile_out.write(line)
-
     timefile = get_info_dir("timetable.txt")
-    gpxfilename = get_gps_dir(gpxfilename)
-    dirNameDict = _read_timetable_new(timefile)
-    timeregex = re.compile("(.*<time>)([^<]*)(</time>.*)")
+    csvfile = get_info_dir("timetable.csv")
+    # timetable.txt may have been edited after print_timetable
+    if is_timetable_csv_current(csvfile, timefile):
+        timetableIndex = TimetableIndex.load(csvfile, 3600)
+    else:
+        timetableIndex = TimetableIndex(_read_timetable_new(timefile), 3600)
+    if gpxfilename:
+        gpxfilename = get_gps_dir(gpxfilename)
+        chunks = _iter_gpx_file_chunks(gpxfilename)
+    else:
+        track = load_track_cache(get_gps_dir())
+        if track is None:
+            log().warning("no up to date track cache, call merge_gpx first")
+            return
+        gpxfilename = get_gps_dir("merged", "merged.gpx")
+        chunks = iter_track_chunks(track)
     gpxfilename_out, ext = gpxfilename.rsplit('.', 1)
-    dirName_last1 = ""
-    dirName_last2 = ""
-    gpxfile_out1 = open(gpxfilename_out + "_new1." + ext, "w")
-    gpxfile_out2 = open(gpxfilename_out + "_new2." + ext, "w")
-    with open(gpxfilename, "r") as gpxfile:
-        for line in gpxfile:
-            match = timeregex.match(line)
-            if not match:
-                if "</gpx>" in line:
-                    gpxfile_out1.write("</trkseg></trk>\r\n")
-                    gpxfile_out2.write("</trkseg></trk>\r\n")
-                gpxfile_out1.write(line)
-                gpxfile_out2.write(line)
-                continue
-            line = line.replace("wpt", "trkpt")
-            time = match.group(2)
-            time = dt.datetime.strptime(time, "%Y-%m-%dT%H:%M:%SZ")
-            dirName = find_dir_with_closest_time_new(dirNameDict, time, 3600)
-            if "unrelated" in dirName:
-                write(dirName_last2, gpxfile_out2)
-                dirName_last2 = dirName
-            else:
-                write(dirName_last1, gpxfile_out1)
-                dirName_last1 = dirName
-    gpxfile_out1.close()
-    gpxfile_out2.close()
+    gpxWriter1 = GpxWriter(gpxfilename_out + "_new1." + ext)
+    gpxWriter2 = GpxWriter(gpxfilename_out + "_new2." + ext)
+    for points, times in chunks:
+        dirNames = timetableIndex.classify(times)
+        for point, time, dirName in zip(points, times, dirNames):
+            if np.isnat(time): continue
+            gpxWriter = gpxWriter2 if "unrelated" in dirName else gpxWriter1
+            gpxWriter.write(dirName, *point[1:])
+    gpxWriter1.close()
+    gpxWriter2.close()
+
+
+def _iter_gpx_file_chunks(gpxfilename: str):
+    for points in iter_gpx_chunks(gpxfilename):
+        points = [point for point in points if point[4]]
+        yield points, parse_gpx_times([point[4] for point in points])
@@ -7,19 +7,27 @@ dependencies: exiftool
 import csv
 import datetime as dt
 import os
+from collections import OrderedDict
 from typing import Union, List, Iterable
 
+import numpy as np
+
 from EXIFnaming.helpers import settings
+from EXIFnaming.helpers.csv_rules import CsvRuleSet
 from EXIFnaming.helpers.date import giveDatetime, dateformating
 from EXIFnaming.helpers.decode import read_exiftags, call_exiftool, askToContinue, write_exiftags, count_files_in, \
-    write_exiftag, has_not_keys, call_exiftool_direct, read_exiftag
+    write_exiftag, has_not_keys, write_exiftag_batch, call_exiftool_batch, read_exiftag_table
 from EXIFnaming.helpers.fileop import filterFiles, is_invalid_path
+from EXIFnaming.helpers.gpx import interpolate_track, get_gpx_filenames, read_track, merge_tracks, simplify_track, \
+    save_track_cache, load_track_cache, write_track, read_gps_dir_track
 from EXIFnaming.helpers.measuring_tools import Clock, DirChangePrinter
 from EXIFnaming.helpers.program_dir import get_gps_dir, get_setexif_dir, log, log_function_call
 from EXIFnaming.helpers.tag_conversion import FileMetaData, Location, add_dict, FilenameAccessor
-from EXIFnaming.helpers.tags import create_model, hasDateTime
+from EXIFnaming.helpers.tags import create_model
+from EXIFnaming.helpers.timetable import exif_to_datetime64
 
-__all__ = ["shift_time", "fake_date", "geotag", "write_exif_using_csv", "copy_exif_via_mainname"]
+__all__ = ["shift_time", "fake_date", "geotag", "geotag_native", "merge_gpx", "write_exif_using_csv",
+           "copy_exif_via_mainname"]
 
 
 def shift_time(hours: int = 0, minutes: int = 0, seconds: int = 0, is_video: bool = False):
@@ -96,12 +104,13 @@ def geotag(timezone: int = 2, offset: str = "", start_folder: str = ""):
     options = ["-r", "-geotime<${DateTimeOriginal}%+03d:00" % timezone]
     if offset:
         options.append("-geosync=" + offset)
-    for (dirpath, dirnames, filenames) in os.walk(gpxDir):
-        if not gpxDir == dirpath: break
-        for filename in filenames:
-            if not filename.endswith(".gpx"): continue
-            options.append("-geotag")
-            options.append(os.path.join(gpxDir, filename))
+    gpx_filenames = get_gpx_filenames(gpxDir)
+    if load_track_cache(gpxDir, gpx_filenames) is not None and os.path.isfile(_merged_gpx_filename()):
+        log().info("use gpx track merged by merge_gpx")
+        gpx_filenames = [_merged_gpx_filename()]
+    for gpx_filename in gpx_filenames:
+        options.append("-geotag")
+        options.append(gpx_filename)
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if not inpath == dirpath: break
         for dirname in dirnames:
@@ -111,6 +120,90 @@ def geotag(timezone: int = 2, offset: str = "", start_folder: str = ""):
             call_exiftool(inpath, dirname, options=options)
 
 
+def geotag_native(timezone: int = 2, offset: str = "", start_folder: str = "", max_gap: int = 1800):
+    """
+    alternative to :func:`geotag` which does not use exiftool -geotag
+    all gpx files in the folder ".gps" are parsed once and the positions of all pictures are interpolated at once,
+    the gps information is written in a single exiftool session
+    :param timezone: number of hours offset
+    :param offset: offset in minutes and seconds, has to be in format +/-mm:ss e.g. -03:02
+    :param start_folder: directories before this name will be ignored, does not needs to be a full directory name
+    :param max_gap: maximal seconds between two track points to interpolate between them,
+        also maximal seconds a picture may be taken before the first or after the last track point
+    """
+    log_function_call(geotag_native.__name__, timezone, offset, start_folder, max_gap)
+    inpath = os.getcwd()
+    track = read_gps_dir_track(get_gps_dir())
+    log().info("%d track points read", len(track))
+    if len(track) == 0: return
+
+    Tagdict = read_exiftags(inpath, settings.image_types)
+    if has_not_keys(Tagdict, keys=["Directory", "File Name", "Date/Time Original"]): return
+    paths = []
+    datetimes = []
+    for i, dirpath in enumerate(Tagdict["Directory"]):
+        relpath = os.path.relpath(dirpath, inpath)
+        dirname = relpath.split(os.sep)[0]
+        if relpath == "." or dirname.startswith(".") or dirname < start_folder: continue
+        paths.append(os.path.join(dirpath, Tagdict["File Name"][i]))
+        datetimes.append(Tagdict["Date/Time Original"][i])
+
+    times = exif_to_datetime64(datetimes)
+    times = times - np.timedelta64(timezone, 'h') + np.timedelta64(_parse_offset(offset), 's')
+    positions, valid = interpolate_track(track, times, max_gap)
+    entries = [(path, _gps_tag_dict(position)) for path, position, is_valid in zip(paths, positions, valid)
+               if is_valid]
+    log().info("%d of %d pictures are within the tracks", len(entries), len(paths))
+    write_exiftag_batch(entries)
+
+
+def merge_gpx(tolerance: float = 5., max_interval: int = 600):
+    """
+    merge all gpx files in the folder ".gps" to one time ordered track
+    duplicated and out of order points are removed and the track is simplified
+    the result is cached in the folder ".gps" and used by :func:`geotag`, :func:`geotag_native`
+    and :func:`readexif.better_gpx_via_timetable` as long as the gpx files are not changed
+    :param tolerance: maximal deviation in meters of the simplified track
+    :param max_interval: maximal seconds between two points of the simplified track
+    """
+    log_function_call(merge_gpx.__name__, tolerance, max_interval)
+    gpxDir = get_gps_dir()
+    gpx_filenames = get_gpx_filenames(gpxDir)
+    tracks = [read_track(gpx_filename) for gpx_filename in gpx_filenames]
+    number_of_points = sum(len(track) for track in tracks)
+    track = merge_tracks(tracks)
+    log().info("%d points of %d gpx files merged to %d points", number_of_points, len(gpx_filenames), len(track))
+    track = simplify_track(track, tolerance, max_interval)
+    log().info("simplified to %d points", len(track))
+    save_track_cache(gpxDir, gpx_filenames, track)
+    os.makedirs(os.path.dirname(_merged_gpx_filename()), exist_ok=True)
+    write_track(_merged_gpx_filename(), track, "merged")
+
+
+def _merged_gpx_filename() -> str:
+    return get_gps_dir("merged", "merged.gpx")
+
+
+def _parse_offset(offset: str) -> int:
+    if not offset: return 0
+    sign = -1 if offset.startswith("-") else 1
+    seconds = 0
+    for part in offset.lstrip("+-").split(":"):
+        seconds = seconds * 60 + int(part)
+    return sign * seconds
+
+
+def _gps_tag_dict(position) -> dict:
+    time = position["time"].item()
+    tagDict = {"GPSLatitudeRef": "%.6f" % position["lat"], "GPSLatitude": "%.6f" % position["lat"],
+               "GPSLongitudeRef": "%.6f" % position["lon"], "GPSLongitude": "%.6f" % position["lon"],
+               "GPSDateStamp": time.strftime("%Y:%m:%d"), "GPSTimeStamp": time.strftime("%H:%M:%S")}
+    if not np.isnan(position["ele"]):
+        tagDict["GPSAltitudeRef"] = "%.1f" % position["ele"]
+        tagDict["GPSAltitude"] = "%.1f" % abs(position["ele"])
+    return tagDict
+
+
 def write_exif_using_csv(csv_filenames: Union[str, List[str]] = "*", folder: str = r"", start_folder: str = "",
                          csv_folder: str = None, csv_restriction: str = "", import_filename: bool = True,
                          import_exif: bool = True,
@@ -173,20 +266,17 @@ def write_exif_using_csv(csv_filenames: Union[str, List[str]] = "*", folder: str
         csv_restriction = os.path.join(csv_folder, csv_restriction) + ".csv"
 
     filetypes = settings.video_types if is_video else settings.image_types
+    rule_set = CsvRuleSet.from_csv_files(csv_filenames)
+    restriction_set = CsvRuleSet.from_csv_files([csv_restriction]) if csv_restriction else None
 
     for (dirpath, dirnames, filenames) in os.walk(inpath):
         if is_invalid_path(dirpath, regex=folder, start=start_folder): continue
         for filename in filterFiles(filenames, filetypes):
             meta_data = FileMetaData(dirpath, filename)
-            if not _passes_restrictor(meta_data, csv_restriction): continue
+            if restriction_set is not None and not restriction_set.passes(meta_data): continue
             if import_filename: meta_data.import_filename()
             if import_exif: meta_data.import_exif(overwrite_gps)
-
-            for csv_filename in csv_filenames:
-                with open(csv_filename, "r") as csvfile:
-                    reader = csv.DictReader(csvfile, dialect='semicolon')
-                    for row in reader:
-                        meta_data.update(row)
+            rule_set.update(meta_data)
 
             if not only_when_changed or meta_data.has_changed:
                 write_exiftag(meta_data.to_tag_dict(), meta_data.directory, meta_data.filename)
@@ -194,17 +284,6 @@ def write_exif_using_csv(csv_filenames: Union[str, List[str]] = "*", folder: str
     clock.finish()
 
 
-def _passes_restrictor(meta_data: FileMetaData, csv_restriction: str):
-    if not csv_restriction:
-        return True
-    with open(csv_restriction, "r") as csvfile:
-        reader = csv.DictReader(csvfile, dialect='semicolon')
-        for row in reader:
-            if meta_data.passes_restrictions(row):
-                return True
-    return False
-
-
 def copy_exif_via_mainname(origin: str, target: str, overwriteDateTime: bool = False,
                            file_types: Iterable = settings.image_types):
     """
@@ -217,27 +296,32 @@ def copy_exif_via_mainname(origin: str, target: str, overwriteDateTime: bool = F
     """
     log_function_call(copy_exif_via_mainname.__name__, origin, target)
     inpath = os.getcwd()
-    target_dict = {}
-    exclusion_tags = ["--PreviewImage", "--ThumbnailImage", "--Rating"]
-    command = "-TagsFromFile"
+    target_dict = OrderedDict()
+    target_names = {}
     for (dirpath, dirnames, filenames) in os.walk(os.path.join(inpath, target)):
         if is_invalid_path(dirpath): continue
-        filenames = filterFiles(filenames, file_types)
-        for filename in filenames:
-            if not overwriteDateTime:
-                tagDict = read_exiftag(dirpath, filename)
-                if hasDateTime(tagDict): continue
-            main = FilenameAccessor(filename).mainname()
-            target_dict.setdefault(main, []).append(os.path.join(dirpath, filename))
+        for filename in filterFiles(filenames, file_types):
+            target_dict.setdefault(FilenameAccessor(filename).mainname(), []).append(os.path.join(dirpath, filename))
+    if not overwriteDateTime:
+        dates = read_exiftag_table([path for paths in target_dict.values() for path in paths], ["DateTimeOriginal"])
+        for main in list(target_dict.keys()):
+            target_dict[main] = [path for path in target_dict[main] if
+                                 not dates.get(os.path.normpath(path), [""])[0]]
+            if not target_dict[main]: del target_dict[main]
+    for main, paths in target_dict.items():
+        target_names[main] = {os.path.basename(path) for path in paths}
+
+    exclusion_tags = ["--PreviewImage", "--ThumbnailImage", "--Rating"]
+    blocks = []
     for (dirpath, dirnames, filenames) in os.walk(os.path.join(inpath, origin)):
         if is_invalid_path(dirpath): continue
-        filenames = filterFiles(filenames, settings.image_types)
-        for filename in filenames:
+        for filename in filterFiles(filenames, settings.image_types):
             main = FilenameAccessor(filename).mainname()
             if not main in target_dict: continue
-            if filename in [os.path.basename(target_file) for target_file in target_dict[main]]: continue
-            orgin_file = os.path.join(dirpath, filename)
+            if filename in target_names[main]: continue
+            origin_file = os.path.join(dirpath, filename)
             for target_file in target_dict[main]:
-                commands = [command, orgin_file, target_file]
-                call_exiftool_direct(exclusion_tags + commands)
+                blocks.append(exclusion_tags + ["-TagsFromFile", origin_file, target_file])
             del target_dict[main]
+    log().info("copy tags to %d files", len(blocks))
+    call_exiftool_batch(blocks, True)
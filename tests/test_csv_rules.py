@@ -0,0 +1,76 @@
+import random
+import unittest
+
+from EXIFnaming.helpers.csv_rules import CsvRuleSet
+from EXIFnaming.helpers.pattern_matcher import PatternMatcher
+from EXIFnaming.helpers.tag_conversion import FileMetaData
+from EXIFnaming.nameop import _compress_name_parts
+
+
+class CsvRuleSetTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(3)
+        self.rows = []
+        for i in range(300):
+            row = {"title": "title%d" % i, "tags": "tag%d" % i}
+            for key, values in [("directory", ["Island", "2019_Island", "Norway", ""]),
+                                ("name_main", ["ISL19", "NOR19", ""]), ("first", ["0010", "0100", "0120", ""]),
+                                ("last", ["0050", "0110", "0200", ""]), ("name_part", ["HDR", "0105", "", None])]:
+                row[key] = random.choice(values)
+            self.rows.append(row)
+        self.files = [(directory, "%s_%04d%s.JPG" % (pre, counter, post))
+                      for directory in ["/p/190727_Island", "/p/190801_Norway", "/p/other"]
+                      for pre in ["ISL19", "NOR19", "X"] for counter in range(0, 220, 7) for post in ["", "_HDR"]]
+
+    def test_same_as_all_rows(self):
+        rule_set = CsvRuleSet(self.rows)
+        for directory, filename in self.files:
+            expected = FileMetaData(directory, filename)
+            for row in self.rows:
+                expected.update(row)
+            actual = FileMetaData(directory, filename)
+            rule_set.update(actual)
+            self.assertEqual((expected.title, expected.tags, expected.has_changed),
+                             (actual.title, actual.tags, actual.has_changed))
+
+    def test_passes(self):
+        rule_set = CsvRuleSet(self.rows[:20])
+        for directory, filename in self.files:
+            expected = any([FileMetaData(directory, filename).passes_restrictions(row) for row in self.rows[:20]])
+            self.assertEqual(expected, rule_set.passes(FileMetaData(directory, filename)))
+        self.assertFalse(CsvRuleSet().passes(FileMetaData("/p", "ISL19_0001.JPG")))
+
+    def test_compressed_name_parts(self):
+        all_filenames = ["ISL19_%04d.JPG" % i for i in range(1, 11)] + ["ISL19_0005_HDR.JPG", "ISL19_0012.JPG",
+                                                                         "NOR19_0003.JPG", "NOR19_0004.MP4"]
+        filenames = [filename for filename in all_filenames if not filename in ["ISL19_0007.JPG", "NOR19_0004.MP4"]]
+        rows = _compress_name_parts(filenames, all_filenames)
+        self.assertEqual([("", "ISL19", "0001", "0006"), ("", "ISL19", "0008", "0012"), ("", "NOR19", "0003", "0003")], rows)
+        rule_set = CsvRuleSet([dict(name_part=a, name_main=b, first=c, last=d) for a, b, c, d in rows])
+        for filename in all_filenames:
+            self.assertEqual(filename in filenames, rule_set.passes(FileMetaData("", filename)))
+
+    def test_compressed_name_parts_counter_width(self):
+        # 1000 follows 999 although it is sorted before as string
+        all_filenames = ["ISL19_%d.JPG" % i for i in range(997, 1002)]
+        filenames = all_filenames[:3] + all_filenames[4:]
+        rows = _compress_name_parts(filenames, all_filenames)
+        self.assertEqual([("", "ISL19", "997", "999"), ("", "ISL19", "1001", "1001")], rows)
+        rule_set = CsvRuleSet([dict(name_part=a, name_main=b, first=c, last=d) for a, b, c, d in rows])
+        for filename in all_filenames:
+            self.assertEqual(filename in filenames, rule_set.passes(FileMetaData("", filename)))
+
+
+class PatternMatcherTest(unittest.TestCase):
+    def test_find(self):
+        patterns = ["HDR", "HDRT", "DR", "ISL19_0105", "0105", "Island", "x"]
+        matcher = PatternMatcher(patterns)
+        self.assertEqual({0, 2, 3, 4}, matcher.find("ISL19_0105_HDR.JPG"))
+        self.assertEqual({0, 1, 2}, matcher.find("HDRT"))
+        self.assertEqual(set(), matcher.find("NOR19_0001.JPG"))
+        matcher.add("")
+        self.assertEqual({7}, matcher.find("NOR19_0001.JPG"))
+
+
+if __name__ == '__main__':
+    unittest.main()
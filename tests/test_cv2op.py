@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+from skimage.metrics import structural_similarity
+
+from EXIFnaming import picture as picture_module
+from EXIFnaming.helpers import program_dir
+from EXIFnaming.helpers.cv2op import read_picture, variance_of_laplacian, blur_decode_width, _decode_flags
+
+
+class ReadPictureTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        picture = np.random.RandomState(0).randint(0, 256, (1000, 1500, 3)).astype(np.uint8)
+        picture = cv2.GaussianBlur(cv2.resize(picture, (6000, 4000)), (0, 0), 8)
+        cv2.imwrite(os.path.join(self.tmpdir.name, "a.JPG"), picture, [cv2.IMWRITE_JPEG_QUALITY, 95])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_decode_flags(self):
+        file_bytes = np.fromfile(os.path.join(self.tmpdir.name, "a.JPG"), dtype=np.uint8)
+        self.assertEqual(cv2.IMREAD_GRAYSCALE, _decode_flags(file_bytes, 0))
+        self.assertEqual(cv2.IMREAD_REDUCED_GRAYSCALE_2, _decode_flags(file_bytes, 2000))
+        self.assertEqual(cv2.IMREAD_REDUCED_GRAYSCALE_8, _decode_flags(file_bytes, 500))
+        self.assertEqual(cv2.IMREAD_GRAYSCALE, _decode_flags(file_bytes, 4000))
+
+    def test_reduced_blur_score(self):
+        full = read_picture(self.tmpdir.name, "a.JPG")
+        reduced = read_picture(self.tmpdir.name, "a.JPG", decode_width=blur_decode_width)
+        self.assertEqual((333, 500), reduced.shape)
+        self.assertAlmostEqual(1., variance_of_laplacian(reduced) / variance_of_laplacian(full), delta=0.05)
+
+    def test_grayscale_similarity(self):
+        # libjpeg decodes the luminance directly, which rounds differently than converting the color picture
+        picture = cv2.imread(os.path.join(self.tmpdir.name, "a.JPG"))
+        noise = np.random.RandomState(1).randint(-20, 21, picture.shape)
+        cv2.imwrite(os.path.join(self.tmpdir.name, "b.JPG"), np.clip(picture + noise, 0, 255).astype(np.uint8))
+        names = [os.path.join(self.tmpdir.name, name) for name in ["a.JPG", "b.JPG"]]
+        gray = [read_picture("", name, 100) for name in names]
+        color = [cv2.cvtColor(cv2.resize(cv2.imread(name), (100, 66)), cv2.COLOR_BGR2GRAY) for name in names]
+        self.assertEqual(color[0].shape, gray[0].shape)
+        self.assertAlmostEqual(structural_similarity(*color), structural_similarity(*gray), delta=0.01)
+
+
+class DetectBlurryTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        program_dir.create_program_dir.dir = None
+        picture = np.random.RandomState(0).randint(0, 256, (400, 600, 3)).astype(np.uint8)
+        cv2.imwrite("sharp.JPG", picture)
+        cv2.imwrite("blurry.JPG", cv2.GaussianBlur(picture, (0, 0), 10))
+        with open("broken.JPG", "wb") as file:
+            file.write(b"no picture")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        program_dir.create_program_dir.dir = None
+        self.tmpdir.cleanup()
+
+    def test_detect_blurry(self):
+        picture_module.detect_blurry(processes=2)
+        self.assertEqual(["blurry.JPG"], os.listdir("blurry"))
+        self.assertTrue(os.path.isfile("sharp.JPG"))
+        with open(program_dir.get_info_dir("blur_scores.csv"), encoding="utf-8") as file:
+            rows = [line.split(";") for line in file.read().splitlines()]
+        self.assertEqual(["File Name", "Blurry"], [rows[0][1], rows[0][3]])
+        self.assertEqual([("blurry.JPG", "x"), ("broken.JPG", ""), ("sharp.JPG", "")],
+                         [(row[1], row[3]) for row in rows[1:]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from unittest import mock
+
+from EXIFnaming.helpers import decode, program_dir, settings
+
+
+class DecodeTestCase(unittest.TestCase):
+    def setUp(self):
+        # the log is written to the program dir of the working directory
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        program_dir.create_program_dir.dir = None
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        program_dir.create_program_dir.dir = None
+        self.tmpdir.cleanup()
+
+
+class CallExiftoolBatchTest(DecodeTestCase):
+    def call_batch(self, blocks, override=True, common_options=None):
+        calls = []
+
+        def call_exiftool_direct(options, override):
+            with open(options[1], encoding=settings.encoding_format) as argfile:
+                calls.append((options, override, argfile.read()))
+            return "", ""
+
+        with mock.patch.object(decode, "call_exiftool_direct", call_exiftool_direct):
+            decode.call_exiftool_batch(blocks, override, common_options)
+        return calls
+
+    def test_argfile(self):
+        calls = self.call_batch([["-Title=a b", "x.JPG"], ["-Description=line1\nline2\\", "y.JPG"]], True, ["-n"])
+        self.assertEqual(1, len(calls))
+        options, override, content = calls[0]
+        self.assertFalse(override)
+        self.assertEqual(["-@", options[1], "-common_args"], options[:3])
+        self.assertEqual(["-n", "-overwrite_original_in_place"], options[-2:])
+        # one argument per line, line breaks are escaped via #[CSTR]
+        self.assertEqual("-Title=a b\nx.JPG\n-execute\n#[CSTR]-Description=line1\\nline2\\\\\ny.JPG\n", content)
+
+    def test_no_blocks(self):
+        self.assertEqual([], self.call_batch([]))
+
+    def test_write_exiftag_batch(self):
+        with mock.patch.object(decode, "call_exiftool_batch") as call_exiftool_batch:
+            decode.write_exiftag_batch([("x.JPG", OrderedDict([("Title", "a"), ("Keywords", ["b", "c", "b", ""]),
+                                                               ("Rating", "")])),
+                                        ("y.JPG", {"Title": "d"})], ["-n"])
+        call_exiftool_batch.assert_called_once_with([["-n", "-Title=a", "-Keywords=b", "-Keywords=c", "x.JPG"],
+                                                     ["-n", "-Title=d", "y.JPG"]], True)
+
+    def test_write_exiftag_batch_empty(self):
+        with mock.patch.object(decode, "call_exiftool_batch") as call_exiftool_batch:
+            decode.write_exiftag_batch([])
+        call_exiftool_batch.assert_not_called()
+
+
+class ReadExiftagTableTest(DecodeTestCase):
+    def test_read_exiftag_table(self):
+        out = "\n".join(["C:/pics/a\tx.JPG\t2019:07:27 10:00:00\t3",
+                         "C:/pics/a/\ty 1.JPG\t-\t-",
+                         "Warning: unreadable",
+                         "/pics/b\tz.JPG\t\t5"]) + "\n"
+        with mock.patch.object(decode, "call_exiftool_batch", return_value=(out, "")) as call_exiftool_batch:
+            table = decode.read_exiftag_table(["x.JPG", "y 1.JPG", "z.JPG"], ["DateTimeOriginal", "Rating"])
+        call_exiftool_batch.assert_called_once_with(
+            [["-T", "-f", "-Directory", "-FileName", "-DateTimeOriginal", "-Rating", "x.JPG", "y 1.JPG", "z.JPG"]],
+            False)
+        # keys are normalized paths, "-" marks missing values
+        self.assertEqual([(os.path.normpath("C:/pics/a/x.JPG"), ["2019:07:27 10:00:00", "3"]),
+                          (os.path.normpath("C:/pics/a/y 1.JPG"), ["", ""]),
+                          (os.path.normpath("/pics/b/z.JPG"), ["", "5"])], list(table.items()))
+
+    def test_no_paths(self):
+        with mock.patch.object(decode, "call_exiftool_batch") as call_exiftool_batch:
+            self.assertEqual({}, decode.read_exiftag_table([], ["DateTimeOriginal"]))
+        call_exiftool_batch.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from EXIFnaming import picture as picture_module
+from EXIFnaming.helpers import program_dir
+from EXIFnaming.helpers.analysis import update_features
+from EXIFnaming.helpers.cv2op import similarity_features
+from EXIFnaming.helpers.features import FeatureStore, file_key
+
+
+class FeatureStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        program_dir.create_program_dir.dir = None
+        random = np.random.RandomState(0)
+        self.pictures = [cv2.resize(random.randint(0, 256, (40, 60, 3)).astype(np.uint8), (600, 400)) for i in
+                         range(2)]
+        cv2.imwrite("a.JPG", self.pictures[0])
+        cv2.imwrite("b.JPG", self.pictures[0])
+        cv2.imwrite("c.JPG", self.pictures[1])
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        program_dir.create_program_dir.dir = None
+        self.tmpdir.cleanup()
+
+    def test_store(self):
+        store = FeatureStore(False)
+        keys = update_features(["a.JPG", "c.JPG", "missing.JPG"], store, processes=1, similar=True)
+        self.assertIsNone(keys[2])
+        store.save()
+        os.rename("a.JPG", "d.JPG")
+        store = FeatureStore(False)
+        self.assertEqual(2, len(store))
+        # the features of the renamed file are found by its inode
+        self.assertEqual(keys[0], file_key("d.JPG"))
+        self.assertIsNotNone(store.get_blur(keys[0]))
+        thumbnail, phash, histogram = store.get_similar(keys[0])
+        # like cv2op.read_picture before the grayscale decoding
+        expected = cv2.cvtColor(cv2.resize(cv2.imread("d.JPG", cv2.IMREAD_UNCHANGED), (100, 66)), cv2.COLOR_BGR2GRAY)
+        np.testing.assert_array_equal(expected, thumbnail)
+        self.assertEqual(similarity_features(np.fromfile("d.JPG", dtype=np.uint8))[1], phash)
+        self.assertAlmostEqual(3., histogram.sum(), places=5)
+        self.assertNotEqual(phash, store.get_similar(keys[1])[1])
+
+    def similar_files(self) -> list:
+        return sorted(filename for filename in os.listdir(program_dir.get_saves_dir()) if filename.endswith(".npy"))
+
+    def test_lazy_similar(self):
+        store = FeatureStore(False)
+        keys = update_features(["a.JPG", "c.JPG"], store, processes=1, similar=True)
+        store.save()
+        self.assertEqual(["features_histograms.1.npy", "features_thumbnails.1.npy"], self.similar_files())
+        # a run only using blur scores does not read or write the similarity features
+        store = FeatureStore(False)
+        update_features(["b.JPG"], store, processes=1)
+        self.assertIsNone(store._similar)
+        store.save()
+        self.assertEqual(["features_histograms.1.npy", "features_thumbnails.1.npy"], self.similar_files())
+        store = FeatureStore(False)
+        self.assertEqual(3, len(store))
+        thumbnail = store.get_similar(keys[1])[0]
+        self.assertIsInstance(store._similar["thumbnails"], np.memmap)
+        self.assertEqual((66, 100), thumbnail.shape)
+        self.assertIsNone(store.get_similar(file_key("b.JPG")))
+
+    def test_prune(self):
+        store = FeatureStore(False)
+        keys = update_features(["a.JPG", "b.JPG", "c.JPG"], store, processes=1, similar=True)
+        store.save()
+        thumbnail = np.array(store.get_similar(keys[2])[0])
+        store = FeatureStore(False)
+        store.save([keys[2], None])
+        self.assertEqual(["features_histograms.2.npy", "features_thumbnails.2.npy"], self.similar_files())
+        store = FeatureStore(False)
+        self.assertEqual(1, len(store))
+        self.assertIsNone(store.get_blur(keys[0]))
+        np.testing.assert_array_equal(thumbnail, store.get_similar(keys[2])[0])
+
+    def test_detect_similar(self):
+        picture_module.detect_similar(previews=False, processes=1)
+        self.assertEqual(["a.JPG", "b.JPG"], sorted(os.listdir("000")))
+        self.assertTrue(os.path.isfile("c.JPG"))
+        self.assertEqual(3, len(FeatureStore(False)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import errno
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from EXIFnaming.helpers import fileop
+from EXIFnaming.helpers.fileop import SeriesClassifier, series_rule, media_rule, copyFilesTo, _link_file
+
+
+class SeriesClassifierTest(unittest.TestCase):
+    def test_classify(self):
+        classifier = SeriesClassifier([series_rule("S"), series_rule("SM"), media_rule([".MP4"], "mp4"),
+                                       media_rule(["HDR"], "HDR"), media_rule([".JPG"], "single")],
+                                      bracket_series=True)
+        filenames = ["ISL19_0001B1.JPG", "ISL19_0001B2.JPG", "notes.txt", "ISL19_0001B3.JPG", "ISL19_0002B1.JPG",
+                     "ISL19_0002B2.JPG", "ISL19_0003.JPG", "ISL19_0004B1.JPG", "ISL19_0005S1.JPG",
+                     "ISL19_0006SM2.JPG", "ISL19_M0007.MP4", "ISL19_0008_HDR.JPG", "ISL19_0009B1_HDR.JPG"]
+        self.assertEqual([("ISL19_0001B1.JPG", "B3"), ("ISL19_0001B2.JPG", "B3"), ("ISL19_0001B3.JPG", "B3"),
+                          ("ISL19_0002B1.JPG", "B2"), ("ISL19_0002B2.JPG", "B2"), ("ISL19_0003.JPG", "single"),
+                          ("ISL19_0004B1.JPG", "B1"), ("ISL19_0005S1.JPG", "S"), ("ISL19_0006SM2.JPG", "SM"),
+                          ("ISL19_M0007.MP4", "mp4"), ("ISL19_0008_HDR.JPG", "HDR"), ("ISL19_0009B1_HDR.JPG", "B1")],
+                         classifier.classify(filenames))
+
+
+class CopyFilesToTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmpdir.name, "a.JPG")
+        with open(self.src, "w") as file:
+            file.write("a")
+        self.dest_dir = os.path.join(self.tmpdir.name, "copies")
+        self.dest = os.path.join(self.dest_dir, "a.JPG")
+        _link_file.reflink_supported = {}
+
+    def tearDown(self):
+        _link_file.reflink_supported = {}
+        self.tmpdir.cleanup()
+
+    def copy(self, mode: str):
+        copyFilesTo([self.src], self.dest_dir, prompt=False, mode=mode)
+        with open(self.dest) as file:
+            self.assertEqual("a", file.read())
+
+    def test_copy(self):
+        self.copy("copy")
+        self.assertFalse(os.path.samefile(self.src, self.dest))
+
+    def test_hardlink(self):
+        self.copy("hardlink")
+        self.assertTrue(os.path.samefile(self.src, self.dest))
+        self.assertFalse(os.path.islink(self.dest))
+
+    def test_symlink(self):
+        self.copy("symlink")
+        self.assertEqual(os.path.join("..", "a.JPG"), os.readlink(self.dest))
+
+    def test_reflink(self):
+        with mock.patch.object(fileop, "_reflink", side_effect=OSError(errno.EOPNOTSUPP, "not supported")):
+            self.assertRaises(OSError, copyFilesTo, [self.src], self.dest_dir, False, "reflink")
+
+    def test_auto_reflink(self):
+        with mock.patch.object(fileop, "_reflink") as reflink:
+            self.assertTrue(_link_file(self.src, os.path.join(self.tmpdir.name, "b.JPG"), "auto"))
+        reflink.assert_called_once_with(self.src, os.path.join(self.tmpdir.name, "b.JPG"))
+        self.assertEqual([True], list(_link_file.reflink_supported.values()))
+
+    def test_auto_fallback(self):
+        def failing_reflink(src, dest):
+            with open(dest, "w"):
+                pass
+            raise OSError(errno.EOPNOTSUPP, "not supported")
+
+        with mock.patch.object(fileop, "_reflink", side_effect=failing_reflink) as reflink:
+            self.copy("auto")
+            # a real copy, never a link to the original
+            self.assertFalse(os.path.samefile(self.src, self.dest))
+            self.assertEqual(1, reflink.call_count)
+            # the failure is remembered for the pair of devices
+            self.copy("auto")
+            self.assertEqual(1, reflink.call_count)
+        self.assertEqual([False], list(_link_file.reflink_supported.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import datetime as dt
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from unittest import mock
+
+import numpy as np
+
+from EXIFnaming.helpers.date import find_dir_with_closest_time_new
+from EXIFnaming.helpers.gpx import iter_gpx_points, parse_gpx_times, interpolate_track, track_dtype, merge_tracks, \
+    simplify_track
+from EXIFnaming import readexif, setexif
+from EXIFnaming.helpers import program_dir, settings
+from EXIFnaming.helpers.catalog import Catalog, _catalog_filename
+from EXIFnaming.helpers.timetable import TimetableIndex, exif_to_datetime64, first_last_per_group, \
+    is_timetable_csv_current
+
+gpx_content = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>
+<trkpt lat="64.1" lon="-21.9"><ele>12.5</ele><time>2019-07-27T10:00:00Z</time></trkpt><trkpt lat="64.2" lon="-21.8">
+  <time>2019-07-27T10:00:05.500Z</time>
+</trkpt>
+</trkseg></trk>
+<wpt lat="64.3" lon="-21.7"><time>2019-07-27T12:00:00+02:00</time></wpt>
+</gpx>
+"""
+
+
+class GpxTest(unittest.TestCase):
+    def test_iter_gpx_points(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "track.gpx")
+            with open(filename, "w") as file:
+                file.write(gpx_content)
+            points = list(iter_gpx_points(filename))
+        self.assertEqual([("trkpt", "64.1", "-21.9", "12.5", "2019-07-27T10:00:00Z"),
+                          ("trkpt", "64.2", "-21.8", "", "2019-07-27T10:00:05.500Z"),
+                          ("wpt", "64.3", "-21.7", "", "2019-07-27T12:00:00+02:00")], points)
+
+    def test_parse_gpx_times(self):
+        times = parse_gpx_times(["2019-07-27T10:00:00Z", "2019-07-27T10:00:05.500Z", "2019-07-27T12:00:00+02:00"])
+        expected = np.array(["2019-07-27T10:00:00", "2019-07-27T10:00:05", "2019-07-27T10:00:00"],
+                            dtype="datetime64[s]")
+        np.testing.assert_array_equal(expected, times)
+
+    def test_interpolate_track(self):
+        track = np.zeros(3, dtype=track_dtype)
+        track["time"] = np.array(["2019-07-27T10:00:00", "2019-07-27T10:00:10", "2019-07-27T11:00:10"],
+                                 dtype="datetime64[s]")
+        track["lat"] = [0, 10, 20]
+        track["lon"] = [0, 1, 2]
+        times = np.array(["2019-07-27T09:59:00", "2019-07-27T10:00:05", "2019-07-27T10:30:00",
+                          "2019-07-27T11:00:10", "NaT"], dtype="datetime64[s]")
+        positions, valid = interpolate_track(track, times, 1800)
+        self.assertEqual([True, True, False, True, False], list(valid))
+        self.assertEqual([0, 5, 20], list(positions["lat"][valid]))
+
+    def test_merge_tracks(self):
+        track1 = np.zeros(4, dtype=track_dtype)
+        track1["time"] = np.array(["2019-07-27T10:00:00", "2019-07-27T10:00:10", "2019-07-27T10:00:05",
+                                   "2019-07-27T10:00:20"], dtype="datetime64[s]")
+        track2 = np.zeros(2, dtype=track_dtype)
+        track2["time"] = np.array(["2019-07-27T10:00:10", "2019-07-27T10:00:15"], dtype="datetime64[s]")
+        track = merge_tracks([track1, track2])
+        expected = np.array(["2019-07-27T10:00:00", "2019-07-27T10:00:10", "2019-07-27T10:00:15",
+                             "2019-07-27T10:00:20"], dtype="datetime64[s]")
+        np.testing.assert_array_equal(expected, track["time"])
+
+    def test_simplify_track(self):
+        track = np.zeros(3600, dtype=track_dtype)
+        track["time"] = np.datetime64("2019-07-27T10:00:00") + np.arange(3600).astype("timedelta64[s]")
+        track["lat"] = 64 + np.arange(3600) * 1e-5
+        track["lat"][1800:] = track["lat"][1800]
+        simplified = simplify_track(track, 1., 1000)
+        self.assertLess(len(simplified), 10)
+        self.assertTrue(np.all(np.diff(simplified["time"]).astype(int) <= 1000))
+        positions, valid = interpolate_track(simplified, track["time"])
+        self.assertTrue(valid.all())
+        self.assertLess(np.abs(positions["lat"] - track["lat"]).max() * 111000, 1.)
+
+    def test_geotag_native(self):
+        track = np.zeros(2, dtype=track_dtype)
+        track["time"] = np.array(["2019-07-27T10:00:00", "2019-07-27T10:00:10"], dtype="datetime64[s]")
+        track["lat"] = [64, 65]
+        track["lon"] = [-22, -21]
+        track["ele"] = np.nan
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            program_dir.create_program_dir.dir = None
+            try:
+                entries = self.geotag_native(track)
+            finally:
+                os.chdir(cwd)
+                program_dir.create_program_dir.dir = None
+        self.assertEqual([os.path.join(tmpdir, "a", "x")], [path for path, tagDict in entries])
+        self.assertEqual("64.500000", entries[0][1]["GPSLatitude"])
+        self.assertEqual("10:00:05", entries[0][1]["GPSTimeStamp"])
+
+    @staticmethod
+    def geotag_native(track: np.ndarray) -> list:
+        inpath = os.getcwd()
+        tagdict = OrderedDict([("Directory", [os.path.join(inpath, "a")] * 3), ("File Name", ["x", "y", "z"]),
+                               ("Date/Time Original", ["2019:07:27 12:00:05", "0000:00:00 00:00:00", ""])])
+        with mock.patch.object(setexif, "read_gps_dir_track", return_value=track), \
+                mock.patch.object(setexif, "read_exiftags", return_value=tagdict), \
+                mock.patch.object(setexif, "write_exiftag_batch") as write_exiftag_batch:
+            # invalid dates are skipped instead of aborting the run
+            setexif.geotag_native(timezone=2)
+        return write_exiftag_batch.call_args[0][0]
+
+
+class TimetableIndexTest(unittest.TestCase):
+    def test_same_as_linear_search(self):
+        dirDict = OrderedDict()
+        dirDict["190727_01"] = (dt.datetime(2019, 7, 27, 9, 0), dt.datetime(2019, 7, 27, 11, 0))
+        dirDict["190727_02"] = (dt.datetime(2019, 7, 27, 14, 0), dt.datetime(2019, 7, 27, 15, 30))
+        dirDict["190729_01"] = (dt.datetime(2019, 7, 29, 8, 0), dt.datetime(2019, 7, 29, 18, 0))
+        timetableIndex = TimetableIndex(dirDict, 3600)
+        start = dt.datetime(2019, 7, 26, 20, 0)
+        times = [start + dt.timedelta(minutes=17 * i) for i in range(300)]
+        expected = [find_dir_with_closest_time_new(dirDict, time, 3600) for time in times]
+        self.assertEqual(expected, list(timetableIndex.classify(np.array(times, dtype="datetime64[s]"))))
+
+    def test_first_last_per_group(self):
+        times = exif_to_datetime64(["2019:07:27 11:00:00", "2019:07:27 09:00:00", "", "2019:07:29 08:00:00.50"])
+        self.assertTrue(np.isnat(times[2]))
+        first_last = first_last_per_group(np.array(["a", "a", "b", "c"]), times)
+        self.assertEqual(["a", "c"], list(first_last.keys()))
+        self.assertEqual((np.datetime64("2019-07-27T09:00:00"), np.datetime64("2019-07-27T11:00:00")), first_last["a"])
+
+    def test_print_timetable(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            program_dir.create_program_dir.dir = None
+            try:
+                inpath = os.getcwd()
+                tagdict = OrderedDict([("Directory", []), ("File Name", []), ("Date/Time Original", [])])
+                stamps = []
+                for dirname, filename, date in [("190727_01", "a.JPG", "2019:07:27 11:00:00"),
+                                                ("190727_01", "b.JPG", "2019:07:27 09:00:00"),
+                                                ("190729_01", "c.JPG", "2019:07:29 08:00:00")]:
+                    os.makedirs(dirname, exist_ok=True)
+                    with open(os.path.join(dirname, filename), "w") as file:
+                        file.write(filename)
+                    stat = os.stat(os.path.join(dirname, filename))
+                    stamps.append((stat.st_size, stat.st_mtime_ns))
+                    tagdict["Directory"].append(os.path.join(inpath, dirname))
+                    tagdict["File Name"].append(filename)
+                    tagdict["Date/Time Original"].append(date)
+                file_types = sorted(set([filetype.lower() for filetype in settings.image_types]))
+                Catalog.from_tagdict(tagdict, np.array(stamps, dtype=np.int64),
+                                     _catalog_filename(inpath, file_types)).save()
+                readexif.print_timetable()
+                timetableIndex = TimetableIndex.load(program_dir.get_info_dir("timetable.csv"))
+                self.assertEqual(["190727_01", "190729_01"], timetableIndex.names.tolist())
+                self.assertEqual(np.datetime64("2019-07-27T09:00:00"), timetableIndex.starts[0])
+                timefile = program_dir.get_info_dir("timetable.txt")
+                csvfile = program_dir.get_info_dir("timetable.csv")
+                with open(timefile) as file:
+                    self.assertEqual("190727_01" + " " * 46 + "; 190727 09:00; 190727 11:00", file.readline().rstrip())
+                self.assertTrue(is_timetable_csv_current(csvfile, timefile))
+                # a second run overwrites both files
+                readexif.print_timetable()
+                with open(timefile) as file:
+                    self.assertEqual(2, len(file.readlines()))
+                self.assertEqual(2, len(TimetableIndex.load(csvfile)))
+                # an edited txt takes precedence over the csv
+                with open(timefile, "a") as file:
+                    file.write("190730_01" + " " * 46 + "; 190730 09:00; 190730 11:00\n")
+                self.assertFalse(is_timetable_csv_current(csvfile, timefile))
+            finally:
+                os.chdir(cwd)
+                program_dir.create_program_dir.dir = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+from EXIFnaming import nameop
+from EXIFnaming.helpers import program_dir
+from EXIFnaming.helpers.journal import MoveJournal
+from EXIFnaming.helpers.moveplan import MovePlan, execute_plan
+
+
+class MoveJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        program_dir.create_program_dir.dir = None
+        self.journal = MoveJournal()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        program_dir.create_program_dir.dir = None
+        self.tmpdir.cleanup()
+
+    def test_append(self):
+        moves1 = [("/a/x.JPG", "/a/y.JPG"), ("/a/ä.JPG", "/a/S/ä.JPG")]
+        moves2 = [("/b/z.JPG", "/a/z.JPG")]
+        self.assertEqual(0, self.journal.append("rename", moves1))
+        self.assertEqual(1, self.journal.append("order", moves2))
+        self.assertEqual(moves1, self.journal.moves(0))
+        self.assertEqual(moves2, self.journal.moves(-1))
+        self.assertEqual([moves1[1]], self.journal.moves(0, "/a/S"))
+        self.assertEqual(0, self.journal.last_run("rename"))
+        self.assertEqual(-1, self.journal.last_run("sanitize_filename"))
+
+    def test_interrupted_append(self):
+        self.journal.append("rename", [("/a/x.JPG", "/a/y.JPG")])
+        # data of an append that did not write its run
+        for name in ["strings.bin", "string_ends.bin", "records.bin"]:
+            with open(os.path.join(self.journal.dirname, name), "ab") as file:
+                file.write(b"\x01" * 5)
+        with open(os.path.join(self.journal.dirname, "runs.jsonl"), "ab") as file:
+            file.write(b'{"name": "ren')
+        self.assertEqual(1, len(self.journal.runs()))
+        self.journal.append("order", [("/b/z.JPG", "/a/z.JPG")])
+        self.assertEqual(2, len(self.journal.runs()))
+        self.assertEqual([("/b/z.JPG", "/a/z.JPG")], self.journal.moves(1))
+        self.assertEqual([("/a/x.JPG", "/a/y.JPG")], self.journal.moves(0))
+
+    def test_undo(self):
+        for name in ["a", "b", "c"]:
+            with open(name, "w") as file:
+                file.write(name)
+        plan = MovePlan("rename")
+        for src, dst in [("a", "b"), ("b", "a"), ("c", os.path.join("S", "c"))]:
+            plan.add(os.path.abspath(src), os.path.abspath(dst))
+        execute_plan(plan)
+        self.assertEqual([(os.path.abspath("a"), os.path.abspath("b")), (os.path.abspath("b"), os.path.abspath("a")),
+                          (os.path.abspath("c"), os.path.abspath(os.path.join("S", "c")))],
+                         sorted(self.journal.moves()))
+        nameop.undo_moves(directory=os.path.abspath("S"))
+        self.assertTrue(os.path.isfile("c"))
+        with open("a") as file:
+            self.assertEqual("b", file.read())
+        nameop.rename_back()
+        with open("a") as file:
+            self.assertEqual("a", file.read())
+        self.assertEqual(["rename", "undo rename", "undo rename"], [run["name"] for run in self.journal.runs()])
+
+    def test_undo_relative_directory(self):
+        os.makedirs("S")
+        with open(os.path.join("S", "a"), "w") as file:
+            file.write("a")
+        plan = MovePlan("order")
+        plan.add(os.path.abspath(os.path.join("S", "a")), os.path.abspath(os.path.join("S", "T", "a")))
+        execute_plan(plan)
+        self.assertEqual([], self.journal.moves(directory="T"))
+        self.assertEqual(1, len(self.journal.moves(directory=os.path.join("S", "T"))))
+        os.chdir("S")
+        nameop.undo_moves(directory="T")
+        self.assertTrue(os.path.isfile("a"))
+
+    def test_rename_back_by_type(self):
+        for name in ["x.JPG", "m.MP4"]:
+            with open(name, "w") as file:
+                file.write(name)
+        for run_name, src, dst in [("rename", "x.JPG", "y.JPG"), ("rename_video", "m.MP4", "n.MP4")]:
+            plan = MovePlan(run_name)
+            plan.add(os.path.abspath(src), os.path.abspath(dst))
+            execute_plan(plan)
+        # the video rename is the last one, but only image renames are undone by default
+        nameop.rename_back()
+        self.assertEqual(["n.MP4", "x.JPG"], sorted(name for name in os.listdir(".") if os.path.isfile(name)))
+        nameop.rename_back(fileext=".MP4")
+        self.assertEqual(["m.MP4", "x.JPG"], sorted(name for name in os.listdir(".") if os.path.isfile(name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from EXIFnaming.helpers import program_dir, moveplan
+from EXIFnaming.helpers.moveplan import MovePlan, execute_plan, resume_plan, checkpoint_filename
+
+
+class MovePlanTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        program_dir.create_program_dir.dir = None
+        for name in ["a", "b", "c", "d"]:
+            with open(name, "w") as file:
+                file.write(name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        program_dir.create_program_dir.dir = None
+        self.tmpdir.cleanup()
+
+    def contents(self):
+        out = {}
+        for name in sorted(os.listdir(".")):
+            if os.path.isfile(name):
+                with open(name) as file:
+                    out[name] = file.read()
+        return out
+
+    def plan(self):
+        # cycle a -> b -> c -> a and chain d -> e
+        plan = MovePlan()
+        for src, dst in [("a", "b"), ("b", "c"), ("c", "a"), ("d", "e")]:
+            plan.add(os.path.abspath(src), os.path.abspath(dst))
+        return plan
+
+    def test_steps(self):
+        steps = self.plan().steps()
+        self.assertEqual(5, len(steps))
+        self.assertEqual([0, 0, 1, 2, 3], [level for src, dst, level in steps])
+
+    def test_execute(self):
+        execute_plan(self.plan(), workers=2)
+        self.assertEqual({"a": "c", "b": "a", "c": "b", "e": "d"}, self.contents())
+        self.assertFalse(os.path.isfile(checkpoint_filename()))
+
+    def test_resume(self):
+        rename = os.rename
+        calls = []
+
+        def failing_rename(src, dst):
+            if len(calls) == 2: raise OSError("interrupted")
+            calls.append(src)
+            rename(src, dst)
+
+        with mock.patch("os.rename", failing_rename):
+            self.assertRaises(OSError, execute_plan, self.plan())
+        self.assertTrue(os.path.isfile(checkpoint_filename()))
+        self.assertTrue(resume_plan())
+        self.assertEqual({"a": "c", "b": "a", "c": "b", "e": "d"}, self.contents())
+        self.assertFalse(resume_plan())
+
+    def test_revert(self):
+        rename = os.rename
+        calls = []
+
+        def failing_rename(src, dst):
+            if len(calls) == 3: raise OSError("interrupted")
+            calls.append(src)
+            rename(src, dst)
+
+        with mock.patch("os.rename", failing_rename):
+            self.assertRaises(OSError, execute_plan, self.plan())
+        self.assertTrue(resume_plan(revert=True))
+        self.assertEqual({"a": "a", "b": "b", "c": "c", "d": "d"}, self.contents())
+        self.assertFalse(os.path.isfile(checkpoint_filename()))
+
+    def test_temporary_name_only_for_cycles(self):
+        rename = os.rename
+        calls = []
+
+        def counting_rename(src, dst):
+            calls.append(dst)
+            rename(src, dst)
+
+        with mock.patch("os.rename", counting_rename):
+            execute_plan(self.plan())
+        self.assertEqual(5, len(calls))
+        self.assertEqual(1, len([dst for dst in calls if dst.endswith(MovePlan.temp_postfix + "0")]))
+
+    def test_case_only_rename(self):
+        # on a case insensitive volume the destination is the source itself
+        with mock.patch.object(moveplan, "_is_case_insensitive", return_value=True):
+            plan = MovePlan()
+            plan.add(os.path.abspath("a"), os.path.abspath("A"))
+            steps = plan.steps()
+            self.assertEqual(2, len(steps))
+            self.assertTrue(steps[0][1].endswith(MovePlan.temp_postfix + "0"))
+            execute_plan(plan)
+        self.assertEqual({"A": "a", "b": "b", "c": "c", "d": "d"}, self.contents())
+
+    def test_case_only_swap(self):
+        with mock.patch.object(moveplan, "_is_case_insensitive", return_value=True):
+            plan = MovePlan()
+            plan.add(os.path.abspath("a"), os.path.abspath("B"))
+            plan.add(os.path.abspath("b"), os.path.abspath("A"))
+            self.assertEqual(3, len(plan.steps()))
+            execute_plan(plan)
+        self.assertEqual({"A": "b", "B": "a", "c": "c", "d": "d"}, self.contents())
+
+
+if __name__ == '__main__':
+    unittest.main()
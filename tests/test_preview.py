@@ -0,0 +1,65 @@
+import os
+import struct
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from EXIFnaming.helpers.cv2op import read_picture
+from EXIFnaming.helpers.preview import PreviewReader, jpeg_size, read_preview
+
+
+def encode_jpeg(width: int, height: int) -> bytes:
+    picture = np.random.RandomState(0).randint(0, 256, (height, width)).astype(np.uint8)
+    return cv2.imencode(".jpg", picture)[1].tobytes()
+
+
+class PreviewTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.preview = encode_jpeg(1800, 1200)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def filename(self, name: str) -> str:
+        return os.path.join(self.tmpdir.name, name)
+
+    def write_jpeg_with_mpf(self, name: str):
+        main = encode_jpeg(300, 200)
+        tiff_start = 2 + 4 + 4
+        payload_length = 4 + 8 + 2 + 12 + 4 + 32
+        preview_offset = 2 + 4 + payload_length + len(main) - 2 - tiff_start
+        payload = b"MPF\x00" + b"II*\x00" + struct.pack("<I", 8) + struct.pack("<H", 1)
+        payload += struct.pack("<HHII", 0xB002, 7, 32, 26) + struct.pack("<I", 0)
+        payload += struct.pack("<IIIHH", 0x20030000, len(main), 0, 0, 0)
+        payload += struct.pack("<IIIHH", 0x00020002, len(self.preview), preview_offset, 0, 0)
+        with open(self.filename(name), "wb") as file:
+            file.write(b"\xff\xd8" + b"\xff\xe2" + struct.pack(">H", len(payload) + 2) + payload)
+            file.write(main[2:] + self.preview)
+
+    def write_rw2(self, name: str):
+        with open(self.filename(name), "wb") as file:
+            file.write(b"IIU\x00" + struct.pack("<I", 8) + struct.pack("<H", 1))
+            file.write(struct.pack("<HHII", 0x002e, 7, len(self.preview), 26) + struct.pack("<I", 0))
+            file.write(self.preview)
+
+    def test_jpeg(self):
+        self.write_jpeg_with_mpf("a.JPG")
+        self.assertEqual((True, self.preview), read_preview(self.filename("a.JPG"), 1600))
+        self.assertEqual((True, None), read_preview(self.filename("a.JPG"), 2000))
+        picture = read_picture(self.tmpdir.name, "a.JPG", previews=PreviewReader(1600))
+        self.assertEqual((333, 500), picture.shape)
+
+    def test_rw2(self):
+        self.write_rw2("a.RW2")
+        previewReader = PreviewReader(1600)
+        previewReader.prefetch([self.filename("a.RW2")])
+        self.assertEqual((1800, 1200), jpeg_size(previewReader.read(self.filename("a.RW2"))))
+        self.assertIsNone(read_picture(self.tmpdir.name, "a.RW2"))
+        self.assertIsNotNone(read_picture(self.tmpdir.name, "a.RW2", previews=previewReader))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from EXIFnaming.helpers.catalog import Catalog
+from EXIFnaming.helpers.query import Eq, In, Prefix, Range
+
+
+class QueryTest(unittest.TestCase):
+    def setUp(self):
+        tagdict = OrderedDict()
+        tagdict["Directory"] = ["a", "a", "b", "b", "b"]
+        tagdict["File Name"] = ["ISL1.JPG", "ISL2.JPG", "MS1.JPG", "MS2.JPG", "ISL3.JPG"]
+        tagdict["F Number"] = ["3.3", "2.8", "", "6.4", "2.8"]
+        tagdict["Exposure Time"] = ["1/250", "1/30", "1", "1/8", "1/1000"]
+        self.catalog = Catalog.from_tagdict(tagdict, np.zeros((5, 2), dtype=np.int64))
+
+    def query(self, predicate):
+        return list(self.catalog.query(predicate))
+
+    def test_equal(self):
+        self.assertEqual([1, 4], self.query(Eq("F Number", "2.8")))
+        self.assertEqual([], self.query(Eq("F Number", "4.0")))
+        self.assertEqual([], self.query(Eq("Unknown", "4.0")))
+
+    def test_prefix_and_set(self):
+        self.assertEqual([0, 1, 4], self.query(Prefix("File Name", "ISL")))
+        self.assertEqual([2, 3, 4], self.query(In("Directory", ["b", "c"])))
+
+    def test_range(self):
+        self.assertEqual([0, 1, 4], self.query(Range("F Number", 2.8, 3.3)))
+        self.assertEqual([0], self.query(Range("F Number", 2.8, 6.4, inclusive=False)))
+        self.assertEqual([0, 4], self.query(Range("Exposure Time", max_value=0.01)))
+
+    def test_combination(self):
+        self.assertEqual([4], self.query(Eq("Directory", "b") & Prefix("File Name", "ISL")))
+        self.assertEqual([0, 1, 3, 4], self.query(Eq("F Number", "6.4") | Prefix("File Name", "ISL")))
+        self.assertEqual(["b/MS2.JPG"], self.catalog.paths(self.catalog.query(Range("F Number", 5))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from EXIFnaming.helpers.report import ReportWriter
+
+
+class ReportWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.rows = [("a.JPG", "1/250", ""), ("b.JPG", "tab\there", "ä")]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def filename(self, name: str) -> str:
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_text(self):
+        with ReportWriter(self.filename("tags.txt"), ["File Name", "Exposure", "Label"], [10, 5, 5]) as writer:
+            writer.write_rows(self.rows)
+        with ReportWriter(self.filename("tags.txt"), ["old", "new"], row_format="%-6s\t %s\n", header=False,
+                          append=True) as writer:
+            writer.write_row(["a", "b"])
+        # text reports are written in the encoding of the platform
+        with open(self.filename("tags.txt")) as file:
+            self.assertEqual(["File Name \tExposure\tLabel\t", "a.JPG     \t1/250\t     \t",
+                              "b.JPG     \ttab\there\tä    \t", "a     \t b"], file.read().splitlines())
+
+    def test_tsv_gzip(self):
+        with ReportWriter(self.filename("tags.tsv.gz"), ["File Name", "Exposure", "Label"]) as writer:
+            writer.write_rows(self.rows)
+            self.assertEqual(2, writer.rows)
+        with gzip.open(self.filename("tags.tsv.gz"), "rt", encoding="utf-8") as file:
+            self.assertEqual("File Name\tExposure\tLabel\na.JPG\t1/250\t\nb.JPG\ttab\\\there\tä\n", file.read())
+
+    def test_csv(self):
+        with ReportWriter(self.filename("tags.csv"), ["File Name", "Exposure", "Label"]) as writer:
+            writer.write_rows(self.rows)
+        with open(self.filename("tags.csv"), encoding="utf-8", newline="") as file:
+            self.assertEqual("File Name;Exposure;Label\r\na.JPG;1/250;\r\nb.JPG;tab\there;ä\r\n", file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
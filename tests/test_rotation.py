@@ -0,0 +1,154 @@
+import os
+import tempfile
+import subprocess
+import unittest
+from collections import OrderedDict
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from EXIFnaming import readexif
+from EXIFnaming.helpers import program_dir, settings
+from EXIFnaming.helpers.catalog import Catalog, read_catalog, _catalog_filename
+from EXIFnaming.helpers import rotation
+from EXIFnaming.helpers.rotation import load_rotated, is_rotated, file_stamp, rotate_picture, set_orientations
+
+
+class RotateTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        program_dir.create_program_dir.dir = None
+        self.inpath = os.getcwd()
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        names = ["a.JPG", "b.JPG", "c.JPG"]
+        for name in names:
+            Image.new("RGB", (40, 60), "red").save(name, "JPEG", exif=exif)
+        # a is upward and rotated, b is not rotated, c has a normal resolution ratio already
+        tagdict = OrderedDict([("Directory", [self.inpath] * 3), ("File Name", names),
+                               ("Orientation", ["Rotate 90 CW", "Horizontal (normal)", "Rotate 270 CW"]),
+                               ("Image Width", ["40", "40", "60"]), ("Image Height", ["60", "60", "40"]),
+                               ("Image Size", ["40x60", "40x60", "60x40"])])
+        stamps = np.array([file_stamp(name) for name in names], dtype=np.int64)
+        file_types = sorted(set([filetype.lower() for filetype in settings.image_types]))
+        Catalog.from_tagdict(tagdict, stamps, _catalog_filename(self.inpath, file_types)).save()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        program_dir.create_program_dir.dir = None
+        self.tmpdir.cleanup()
+
+    def test_rotate(self):
+        readexif.rotate(ask=False, processes=1)
+        sizes = [Image.open(name).size for name in ["a.JPG", "b.JPG", "c.JPG"]]
+        self.assertEqual([(60, 40), (40, 60), (40, 60)], sizes)
+        catalog = read_catalog(self.inpath, ask=False)
+        self.assertEqual(["60", "40", "60"], catalog.column("Image Width").tolist())
+        self.assertEqual(["60x40", "40x60", "60x40"], catalog.column("Image Size").tolist())
+        self.assertTrue(is_rotated(os.path.join(self.inpath, "a.JPG"), load_rotated()))
+        # the patched catalog matches the rotated files, so exiftool is not needed for a second call
+        readexif.rotate(ask=False, processes=1)
+        self.assertEqual((60, 40), Image.open("a.JPG").size)
+
+    def test_missing_size_tags(self):
+        os.remove("b.JPG")
+        os.remove("c.JPG")
+        tagdict = OrderedDict([("Directory", [self.inpath]), ("File Name", ["a.JPG"]),
+                               ("Orientation", ["Rotate 90 CW"])])
+        file_types = sorted(set([filetype.lower() for filetype in settings.image_types]))
+        Catalog.from_tagdict(tagdict, np.array([file_stamp("a.JPG")], dtype=np.int64),
+                             _catalog_filename(self.inpath, file_types)).save()
+        readexif.rotate(ask=False, processes=1)
+        self.assertEqual((40, 60), Image.open("a.JPG").size)
+
+    def test_rotate_copy(self):
+        readexif.rotate(ask=False, processes=1, override=False)
+        self.assertEqual((60, 40), Image.open("a_ROTATED.JPG").size)
+        self.assertEqual((40, 60), Image.open("a.JPG").size)
+        # only the rotated copy is recorded, so the original can still be rotated
+        self.assertFalse(is_rotated(os.path.join(self.inpath, "a.JPG"), load_rotated()))
+        self.assertTrue(is_rotated(os.path.join(self.inpath, "a_ROTATED.JPG"), load_rotated()))
+        os.remove("a_ROTATED.JPG")
+        readexif.rotate(ask=False, processes=1)
+        self.assertEqual((60, 40), Image.open("a.JPG").size)
+
+    def test_rotate_picture(self):
+        Image.new("RGB", (40, 60), "red").save("d.tif")
+        with open("e.RW2", "wb") as file:
+            file.write(b"no picture")
+        self.assertEqual("pixels", rotate_picture(("d.tif", "d.tif", 90))[1])
+        self.assertEqual((60, 40), Image.open("d.tif").size)
+        self.assertEqual("", rotate_picture(("e.RW2", "e.RW2", 90))[1])
+
+    def test_rotate_jpegtran(self):
+        calls = []
+
+        def run(args, **kwargs):
+            calls.append(args)
+            with open(args[args.index("-outfile") + 1], "wb") as file:
+                file.write(b"rotated")
+            return subprocess.CompletedProcess(args, 0)
+
+        with mock.patch.object(rotation.shutil, "which", return_value="/usr/bin/jpegtran"), \
+                mock.patch.object(rotation.subprocess, "run", side_effect=run):
+            self.assertEqual("lossless", rotate_picture(("a.JPG", "a_ROTATED.JPG", 90))[1])
+        self.assertEqual([["/usr/bin/jpegtran", "-copy", "all", "-perfect", "-rotate", "270", "-outfile",
+                           "a_ROTATED.JPG~", "a.JPG"]], calls)
+        with open("a_ROTATED.JPG", "rb") as file:
+            self.assertEqual(b"rotated", file.read())
+        self.assertFalse(os.path.exists("a_ROTATED.JPG~"))
+
+    def test_rotate_jpegtran_fallback(self):
+        def run(args, **kwargs):
+            # -perfect fails for sizes that are no multiple of the block size
+            with open(args[args.index("-outfile") + 1], "wb") as file:
+                file.write(b"partial")
+            return subprocess.CompletedProcess(args, 1)
+
+        with mock.patch.object(rotation.shutil, "which", return_value="/usr/bin/jpegtran"), \
+                mock.patch.object(rotation.subprocess, "run", side_effect=run):
+            self.assertEqual("pixels", rotate_picture(("a.JPG", "a.JPG", -90))[1])
+        self.assertEqual((60, 40), Image.open("a.JPG").size)
+        self.assertFalse(os.path.exists("a.JPG~"))
+
+    def test_set_orientations(self):
+        out = "    1 image files updated\n    0 image files updated\n    1 files weren't updated due to errors\n"
+        with mock.patch.object(rotation, "call_exiftool_batch", return_value=(out, "Error")) as call_exiftool_batch:
+            self.assertEqual(["a.JPG"], set_orientations(["a.JPG", "b.JPG"], 3))
+        call_exiftool_batch.assert_called_once_with([["-Orientation#=3", "a.JPG"], ["-Orientation#=3", "b.JPG"]],
+                                                    True)
+        with mock.patch.object(rotation, "call_exiftool_batch", return_value=("", "exiftool not found")):
+            self.assertEqual([], set_orientations(["a.JPG"], 1))
+
+    def rotate_orientation(self, out: str, override: bool):
+        with mock.patch.object(rotation, "call_exiftool_batch", return_value=(out, "")) as call_exiftool_batch:
+            readexif.rotate(ask=False, override=override, mode="orientation")
+        target = "a.JPG" if override else "a_ROTATED.JPG"
+        call_exiftool_batch.assert_called_once_with([["-Orientation#=1", os.path.join(self.inpath, target)]], True)
+
+    def test_rotate_orientation(self):
+        self.rotate_orientation("    1 image files updated\n", True)
+        # the pixels are not touched
+        self.assertEqual((40, 60), Image.open("a.JPG").size)
+        self.assertTrue(is_rotated(os.path.join(self.inpath, "a.JPG"), load_rotated()))
+        catalog = read_catalog(self.inpath, ask=False)
+        self.assertEqual(["Horizontal (normal)", "Horizontal (normal)", "Rotate 270 CW"],
+                         catalog.column("Orientation").tolist())
+
+    def test_rotate_orientation_failed(self):
+        self.rotate_orientation("    0 image files updated\n    1 files weren't updated due to errors\n", True)
+        self.assertEqual({}, load_rotated())
+        catalog = read_catalog(self.inpath, ask=False)
+        self.assertEqual("Rotate 90 CW", catalog.column("Orientation")[0])
+
+    def test_rotate_orientation_copy_failed(self):
+        self.rotate_orientation("", False)
+        self.assertFalse(os.path.exists("a_ROTATED.JPG"))
+        self.assertEqual({}, load_rotated())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from EXIFnaming import setexif
+from EXIFnaming.helpers import program_dir
+
+
+class CopyExifViaMainnameTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        program_dir.create_program_dir.dir = None
+        self.inpath = os.getcwd()
+        for path in [("origin", "ISL19_0001.JPG"), ("origin", "ISL19_0002.JPG"), ("origin", "ISL19_0003.JPG"),
+                     ("target", "ISL19_0001_HDR.JPG"), ("target", "ISL19_0001_PANO.JPG"),
+                     ("target", "ISL19_0002_HDR.JPG"), ("target", "ISL19_0003.JPG")]:
+            os.makedirs(path[0], exist_ok=True)
+            with open(os.path.join(*path), "w") as file:
+                file.write(path[1])
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        program_dir.create_program_dir.dir = None
+        self.tmpdir.cleanup()
+
+    def path(self, dirname: str, filename: str) -> str:
+        return os.path.join(self.inpath, dirname, filename)
+
+    def copy_exif(self, overwriteDateTime: bool) -> list:
+        dates = {os.path.normpath(self.path("target", "ISL19_0002_HDR.JPG")): ["2019:07:27 10:00:00"]}
+        with mock.patch.object(setexif, "read_exiftag_table", return_value=dates) as read_exiftag_table, \
+                mock.patch.object(setexif, "call_exiftool_batch") as call_exiftool_batch:
+            setexif.copy_exif_via_mainname("origin", "target", overwriteDateTime)
+        self.assertEqual(not overwriteDateTime, read_exiftag_table.called)
+        blocks, override = call_exiftool_batch.call_args[0]
+        self.assertTrue(override)
+        self.assertTrue(all(block[:4] == ["--PreviewImage", "--ThumbnailImage", "--Rating", "-TagsFromFile"]
+                            for block in blocks))
+        return sorted((block[4], block[5]) for block in blocks)
+
+    def test_copy_exif(self):
+        # files with a date and files of the same name as the origin are skipped
+        self.assertEqual([(self.path("origin", "ISL19_0001.JPG"), self.path("target", "ISL19_0001_HDR.JPG")),
+                          (self.path("origin", "ISL19_0001.JPG"), self.path("target", "ISL19_0001_PANO.JPG"))],
+                         self.copy_exif(False))
+
+    def test_overwrite_date(self):
+        self.assertEqual([(self.path("origin", "ISL19_0001.JPG"), self.path("target", "ISL19_0001_HDR.JPG")),
+                          (self.path("origin", "ISL19_0001.JPG"), self.path("target", "ISL19_0001_PANO.JPG")),
+                          (self.path("origin", "ISL19_0002.JPG"), self.path("target", "ISL19_0002_HDR.JPG"))],
+                         self.copy_exif(True))
+
+
+if __name__ == '__main__':
+    unittest.main()
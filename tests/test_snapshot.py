@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from EXIFnaming.helpers.fileop import load_tagdict
+from EXIFnaming.helpers.snapshot import Snapshot, SnapshotWriter, write_snapshot, convert_npz_snapshot
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        names = ["ISL19_%04d.JPG" % i for i in range(1000)]
+        self.tagdict = OrderedDict([("Directory", ["/fotos/ä"] * 500 + ["/fotos/b"] * 500), ("File Name", names),
+                                    ("Rating", [str(i % 6) for i in range(1000)]), ("Label", [""] * 1000)])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def filename(self, name: str) -> str:
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_round_trip(self):
+        write_snapshot(self.filename("Tags.tags"), self.tagdict)
+        with Snapshot(self.filename("Tags.tags")) as snapshot:
+            self.assertEqual(1000, len(snapshot))
+            self.assertEqual(list(self.tagdict.keys()), snapshot.names())
+            self.assertEqual(self.tagdict, snapshot.to_tagdict())
+            self.assertEqual(["0", "1", "2", "3", "4", "5"], snapshot.dictionary("Rating").tolist())
+
+    def test_row_range(self):
+        with SnapshotWriter(self.filename("Tags.tags"), 1000, block_rows=64) as writer:
+            for name, values in self.tagdict.items():
+                writer.add_column(name, values)
+        with Snapshot(self.filename("Tags.tags")) as snapshot:
+            self.assertEqual(self.tagdict["File Name"][100:700], snapshot.column("File Name", 100, 700).tolist())
+            self.assertEqual(self.tagdict["Directory"][990:], snapshot.column("Directory", 990, 2000).tolist())
+            self.assertEqual([], snapshot.column("Directory", 1000).tolist())
+
+    def test_convert_npz(self):
+        np.savez_compressed(self.filename("Tags_0101120000"), Tagdict=OrderedDict(self.tagdict))
+        filename = convert_npz_snapshot(self.filename("Tags_0101120000.npz"))
+        self.assertEqual(self.filename("Tags_0101120000.tags"), filename)
+        self.assertEqual(self.tagdict, load_tagdict(filename))
+        self.assertEqual(load_tagdict(self.filename("Tags_0101120000.npz"), ["File Name"]),
+                         load_tagdict(filename, ["File Name"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 
-from EXIFnaming.helpers.tag_conversion import process_to_tag, FilenameAccessor
+import numpy as np
+
+from EXIFnaming.helpers.tag_conversion import process_to_tag, FilenameAccessor, parse_filenames, counter_runs, \
+    distinct_tags
 
 
 class TagConversionTest(unittest.TestCase):
@@ -30,5 +33,45 @@ class FilenameAccessorTest(unittest.TestCase):
         filenameAccessor = FilenameAccessor("ISL190727_250_HDR-Ls-Nb_Dettifoss_Selfoss_RET_PANO.jpg")
         self.assertEqual("ISL190727_250_HDR-Ls-Nb_RET_PANO_Dettifoss_Selfoss.jpg", filenameAccessor.sorted_filename())
 
+    def test_split(self):
+        filenameAccessor = FilenameAccessor("ISL190727_Island_HS_0250B3_4K_HDR$2_Dettifoss.JPG")
+        self.assertEqual(("ISL190727", "0250B3", "0250"), (filenameAccessor.pre, filenameAccessor.counter,
+                                                          filenameAccessor.counter_main()))
+        self.assertEqual((["Island"], ["HS"], ["4K"], ["HDR$2"], ["Dettifoss"]),
+                         (filenameAccessor.primtags, filenameAccessor.primmodes, filenameAccessor.scenes,
+                          filenameAccessor.processes, filenameAccessor.posttags))
+        self.assertEqual("M0012", FilenameAccessor("ISL19_M0012_4K.MP4").counter)
+        self.assertEqual("", FilenameAccessor("Island_Dettifoss.JPG").pre)
+
+    def test_cached_lists_are_not_shared(self):
+        FilenameAccessor("ISL190727_250_PANO.jpg").processes.append("SMALL")
+        self.assertEqual(["PANO"], FilenameAccessor("ISL190727_250_PANO.jpg").processes)
+
+class ParseFilenamesTest(unittest.TestCase):
+    def setUp(self):
+        self.filenames = ["ISL19_0001_Geysir.JPG", "ISL19_0002_Geysir.JPG", "ISL19_0002B2_Geysir_HDR.JPG",
+                          "ISL19_0004_Geysir.JPG", "ISL19_0005_Selfoss.JPG", "Island.JPG", "NOR19_0006_Selfoss.JPG"]
+        self.columns = parse_filenames(self.filenames)
+
+    def test_columns(self):
+        self.assertEqual(["0001", "0002", "0002", "0004", "0005", "", "0006"], list(self.columns["counter_main"]))
+        self.assertEqual([1, 2, 2, 4, 5, -1, 6], list(self.columns["counter_number"]))
+
+    def test_counter_runs(self):
+        firsts, lasts = counter_runs(self.columns)
+        self.assertEqual(([0, 3, 4, 5, 6], [2, 3, 4, 5, 6]), (list(firsts), list(lasts)))
+        for first, last in zip(firsts[:3], lasts[:3]):
+            for i in range(first + 1, last + 1):
+                self.assertTrue(FilenameAccessor(self.filenames[i]).is_direct_successor_of(
+                    FilenameAccessor(self.filenames[i - 1])))
+        firsts, lasts = counter_runs(self.columns, np.array([0, 1, 1, 1, 1, 1, 1]))
+        self.assertEqual(([0, 1, 3, 4, 5, 6], [0, 2, 3, 4, 5, 6]), (list(firsts), list(lasts)))
+
+    def test_distinct_tags(self):
+        self.assertEqual({0: ["Geysir", "Selfoss"]}, distinct_tags(self.columns))
+        tags = distinct_tags(self.columns, np.array(["b", "b", "b", "a", "a", "a", "c"]))
+        self.assertEqual({"a": ["Geysir", "Selfoss"], "b": ["Geysir"], "c": ["Selfoss"]}, tags)
+
+
 if __name__ == '__main__':
     unittest.main()
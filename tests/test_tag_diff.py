@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from unittest import mock
+
+import numpy as np
+
+from EXIFnaming import readexif
+from EXIFnaming.helpers import program_dir
+from EXIFnaming.helpers.catalog import Catalog
+from EXIFnaming.helpers.snapshot import Snapshot, write_snapshot
+from EXIFnaming.helpers.tag_diff import diff_tag_states, inode_tag, exiftool_tag_name
+
+
+class TagDiffTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old = OrderedDict([("Directory", ["/a", "/a", "/a", "/b"]),
+                                ("File Name", ["x.JPG", "y.JPG", "z.JPG", "x.JPG"]),
+                                ("Rating", ["1", "2", "3", "4"]),
+                                ("Keywords", ["", "sea, sun", "", ""]),
+                                ("File Size", ["1 MB", "2 MB", "3 MB", "4 MB"]),
+                                (inode_tag, ["11", "12", "13", "14"])])
+        # z removed, w added, y renamed to v, rating and keywords changed
+        self.new = OrderedDict([("Directory", ["/a", "/a", "/b", "/a"]),
+                                ("File Name", ["w.JPG", "x.JPG", "x.JPG", "v.JPG"]),
+                                ("Rating", ["0", "1", "5", "2"]),
+                                ("Keywords", ["", "", "", "sea"]),
+                                ("File Size", ["9 MB", "1.1 MB", "4 MB", "2 MB"]),
+                                (inode_tag, ["15", "11", "14", "12"])])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def snapshot(self, name: str, tagdict: dict) -> Snapshot:
+        filename = os.path.join(self.tmpdir.name, name)
+        write_snapshot(filename, tagdict)
+        snapshot = Snapshot(filename)
+        self.addCleanup(snapshot.close)
+        return snapshot
+
+    def test_inode(self):
+        diff = diff_tag_states(self.snapshot("old.tags", self.old), self.snapshot("new.tags", self.new))
+        self.assertEqual([2], diff.removed.tolist())
+        self.assertEqual([0], diff.added.tolist())
+        self.assertEqual(OrderedDict([("File Name", 1), ("Rating", 1), ("Keywords", 1)]), diff.counts())
+        self.assertEqual([("/b/x.JPG", "Rating", "4", "5"), ("/a/v.JPG", "File Name", "y.JPG", "v.JPG"),
+                          ("/a/v.JPG", "Keywords", "sea, sun", "sea")],
+                         [(path.replace(os.sep, "/"), tag, old, new) for path, tag, old, new in diff.iter_changes()])
+        self.assertEqual([{"Rating": "4"}, {"Keywords": "sea, sun"}],
+                         [tag_dict for path, tag_dict in diff.iter_restore_entries()])
+
+    def test_path(self):
+        old = self.snapshot("old.tags", self.old)
+        new = Catalog.from_tagdict(self.new, np.zeros((4, 2), dtype=np.int64))
+        diff = diff_tag_states(old, new, key="path")
+        self.assertEqual([1, 2], diff.removed.tolist())
+        self.assertEqual(OrderedDict([("Rating", 1)]), diff.counts())
+        diff = diff_tag_states(old, new, key="path_size")
+        self.assertEqual([0, 1, 2], diff.removed.tolist())
+
+    def test_exiftool_tag_name(self):
+        self.assertEqual("DateTimeOriginal", exiftool_tag_name("Date/Time Original"))
+        self.assertEqual("GPSLatitudeRef", exiftool_tag_name("GPS Latitude Ref"))
+        self.assertEqual("Model", exiftool_tag_name("Camera Model Name"))
+        self.assertEqual("", exiftool_tag_name("Image Size"))
+        self.assertEqual("", exiftool_tag_name("File Size"))
+        self.assertEqual("", exiftool_tag_name(inode_tag))
+
+
+class RestoreTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        program_dir.create_program_dir.dir = None
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        program_dir.create_program_dir.dir = None
+        self.tmpdir.cleanup()
+
+    def test_restore(self):
+        old = OrderedDict([("Directory", ["/a", "/a"]), ("File Name", ["x.JPG", "y.JPG"]),
+                           ("Date/Time Original", ["2019:07:27 10:00:00", "2019:07:27 11:00:00"]),
+                           ("Image Size", ["60x40", "60x40"]), ("Megapixels", ["0.0024", "0.0024"]),
+                           ("Keywords", ["sea, sun", ""]), (inode_tag, ["11", "12"])])
+        # shift_time, a rotation and new keywords
+        new = OrderedDict([("Directory", ["/a", "/a"]), ("File Name", ["x.JPG", "y.JPG"]),
+                           ("Date/Time Original", ["2019:07:27 12:00:00", "2019:07:27 13:00:00"]),
+                           ("Image Size", ["40x60", "60x40"]), ("Megapixels", ["0.0024", "0.0025"]),
+                           ("Keywords", ["sea", "sun"]), (inode_tag, ["11", "12"])])
+        write_snapshot(program_dir.get_saves_dir("State_old.tags"), old)
+        write_snapshot(program_dir.get_saves_dir("State_new.tags"), new)
+        with mock.patch.object(readexif, "call_exiftool_batch") as call_exiftool_batch:
+            readexif.diff_tags("old", "new", restore=True)
+        call_exiftool_batch.assert_called_once_with(
+            [["-DateTimeOriginal=2019:07:27 10:00:00", "-Keywords=sea, sun", os.path.join("/a", "x.JPG")],
+             ["-DateTimeOriginal=2019:07:27 11:00:00", "-Keywords=", os.path.join("/a", "y.JPG")]],
+            True, ["-sep", ", "])
+
+
+if __name__ == '__main__':
+    unittest.main()